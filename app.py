@@ -1,6 +1,6 @@
 # app.py
 import os
-from flask import Flask, render_template, send_from_directory, url_for, request, redirect, flash, session
+from flask import Flask, render_template, send_from_directory, send_file, url_for, request, redirect, flash, session, abort, Response
 from flask_migrate import Migrate
 from models import db, User, GenerationTask, Banknote, SerialNumber
 from utils import (
@@ -14,6 +14,10 @@ import pyotp
 import threading
 from utils import get_formatted_initials, get_user_avatar, get_user_avatar_url, sanitize_bio # Add this import
 from urllib.parse import unquote
+import gzip
+from werkzeug.utils import safe_join
+from font_subset import resolve_font_url
+from thumbnails import THUMB_FORMATS, THUMB_MIMETYPES, existing_pyramid, srcset
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SECRET_KEY", "dev-secret-key-change-in-production")
@@ -30,6 +34,9 @@ def utility_processor():
     def has_banknotes(user_id):
         from models import Banknote
         return Banknote.query.filter_by(user_id=user_id).first() is not None
+    def thumbnail_srcset(pyramid, fmt):
+        return srcset(pyramid, fmt, lambda path: url_for(
+            'serve_banknote_image', filename=os.path.relpath(path, IMAGES_ROOT).replace('\\', '/')))
     """
     Make functions available to all templates
     """
@@ -38,7 +45,9 @@ def utility_processor():
         'get_formatted_initials': get_formatted_initials,  # Add this
         'get_user_avatar_url': get_user_avatar_url,
         'get_user_by_username': get_user_by_username,
-        'has_banknotes': has_banknotes
+        'has_banknotes': has_banknotes,
+        'thumbnail_srcset': thumbnail_srcset,
+        'thumb_formats': [(fmt, THUMB_MIMETYPES[fmt]) for fmt in THUMB_FORMATS]
         
     }
     
@@ -86,7 +95,8 @@ def show_name(name):
                 bill = {
                     "file": url_for("serve_image", filename=f"{name}/{denom}/{f}"),
                     "side": side,
-                    "denom": denom
+                    "denom": denom,
+                    "thumbnails": existing_pyramid(os.path.join(denom_path, f))
                 }
                 if side == "front":
                     fronts.append(bill)
@@ -95,9 +105,57 @@ def show_name(name):
 
     return render_template('name_detail.html', name=name, fronts=fronts, backs=backs, title=f"Gallery - {name}", current_user=get_current_user())
 
+def send_svg_precompressed(directory, filename):
+    """
+    Send a file, preferring the precompressed .svg.gz written next to an SVG
+    (or the .svgz note itself) with Content-Encoding: gzip when the client
+    accepts gzip. Clients that don't get the plain file, or the .svgz
+    decompressed on the fly when no plain file exists. A sidecar older than
+    its SVG is ignored.
+    """
+    path = safe_join(directory, filename)
+    if path is None:
+        abort(404)
+    lower = filename.lower()
+    if not lower.endswith((".svg", ".svgz")):
+        return send_from_directory(directory, filename)
+
+    accepts_gzip = request.accept_encodings["gzip"] > 0  # "gzip;q=0" refuses it
+    compressed = filename if lower.endswith(".svgz") else f"{filename}.gz"
+    compressed_path = safe_join(directory, compressed)
+    if compressed_path is None or not os.path.isfile(compressed_path):
+        return send_from_directory(directory, filename)
+    if compressed != filename and os.path.isfile(path) and os.path.getmtime(compressed_path) < os.path.getmtime(path):
+        return send_from_directory(directory, filename)  # sidecar older than the SVG
+
+    if accepts_gzip:
+        response = send_from_directory(directory, compressed, mimetype="image/svg+xml")
+        response.headers["Content-Encoding"] = "gzip"
+    elif compressed == filename:
+        with gzip.open(compressed_path, "rb") as f:
+            response = Response(f.read(), mimetype="image/svg+xml")
+    else:
+        response = send_from_directory(directory, filename)
+    response.vary.add("Accept-Encoding")
+    return response
+
+@app.route("/static/fonts/<path:filename>")
+def serve_versioned_font(filename):
+    """
+    Fonts referenced by notes generated with --font-mode external. The URL
+    carries the font's content hash, so responses are cached forever.
+    """
+    resolved = resolve_font_url(filename)
+    if resolved is None:
+        abort(404)
+    path, mimetype = resolved
+    response = send_file(path, mimetype=mimetype)
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
 @app.route("/images/<path:filename>")
 def serve_image(filename):
-    return send_from_directory(IMAGES_ROOT, filename)
+    return send_svg_precompressed(IMAGES_ROOT, filename)
 
 @app.route("/login", methods=["GET", "POST"])
 def login():
@@ -349,7 +407,7 @@ def serve_banknote_image(filename):
     # Ensure we're not dealing with directory traversal attacks
     if '..' in filename or filename.startswith('/'):
         abort(404)
-    return send_from_directory(IMAGES_ROOT, filename)
+    return send_svg_precompressed(IMAGES_ROOT, filename)
 
 @app.route("/toggle-banknote/<int:banknote_id>")
 def toggle_banknote_visibility(banknote_id):
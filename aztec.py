@@ -17,6 +17,7 @@ import os
 import math
 import shutil
 import base64
+from functools import lru_cache
 from typing import List, Tuple
 import xml.etree.ElementTree as ET
 
@@ -70,6 +71,15 @@ def color_from_hue(h: float, s: float=0.8, v: float=0.9) -> Tuple[float,float,fl
 # -------------------------
 # Extract Aztec matrix from segno
 # -------------------------
+@lru_cache(maxsize=256)
+def segno_matrix(data: str) -> Tuple[Tuple[bool, ...], ...]:
+    """
+    Memoized segno symbol matrix for `data` (rows of booleans, True = dark).
+    The same payload is encoded once per process however many layers use it.
+    """
+    sym = make(data)
+    return tuple(tuple(bool(v) for v in row) for row in sym.matrix)
+
 def aztec_matrix_from_segno(data: str, compact: bool=True, layers: int=None):
     """
     Use segno to generate an Aztec symbol and return a 2D boolean matrix (list of rows),
@@ -77,30 +87,8 @@ def aztec_matrix_from_segno(data: str, compact: bool=True, layers: int=None):
     compact: whether to try compact Aztec (segno decides)
     layers: if you want to force a certain layer count (optional)
     """
-    # segno.make -> symbol object; request aztec specifically via keyword 'mode' or 'symbol' if supported.
-    # segno supports 'aztec' mode by passing kind='aztec' or mode='aztec' depending on version.
-    # We'll attempt common call patterns and fallback gracefully.
-    try:
-        sym = make(data)
-    except TypeError:
-        # different segno versions use 'kind' or 'symbol'
-        try:
-            sym = make(data)
-        except Exception:
-            # fallback: try segno.encoder.encode? last-resort: let segno auto choose maybe aztec via qr?
-            sym = make(data)
-    except Exception:
-        # if segno couldn't make aztec, raise useful error
-        raise
-
-    # symbol.matrix returns a sequence of rows (2d boolean). If not present, use matrix_iter
-    if hasattr(sym, 'matrix'):
-        mat = list(sym.matrix)  # each row: tuple of booleans (True dark)
-    else:
-        mat = [row for row in sym.matrix_iter()]
-    # normalize to list of lists of bool
-    matrix = [ [bool(v) for v in row] for row in mat ]
-    return matrix
+    # segno picks the symbol itself; the matrix is memoized per payload
+    return [list(row) for row in segno_matrix(data)]
 
 # -------------------------
 # SVG builder
@@ -108,6 +96,14 @@ def aztec_matrix_from_segno(data: str, compact: bool=True, layers: int=None):
 SVG_NS = "http://www.w3.org/2000/svg"
 ET.register_namespace("", SVG_NS)
 
+def _rounded_rect_subpath(x: float, y: float, w: float, h: float, r: float = 1.0) -> str:
+    """Path data of one rect with rx = ry = r (clamped like SVG does), as a closed subpath."""
+    r = max(0.0, min(r, w / 2, h / 2))
+    iw, ih = w - 2*r, h - 2*r
+    return (f"M{x + r:.3f} {y:.3f}h{iw:.3f}a{r:g} {r:g} 0 0 1 {r:g} {r:g}v{ih:.3f}"
+            f"a{r:g} {r:g} 0 0 1 {-r:g} {r:g}h{-iw:.3f}a{r:g} {r:g} 0 0 1 {-r:g} {-r:g}"
+            f"v{-ih:.3f}a{r:g} {r:g} 0 0 1 {r:g} {-r:g}z")
+
 def build_colored_aztec_svg(matrix: List[List[bool]],
                              scale: int = 10,
                              margin_modules: int = 4,
@@ -115,7 +111,27 @@ def build_colored_aztec_svg(matrix: List[List[bool]],
                              out_path: str = "aztec_color.svg",
                              passes: List[dict] = None):
     """
-    Build an SVG at out_path from boolean matrix.
+    Build an SVG at out_path from boolean matrix (see colored_aztec_svg_bytes).
+    """
+    svg_bytes = colored_aztec_svg_bytes(matrix, scale=scale, margin_modules=margin_modules,
+                                        style=style, passes=passes)
+    ensure_dir_for_file(out_path)
+    with open(out_path, "wb") as f:
+        f.write(svg_bytes)
+    return out_path
+
+def colored_aztec_svg_data_url(matrix: List[List[bool]], **kwargs) -> str:
+    """The colored Aztec SVG as a base64 data: URL, ready for an <image> href."""
+    svg_bytes = colored_aztec_svg_bytes(matrix, **kwargs)
+    return "data:image/svg+xml;base64," + base64.b64encode(svg_bytes).decode("ascii")
+
+def colored_aztec_svg_bytes(matrix: List[List[bool]],
+                            scale: int = 10,
+                            margin_modules: int = 4,
+                            style: str = "radial",
+                            passes: List[dict] = None) -> bytes:
+    """
+    Build the colored Aztec SVG in memory from boolean matrix and return it as UTF-8 bytes.
     - scale: pixels per module
     - margin_modules: white margin around symbol
     - style: 'radial' or 'directional' gradient mapping
@@ -170,7 +186,10 @@ def build_colored_aztec_svg(matrix: List[List[bool]],
     # group to hold passes
     group_root = ET.SubElement(root, "g", {"id":"aztec_group"})
 
-    # iterate passes: for each pass, draw rectangles for modules that are True
+    # iterate passes: flat-colored modules become one path per pass with a rounded
+    # (rx=1) subpath per module, so the padding gaps between neighbours are kept;
+    # every 5th module (on a diagonal) keeps its own rect for the per-module gradient
+    pad = max(0, scale * 0.06)  # slight inner padding to create separation
     for pi, p in enumerate(passes):
         gpass = ET.SubElement(group_root, "g", {"id":f"pass_{pi}", "fill":rgb_tuple_to_hex(p["color"]), "fill-opacity":str(p["opacity"])})
         dx, dy = p.get("offset",(0.0,0.0))
@@ -178,28 +197,29 @@ def build_colored_aztec_svg(matrix: List[List[bool]],
         dx_px = dx * scale
         dy_px = dy * scale
 
+        use_grad = [[bool(matrix[row][col]) and (row+col+pi) % 5 == 0 for col in range(w)] for row in range(h)]
+        flat = [[bool(matrix[row][col]) and not use_grad[row][col] for col in range(w)] for row in range(h)]
+
+        d = []
         for row in range(h):
             for col in range(w):
-                if not matrix[row][col]:
+                if not flat[row][col]:
                     continue
-                # compute top-left pixel coords with margin
-                x = (col + margin_modules) * scale + dx_px
-                y = (row + margin_modules) * scale + dy_px
-                # use rect with a slight rounding/inner padding to create separation
-                pad = max(0, scale * 0.06)
-                rx = x + pad
-                ry = y + pad
-                rw = scale - pad*2
-                rh = scale - pad*2
-                # optionally apply gradient fill via defs by referencing gradient id
-                # alternate use gradient for every N-th module for variety
-                use_grad = ((row+col+pi) % 5 == 0)
-                if use_grad:
-                    gid = f"grad_{pi}"
-                    rattrs = {"x":f"{rx:.3f}","y":f"{ry:.3f}","width":f"{rw:.3f}","height":f"{rh:.3f}","fill":f"url(#{gid})","fill-opacity":str(p["opacity"]), "rx":"1", "ry":"1"}
-                else:
-                    rattrs = {"x":f"{rx:.3f}","y":f"{ry:.3f}","width":f"{rw:.3f}","height":f"{rh:.3f}","fill":rgb_tuple_to_hex(p["color"]), "fill-opacity":str(p["opacity"]), "rx":"1", "ry":"1"}
-                ET.SubElement(gpass, "rect", rattrs)
+                x = (col + margin_modules) * scale + dx_px + pad
+                y = (row + margin_modules) * scale + dy_px + pad
+                d.append(_rounded_rect_subpath(x, y, scale - pad*2, scale - pad*2))
+        if d:
+            ET.SubElement(gpass, "path", {"d":"".join(d), "fill":rgb_tuple_to_hex(p["color"]), "fill-opacity":str(p["opacity"])})
+
+        gid = f"grad_{pi}"
+        for row in range(h):
+            for col in range(w):
+                if not use_grad[row][col]:
+                    continue
+                x = (col + margin_modules) * scale + dx_px + pad
+                y = (row + margin_modules) * scale + dy_px + pad
+                ET.SubElement(gpass, "rect", {"x":f"{x:.3f}","y":f"{y:.3f}","width":f"{scale - pad*2:.3f}","height":f"{scale - pad*2:.3f}",
+                                              "fill":f"url(#{gid})","fill-opacity":str(p["opacity"]), "rx":"1", "ry":"1"})
 
     # Add a central finder/bullseye overlay to give Aztec look (optional)
     # draw concentric rings centered on symbol center
@@ -221,12 +241,7 @@ def build_colored_aztec_svg(matrix: List[List[bool]],
     comment = ET.Comment(f"Generated Aztec color SVG")
     root.append(comment)
 
-    # write file
-    ensure_dir_for_file(out_path)
-    tree = ET.ElementTree(root)
-    tree.write(out_path, encoding="utf-8", xml_declaration=True)
-
-    return out_path
+    return ET.tostring(root, encoding="utf-8", xml_declaration=True)
 
 # -------------------------
 # CLI
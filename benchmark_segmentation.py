@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+benchmark_segmentation.py
+
+Runs every registered segmentation backend over the images in ./backgrounds
+and reports time, peak memory, SVG bytes and element count per backend, so a
+backend can be picked per denomination (see DENOMINATION_BACKENDS in
+segmentation_backends.py).
+
+Author: RingMaster Lin
+"""
+import os
+import glob
+import json
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+from segmentation_backends import SEGMENTATION_BACKENDS, segment_image, vectorize_segments
+from svg_stream import new_drawing
+
+
+def mm_to_px(mm: float, dpi: float = 300.0) -> int:
+    return int(round(mm * dpi / 25.4))
+
+
+def load_images(bg_dir: str):
+    paths = []
+    for ext in ("*.png", "*.jpg", "*.jpeg", "*.webp"):
+        paths.extend(glob.glob(os.path.join(bg_dir, ext)))
+    return sorted(paths)
+
+
+def benchmark_backend(arr: np.ndarray, backend: str, W: int, H: int, margin: int, n_segments: int) -> dict:
+    dwg = new_drawing(size=(W, H), viewBox=f"0 0 {W} {H}")
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    segments = segment_image(arr, backend=backend, n_segments=n_segments)
+    t_seg = time.perf_counter()
+    group = vectorize_segments(dwg, arr, segments, margin=margin, opacity=0.7)
+    t_vec = time.perf_counter()
+    svg_bytes = len(dwg.tostring().encode("utf-8"))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "backend": backend,
+        "regions": int(len(np.unique(segments))),
+        "elements": len(group.elements),
+        "segment_s": t_seg - t0,
+        "vectorize_s": t_vec - t_seg,
+        "total_s": time.perf_counter() - t0,
+        "peak_mb": peak / (1024 * 1024),
+        "svg_bytes": svg_bytes,
+    }
+
+
+def print_table(image_path: str, rows):
+    print(f"\n[+] {os.path.basename(image_path)}")
+    print(f"{'backend':<14}{'regions':>9}{'elements':>10}{'segment s':>11}{'vector s':>10}"
+          f"{'total s':>9}{'peak MB':>9}{'SVG KB':>10}")
+    for r in rows:
+        if "error" in r:
+            print(f"{r['backend']:<14}  [!] {r['error']}")
+            continue
+        print(f"{r['backend']:<14}{r['regions']:>9}{r['elements']:>10}{r['segment_s']:>11.2f}"
+              f"{r['vectorize_s']:>10.2f}{r['total_s']:>9.2f}{r['peak_mb']:>9.1f}{r['svg_bytes'] / 1024:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark background segmentation backends")
+    parser.add_argument("--bg-dir", type=str, default="./backgrounds", help="Directory with background images")
+    parser.add_argument("--backends", type=str, nargs="+", default=sorted(SEGMENTATION_BACKENDS),
+                        choices=sorted(SEGMENTATION_BACKENDS), help="Backends to run")
+    parser.add_argument("--width-mm", type=float, default=160.0, help="Note width in mm")
+    parser.add_argument("--height-mm", type=float, default=60.0, help="Note height in mm")
+    parser.add_argument("--margin", type=int, default=60, help="Background margin in px")
+    parser.add_argument("--n-segments", type=int, default=1024, help="Target number of regions")
+    parser.add_argument("--json", type=str, default=None, help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    W = mm_to_px(args.width_mm)
+    H = mm_to_px(args.height_mm)
+    images = load_images(args.bg_dir)
+    if not images:
+        print(f"[!] No background images found in {args.bg_dir}")
+        return
+
+    results = {}
+    for image_path in images:
+        # Same resize the generators apply before vectorizing
+        img = Image.open(image_path).convert("RGB").resize((W - 2 * args.margin, H - 2 * args.margin),
+                                                                Image.LANCZOS)
+        arr = np.array(img)
+        rows = []
+        for backend in args.backends:
+            try:
+                rows.append(benchmark_backend(arr, backend, W, H, args.margin, args.n_segments))
+            except Exception as e:
+                rows.append({"backend": backend, "error": str(e)})
+        print_table(image_path, rows)
+        results[image_path] = rows
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"[+] Saved results to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+font_registry.py
+
+Process-wide, lazy font registry. Nothing is parsed at startup: a font is
+opened the first time it is asked for and the handle is memoized by
+(path, size) -- fontTools TTFont objects under (path, None), PIL
+FreeTypeFont objects under (path, point size). Fonts are looked up by
+family name ("Daemon Full Working"), file name or path; bare names are
+searched in FONT_DIR with the usual extensions.
+
+    font = get_ttfont("FengGuangMingRui")          # TTFont or None
+    pil_font = get_pil_font("Daemon Full Working", 72)
+    fonts = FontRegistry("./fonts")                # lazy name -> TTFont mapping
+
+TTFont handles are opened lazily and shared, so treat them as read-only
+(font_subset.py opens its own copy before subsetting).
+
+Author: RingMaster Lin
+"""
+import os
+import threading
+from collections.abc import Mapping
+
+try:
+    from fontTools.ttLib import TTFont
+    FONTTOOLS_AVAILABLE = True
+except ImportError:
+    FONTTOOLS_AVAILABLE = False
+
+try:
+    from PIL import ImageFont
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+FONT_DIR = "./fonts"
+FONT_EXTENSIONS = (".otf", ".ttf")
+
+_handles = {}
+_failed = set()
+_lock = threading.Lock()
+_stats = {"hits": 0, "loads": 0}
+
+
+def resolve_font_path(name: str, font_dir: str = FONT_DIR):
+    """Path of a font given a path, a file name in font_dir or a family name; None when not found."""
+    if os.path.isfile(name):
+        return name
+    candidates = [os.path.join(font_dir, name)]
+    if not name.lower().endswith(FONT_EXTENSIONS):
+        candidates += [os.path.join(font_dir, name + ext) for ext in FONT_EXTENSIONS]
+    for path in candidates:
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _get(key, load):
+    handle = _handles.get(key)
+    if handle is not None:
+        _stats["hits"] += 1
+        return handle
+    if key in _failed:
+        return None
+    with _lock:
+        handle = _handles.get(key)
+        if handle is None:
+            try:
+                handle = load()
+            except Exception as e:
+                print(f"[!] Could not load font {key[0]}: {e}")
+                _failed.add(key)
+                return None
+            _handles[key] = handle
+            _stats["loads"] += 1
+    return handle
+
+
+def get_ttfont(name: str, font_dir: str = FONT_DIR):
+    """Shared fontTools TTFont for a font (tables are read on first use); None if missing."""
+    if not FONTTOOLS_AVAILABLE:
+        return None
+    path = resolve_font_path(name, font_dir)
+    if path is None:
+        return None
+    return _get((os.path.abspath(path), None), lambda: TTFont(path, lazy=True))
+
+
+def get_pil_font(name: str, size: int, font_dir: str = FONT_DIR):
+    """
+    Shared PIL FreeTypeFont at `size`; None if the font can't be loaded.
+    Names not found in font_dir are handed to PIL as is (system fonts such as "arial.ttf").
+    """
+    if not PIL_AVAILABLE:
+        return None
+    path = resolve_font_path(name, font_dir) or name
+    key = (os.path.abspath(path) if os.path.isfile(path) else path, int(size))
+    return _get(key, lambda: ImageFont.truetype(path, int(size)))
+
+
+def font_registry_stats() -> dict:
+    return {"handles": len(_handles), "failed": len(_failed), **_stats}
+
+
+def clear_font_registry():
+    with _lock:
+        _handles.clear()
+        _failed.clear()
+        _stats["hits"] = _stats["loads"] = 0
+
+
+class FontRegistry(Mapping):
+    """Read-only mapping of the family names in font_dir to TTFont objects, loaded on first access."""
+
+    def __init__(self, font_dir: str = FONT_DIR):
+        self.font_dir = font_dir
+        names = os.listdir(font_dir) if os.path.isdir(font_dir) else []
+        self._files = {os.path.splitext(fn)[0]: fn for fn in sorted(names) if fn.lower().endswith(FONT_EXTENSIONS)}
+
+    def __getitem__(self, name):
+        if name not in self._files:
+            raise KeyError(name)
+        font = get_ttfont(self._files[name], self.font_dir)
+        if font is None:
+            raise KeyError(name)
+        return font
+
+    def __iter__(self):
+        return iter(self._files)
+
+    def __len__(self):
+        return len(self._files)
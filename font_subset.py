@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+font_subset.py
+
+Subsetting for the fonts embedded into the notes. embed_font() used to
+base64 the whole font file into every SVG; a FontFace now writes an
+@font-face that only carries the glyphs the note draws. The subset is made
+when the drawing is saved, from the text content actually written, plus
+BASE_CHARS (ASCII and the Chinese numerals) so notes filled from a
+precompiled template -- whose serials and timestamps differ from the note
+the template was compiled from -- stay covered. Subsets are cached by
+(font content hash, glyph set hash, flavor) in memory and under SUBSET_DIR;
+SUBSET_FLAVOR = "woff2" (needs brotli) shrinks them further.
+
+With FONT_MODE = "external" (notes served by the gallery) nothing is
+embedded: the @font-face points at one versioned URL per font,
+/static/fonts/<name>.<content hash>.<ext>, which app.py serves with an
+immutable long-cache header, so the browser fetches each font once for all
+notes on a page. The print pipeline keeps the self-contained "embed" mode.
+
+    dwg.defs.add(FontFace(dwg, "./fonts/FengGuangMingRui.ttf", "FengGuangMingRui"))
+
+Author: RingMaster Lin
+"""
+import io
+import os
+import base64
+import hashlib
+import tempfile
+from collections import OrderedDict
+from functools import lru_cache
+from urllib.parse import quote
+from xml.sax.saxutils import unescape
+
+import svgwrite
+
+import svg_stream
+from svg_stream import Element
+
+try:
+    from fontTools.ttLib import TTFont
+    from fontTools import subset as ft_subset
+    FONTTOOLS_AVAILABLE = True
+except ImportError:
+    FONTTOOLS_AVAILABLE = False
+
+try:
+    import brotli  # noqa: F401  (needed by fontTools for WOFF2)
+    WOFF2_AVAILABLE = True
+except ImportError:
+    WOFF2_AVAILABLE = False
+
+SUBSET_ENABLED = True
+SUBSET_FLAVOR = None  # None (same format as the font file), "woff" or "woff2"
+SUBSET_FLAVORS = ("woff", "woff2")
+SUBSET_DIR = "./font_subsets"
+SUBSET_CACHE_SIZE = 32  # subsets kept in memory (LRU)
+
+# "embed" (self-contained notes, for print/PDF) or "external" (shared versioned font URLs)
+FONT_MODE = "embed"
+FONT_MODES = ("embed", "external")
+FONT_DIR = "./fonts"
+FONT_URL_PREFIX = "/static/fonts/"
+FONT_EXTENSIONS = (".ttf", ".otf")
+
+# Always kept: printable ASCII (serials, timestamps, URLs) and the numerals used for denominations
+BASE_CHARS = "".join(chr(c) for c in range(0x20, 0x7F)) + "零壹贰叁肆伍陆柒捌玖拾佰仟万亿卢纳币"
+
+_subsets = OrderedDict()
+_stats = {"hits": 0, "misses": 0}
+
+
+# ----------------------
+# Subsetting
+# ----------------------
+def _font_format(font_path: str, flavor: str):
+    """(mime type, CSS format) of the embedded data."""
+    if flavor:
+        return f"font/{flavor}", flavor
+    with open(font_path, "rb") as f:
+        if f.read(4) == b"OTTO":
+            return "font/otf", "opentype"
+    return "font/ttf", "truetype"
+
+
+def subset_font_bytes(font_path: str, chars: str, flavor: str = None) -> bytes:
+    """Subset font_path to the glyphs of chars (layout features and names kept) and return the font file bytes."""
+    options = ft_subset.Options()
+    options.flavor = flavor
+    options.layout_features = ["*"]
+    options.name_IDs = ["*"]
+    options.notdef_outline = True
+    font = TTFont(font_path)
+    subsetter = ft_subset.Subsetter(options)
+    subsetter.populate(text=chars)
+    subsetter.subset(font)
+    buf = io.BytesIO()
+    ft_subset.save_font(font, buf, options)
+    font.close()
+    return buf.getvalue()
+
+
+def cached_subset(font_path: str, chars: str, flavor: str = None) -> bytes:
+    """
+    subset_font_bytes, cached by (font content hash, glyph set hash, flavor)
+    in memory and under SUBSET_DIR -- a touched or copied font with the same
+    bytes reuses its subsets.
+    """
+    glyph_hash = hashlib.sha1("".join(sorted(set(chars))).encode("utf-8")).hexdigest()
+    key = (font_version(font_path), glyph_hash, flavor)
+    data = _subsets.get(key)
+    if data is not None:
+        _subsets.move_to_end(key)
+        _stats["hits"] += 1
+        return data
+
+    digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:16]
+    path = os.path.join(SUBSET_DIR, f"{digest}.{flavor or 'sfnt'}")  # no font name: copies share it
+    if os.path.exists(path):
+        _stats["hits"] += 1
+        with open(path, "rb") as f:
+            data = f.read()
+    else:
+        _stats["misses"] += 1
+        data = subset_font_bytes(font_path, chars, flavor)
+        os.makedirs(SUBSET_DIR, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        print(f"[+] Subset {os.path.basename(font_path)}: {os.path.getsize(font_path) / 1024:.1f} KB -> "
+              f"{len(data) / 1024:.1f} KB ({len(set(chars))} chars, {flavor or 'sfnt'})")
+
+    _subsets[key] = data
+    if len(_subsets) > SUBSET_CACHE_SIZE:
+        _subsets.popitem(last=False)
+    return data
+
+
+def subset_cache_stats() -> dict:
+    return {"entries": len(_subsets), **_stats}
+
+
+# ----------------------
+# External (versioned) font URLs
+# ----------------------
+@lru_cache(maxsize=64)
+def _content_hash(path: str, size: int, mtime_ns: int) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()[:12]
+
+
+def font_version(font_path: str) -> str:
+    """Short content hash of a font file, used as the cache-busting part of its URL."""
+    st = os.stat(font_path)
+    return _content_hash(os.path.abspath(font_path), st.st_size, st.st_mtime_ns)
+
+
+def font_url(font_path: str, flavor: str = None) -> str:
+    """Versioned URL of a whole font file (converted to WOFF/WOFF2 when flavor is given)."""
+    stem, ext = os.path.splitext(os.path.basename(font_path))
+    return f"{FONT_URL_PREFIX}{quote(stem)}.{font_version(font_path)}.{flavor or ext[1:].lower()}"
+
+
+def converted_font(font_path: str, flavor: str) -> str:
+    """Path of the whole font converted to WOFF/WOFF2, made once under SUBSET_DIR."""
+    stem = os.path.splitext(os.path.basename(font_path))[0].replace(" ", "_")
+    path = os.path.join(SUBSET_DIR, f"{stem}_{font_version(font_path)}.{flavor}")
+    if not os.path.exists(path):
+        os.makedirs(SUBSET_DIR, exist_ok=True)
+        font = TTFont(font_path)
+        font.flavor = flavor
+        # Unique temp file: concurrent requests of the server threads may convert the same font
+        fd, tmp = tempfile.mkstemp(dir=SUBSET_DIR, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                font.save(f)
+            os.chmod(tmp, 0o644)  # mkstemp creates it owner-only
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        finally:
+            font.close()
+    return path
+
+
+def resolve_font_url(filename: str, font_dir: str = FONT_DIR):
+    """
+    Inverse of font_url() for the Flask route: (file path, mime type) of
+    "<name>.<version>.<ext>", or None when the font is unknown or the version
+    is not the current one.
+    """
+    parts = filename.rsplit(".", 2)
+    if len(parts) != 3 or not os.path.isdir(font_dir):
+        return None
+    stem, version, ext = parts
+    for name in os.listdir(font_dir):
+        base, src_ext = os.path.splitext(name)
+        if base != stem or src_ext.lower() not in FONT_EXTENSIONS:
+            continue
+        path = os.path.join(font_dir, name)
+        if font_version(path) != version:
+            continue
+        if ext == src_ext[1:].lower():
+            return path, _font_format(path, None)[0]
+        if ext in SUBSET_FLAVORS and FONTTOOLS_AVAILABLE and (ext != "woff2" or WOFF2_AVAILABLE):
+            return converted_font(path, ext), f"font/{ext}"
+    return None
+
+
+# ----------------------
+# Glyph sets
+# ----------------------
+def _svgwrite_text(element):
+    if isinstance(element, svg_stream.Fragment):
+        yield from svg_stream.iter_markup_text(element.markup)
+        return
+    text = getattr(element, "text", None)
+    if text:
+        # svgwrite text is stored unescaped; escape-free values unescape to themselves
+        yield str(text)
+    for child in getattr(element, "elements", ()):
+        yield from _svgwrite_text(child)
+
+
+def drawing_chars(dwg) -> str:
+    """All characters drawn as text in dwg (stream or svgwrite drawing), plus BASE_CHARS."""
+    chars = set(BASE_CHARS)
+    if isinstance(dwg, svg_stream.Drawing):
+        for text in dwg.iter_text():
+            chars.update(unescape(text))
+    else:
+        for element in dwg.elements:
+            if element is not dwg.defs:
+                for text in _svgwrite_text(element):
+                    chars.update(unescape(text))
+    return "".join(sorted(chars))
+
+
+# ----------------------
+# @font-face element
+# ----------------------
+class FontFace(Element):
+    """
+    <style> with one @font-face rule. The font is subset (or embedded whole
+    when subsetting is off or fontTools is missing) when the drawing is saved,
+    or referenced by its versioned URL in the external font mode.
+    """
+    __slots__ = ("dwg", "font_path", "font_name")
+
+    def __init__(self, dwg, font_path: str, font_name: str):
+        super().__init__("style")
+        self.attribs["type"] = "text/css"
+        self.dwg = dwg
+        self.font_path = font_path
+        self.font_name = font_name
+
+    def css(self) -> str:
+        if FONT_MODE == "external":
+            flavor = SUBSET_FLAVOR if FONTTOOLS_AVAILABLE and (SUBSET_FLAVOR != "woff2" or WOFF2_AVAILABLE) else None
+            return f"""
+    @font-face {{
+        font-family: '{self.font_name}';
+        src: url('{font_url(self.font_path, flavor)}') format('{_font_format(self.font_path, flavor)[1]}');
+    }}
+    """
+        if SUBSET_ENABLED and FONTTOOLS_AVAILABLE:
+            flavor = SUBSET_FLAVOR
+            if flavor == "woff2" and not WOFF2_AVAILABLE:
+                print("[!] brotli not installed — embedding the font subset without WOFF2")
+                flavor = None
+            data = cached_subset(self.font_path, drawing_chars(self.dwg), flavor)
+            mime, fmt = _font_format(self.font_path, flavor)
+        else:
+            with open(self.font_path, "rb") as f:
+                data = f.read()
+            mime, fmt = "font/ttf", "truetype"
+        font_b64 = base64.b64encode(data).decode("ascii")
+        return f"""
+    @font-face {{
+        font-family: '{self.font_name}';
+        src: url(data:{mime};base64,{font_b64}) format('{fmt}');
+    }}
+    """
+
+    def write(self, write):
+        self.content = self.css()
+        try:
+            super().write(write)
+        finally:
+            self.content = None
+
+    def get_xml(self):
+        return svgwrite.container.Style(content=self.css()).get_xml()
@@ -12,6 +12,7 @@ import math
 import argparse
 import svgwrite
 from typing import List, Tuple
+from contextlib import ExitStack
 import base64
 import colorsys
 from skimage import color, segmentation, measure, util
@@ -24,6 +25,20 @@ import time
 import re
 import io
 import requests
+from segmentation_backends import SEGMENTATION_BACKENDS, backend_for_denomination
+import svg_stream
+from svg_stream import new_drawing, WRITERS
+from functools import lru_cache
+from layer_cache import cached_layer, cached_fragment
+from layer_profiler import LayerProfiler
+from note_templates import NoteTemplates, BACK_STATIC_LAYERS
+from font_registry import get_pil_font
+from svg_optimize import optimize_svg_file
+import glyph_outlines
+from text_layout import text_width
+import font_subset
+from font_subset import FontFace
+from vector_layers import qr_border_paths, microgrid_dots, microgrid_id, circular_qr_runs, module_runs_path, matrix_digest
 
 # At the top of your module
 bg_image = None  # initially empty
@@ -92,20 +107,13 @@ CHINESE_FONT = "./fonts/FengGuangMingRui.ttf"
 NUMBER_FONT  = "./fonts/Daemon Full Working.otf"
 
 def embed_font(dwg, font_path: str, font_name: str):
-    with open(font_path, "rb") as f:
-        font_data = f.read()
-    font_b64 = base64.b64encode(font_data).decode("ascii")
-    style = f"""
-    @font-face {{
-        font-family: '{font_name}';
-        src: url(data:font/ttf;base64,{font_b64}) format('truetype');
-    }}
-    """
-    dwg.defs.add(dwg.style(style))
+    """Embed the font as a @font-face, subset on save to the glyphs the note uses (see font_subset.py)."""
+    dwg.defs.add(FontFace(dwg, font_path, font_name))
 
 # ----------------------
 # Artwork elements
 # ----------------------
+@cached_layer("corner_denoms")
 def add_corner_denoms(dwg, W: int, H: int, denom_str: str):
     """
     Draws denomination numbers in all four corners with white outline 0.05cm behind
@@ -162,24 +170,28 @@ def add_corner_denoms(dwg, W: int, H: int, denom_str: str):
             opacity=0.9
         ))
 
+    # Measured advance widths (the rest digits start where the big digit ends)
+    first_width = text_width(first_digit, "Daemon Full Working", BIG_FONT)
+    rest_width = text_width(rest_digits, "Daemon Full Working", SMALL_FONT)
+
     # --- Top-left ---
     add_text_with_outline(PADDING, PADDING, first_digit, BIG_FONT, COLORS[0], "start", "hanging")
-    offset_x = PADDING + BIG_FONT * 0.6
+    offset_x = PADDING + first_width
     add_text_with_outline(offset_x, PADDING, rest_digits, SMALL_FONT, COLORS[0], "start", "hanging")
 
     # --- Top-right ---
     add_text_with_outline(W - PADDING, PADDING, rest_digits, SMALL_FONT, COLORS[1], "end", "hanging")
-    offset_x = W - PADDING - SMALL_FONT * len(rest_digits) * 0.55
+    offset_x = W - PADDING - rest_width
     add_text_with_outline(offset_x, PADDING, first_digit, BIG_FONT, COLORS[1], "end", "hanging")
 
     # --- Bottom-left ---
     add_text_with_outline(PADDING, H - PADDING, first_digit, BIG_FONT, COLORS[2], "start", "baseline")
-    offset_x = PADDING + BIG_FONT * 0.6
+    offset_x = PADDING + first_width
     add_text_with_outline(offset_x, H - PADDING, rest_digits, SMALL_FONT, COLORS[2], "start", "baseline")
 
     # --- Bottom-right ---
     add_text_with_outline(W - PADDING, H - PADDING, rest_digits, SMALL_FONT, COLORS[3], "end", "baseline")
-    offset_x = W - PADDING - SMALL_FONT * len(rest_digits) * 0.55
+    offset_x = W - PADDING - rest_width
     add_text_with_outline(offset_x, H - PADDING, first_digit, BIG_FONT, COLORS[3], "end", "baseline")
 
 def hexagon(cx, cy, radius):
@@ -238,48 +250,57 @@ def add_functional_corner_decorations(dwg, W, H, denom, timestamp, serial_id,
         ("#222222", "#AAAAAA", "#FFD700"),  # bottom-right (black/gray + yellow)
     ]
 
-    def micro_text_pattern(x, y, text, rows=12, cols=12, spacing=10,
+    def micro_text_pattern(dwg, x, y, text, rows=12, cols=12, spacing=10,
                            c_main="#000", c_highlight="#FF69B4"):
-        """Repeating microtext grid with alternating highlight color."""
-        for row in range(rows):
-            for col in range(cols):
-                color = c_main if (row+col) % 3 else c_highlight
-                dwg.add(dwg.text(text,
-                                 insert=(x + col*spacing, y + row*spacing),
-                                 font_size=6, font_family="Daemon Full Working",
-                                 fill=color, opacity=0.25))
+        """
+        Repeating microtext grid with alternating highlight color: one <text> per
+        color with a positioned <tspan> per cell (fill-opacity keeps overlapping
+        cells compounding as before).
+        """
+        for color, highlighted in ((c_main, False), (c_highlight, True)):
+            label = dwg.text("", font_size=6, font_family="Daemon Full Working",
+                             fill=color, fill_opacity=0.25)
+            for row in range(rows):
+                for col in range(cols):
+                    if ((row+col) % 3 == 0) == highlighted:
+                        label.add(dwg.tspan(text, x=[x + col*spacing], y=[y + row*spacing]))
+            dwg.add(label)
 
     def tesselated_triangles(dwg, x, y, s, rows=8, cols=8,
                              c_main="#000", c_highlight="#FFD700"):
-        """Draw tessellated upright + inverted triangles with mixed colors."""
-        h = s * (3 ** 0.5) / 2
-        for row in range(rows):
-            for col in range(cols):
-                x0 = x + col * s
-                y0 = y + row * h
-                if (row + col) % 2 == 0:
-                    pts = [(x0, y0 + h), (x0 + s/2, y0), (x0 + s, y0 + h)]
-                else:
-                    pts = [(x0, y0), (x0 + s, y0), (x0 + s/2, y0 + h)]
-                stroke_color = c_main if (row+col) % 4 else c_highlight
-                dwg.add(dwg.polygon(points=pts, fill="none",
-                                    stroke=stroke_color,
-                                    stroke_width=0.6, opacity=0.7))
+        """Draw tessellated upright + inverted triangles with mixed colors (cached)."""
+        def build(target):
+            h = s * (3 ** 0.5) / 2
+            for row in range(rows):
+                for col in range(cols):
+                    x0 = x + col * s
+                    y0 = y + row * h
+                    if (row + col) % 2 == 0:
+                        pts = [(x0, y0 + h), (x0 + s/2, y0), (x0 + s, y0 + h)]
+                    else:
+                        pts = [(x0, y0), (x0 + s, y0), (x0 + s/2, y0 + h)]
+                    stroke_color = c_main if (row+col) % 4 else c_highlight
+                    target.add(target.polygon(points=pts, fill="none",
+                                              stroke=stroke_color,
+                                              stroke_width=0.6, opacity=0.7))
+        cached_fragment(dwg, ("corner_triangles", x, y, s, rows, cols, c_main, c_highlight), build)
 
     def top_left(x, y, denom):
         main, secondary, highlight = COLORS[0]
-        for i in range(3):
-            offset = i*size*0.18
-            stroke_c = main if i % 2 == 0 else highlight
-            dwg.add(dwg.rect(insert=(x+offset, y+offset),
-                             size=(size-2*offset, size-2*offset),
-                             rx=8, ry=8, fill="none",
-                             stroke=stroke_c, stroke_width=stroke_width))
-        dwg.add(dwg.text(denom, insert=(x+size/2, y+size/2),
-                         font_size=22, text_anchor="middle",
-                         alignment_baseline="middle",
-                         font_family="Daemon Full Working", fill=secondary))
-        micro_text_pattern(x+12, y+12, denom, c_main=secondary, c_highlight=highlight)
+        def build(target):
+            for i in range(3):
+                offset = i*size*0.18
+                stroke_c = main if i % 2 == 0 else highlight
+                target.add(target.rect(insert=(x+offset, y+offset),
+                                       size=(size-2*offset, size-2*offset),
+                                       rx=8, ry=8, fill="none",
+                                       stroke=stroke_c, stroke_width=stroke_width))
+            target.add(target.text(denom, insert=(x+size/2, y+size/2),
+                                   font_size=22, text_anchor="middle",
+                                   alignment_baseline="middle",
+                                   font_family="Daemon Full Working", fill=secondary))
+            micro_text_pattern(target, x+12, y+12, denom, c_main=secondary, c_highlight=highlight)
+        cached_fragment(dwg, ("corner_top_left", x, y, denom, size, stroke_width), build)
 
     def top_right(x, y, denom):
         main, secondary, highlight = COLORS[1]
@@ -301,18 +322,20 @@ def add_functional_corner_decorations(dwg, W, H, denom, timestamp, serial_id,
 
     def bottom_right(x, y, denom, timestamp):
         main, secondary, highlight = COLORS[3]
-        for i in range(4):
-            offset = i*size*0.18
-            stroke_c = main if i % 2 else highlight
-            dwg.add(dwg.rect(insert=(x - size + offset, y - size + offset),
-                             size=(size - 2*offset, size - 2*offset),
-                             rx=10, ry=10, fill="none",
-                             stroke=stroke_c, stroke_width=stroke_width))
+        def build(target):
+            for i in range(4):
+                offset = i*size*0.18
+                stroke_c = main if i % 2 else highlight
+                target.add(target.rect(insert=(x - size + offset, y - size + offset),
+                                       size=(size - 2*offset, size - 2*offset),
+                                       rx=10, ry=10, fill="none",
+                                       stroke=stroke_c, stroke_width=stroke_width))
+        cached_fragment(dwg, ("corner_bottom_right", x, y, size, stroke_width), build)
         dwg.add(dwg.text(denom, insert=(x - size/2, y - size/2),
                          font_size=22, text_anchor="middle",
                          alignment_baseline="middle",
                          font_family="Daemon Full Working", fill=random.choice([secondary, highlight])))
-        micro_text_pattern(x - size + 5, y - size + 5, f"{denom} {timestamp}",
+        micro_text_pattern(dwg, x - size + 5, y - size + 5, f"{denom} {timestamp}",
                            c_main=secondary, c_highlight=highlight)
 
     # Apply all four corners
@@ -411,7 +434,6 @@ def add_decorative_border(dwg, W:int, H:int, border_info:dict, denom_value: int,
 
     for band_index, (band_name, value, band_cm) in enumerate(bands):
         band_size = cm_to_px(band_cm)
-        g = dwg.g()
 
         # number of tiles along edges
         num_cols = int((width - 2*pad_base - 2*inset) // band_size)
@@ -419,35 +441,43 @@ def add_decorative_border(dwg, W:int, H:int, border_info:dict, denom_value: int,
 
         offset = value + (denom_value % 97)
 
-        # --- top border
-        y = start_y + pad_base + inset
-        for c in range(num_cols):
-            x = start_x + pad_base + inset + c * band_size
-            kind = (c + offset) % 5
-            draw_shape(g, x, y, band_size, kind, band_index)  # Added band_index
-
-        # --- bottom border
-        y = start_y + height - pad_base - inset - band_size
-        for c in range(num_cols):
-            x = start_x + pad_base + inset + c * band_size
-            kind = (c + offset + 1) % 5
-            draw_shape(g, x, y, band_size, kind, band_index)  # Added band_index
-
-        # --- left border
-        x = start_x + pad_base + inset
-        for r in range(num_rows):
-            y = start_y + pad_base + inset + r * band_size
-            kind = (r + offset + 2) % 5
-            draw_shape(g, x, y, band_size, kind, band_index)  # Added band_index
-
-        # --- right border
-        x = start_x + width - pad_base - inset - band_size
-        for r in range(num_rows):
-            y = start_y + pad_base + inset + r * band_size
-            kind = (r + offset + 3) % 5
-            draw_shape(g, x, y, band_size, kind, band_index)  # Added band_index
-
-        dwg.add(g)
+        # A band only depends on its geometry and on offset % 5, so the few
+        # variants per denomination are built once and spliced from the cache
+        def build_band(target):
+            g = target.g()
+
+            # --- top border
+            y = start_y + pad_base + inset
+            for c in range(num_cols):
+                x = start_x + pad_base + inset + c * band_size
+                kind = (c + offset) % 5
+                draw_shape(g, x, y, band_size, kind, band_index)  # Added band_index
+
+            # --- bottom border
+            y = start_y + height - pad_base - inset - band_size
+            for c in range(num_cols):
+                x = start_x + pad_base + inset + c * band_size
+                kind = (c + offset + 1) % 5
+                draw_shape(g, x, y, band_size, kind, band_index)  # Added band_index
+
+            # --- left border
+            x = start_x + pad_base + inset
+            for r in range(num_rows):
+                y = start_y + pad_base + inset + r * band_size
+                kind = (r + offset + 2) % 5
+                draw_shape(g, x, y, band_size, kind, band_index)  # Added band_index
+
+            # --- right border
+            x = start_x + width - pad_base - inset - band_size
+            for r in range(num_rows):
+                y = start_y + pad_base + inset + r * band_size
+                kind = (r + offset + 3) % 5
+                draw_shape(g, x, y, band_size, kind, band_index)  # Added band_index
+
+            target.add(g)
+
+        cached_fragment(dwg, ("border_band", band_index, start_x, start_y, width, height,
+                              inset, band_size, offset % 5), build_band)
         inset += band_size
 
 import math
@@ -897,50 +927,24 @@ def add_subtle_frame_and_microgrid(dwg, W: int, H: int, border_info: dict, denom
 
     # --- Deterministic microdots based on inputs ---
     base_cell = 3
-    cols = math.ceil(diamond_width / base_cell)
-    rows = math.ceil(diamond_height / base_cell)
+    hue_colors = [hsl_to_rgb_string(h, 85, 55) for h in range(360)]
 
     g = dwg.g(opacity=0.25)
-    for r in range(rows):
-        for c in range(cols):
-            # Deterministic decision to draw dot
-            dot_value = (denom_seed * r * 17 + time_seed * c * 23 + hash_seed * 29) % 100
-            if dot_value < 40:  # 40% density
-                x = diamond_start_x + c * base_cell
-                y = diamond_start_y + r * base_cell
-                
-                # Deterministic color from inputs
-                color_hue = (denom_seed * c * 41 + time_seed * r * 31 + hash_seed * 19) % 360
-                color = hsl_to_rgb_string(color_hue, 85, 55)
-
-                
-                # Deterministic size and position
-                size_seed = (denom_seed * r * 7 + time_seed * c * 11) % 100
-                radius = 0.5 + (size_seed / 100) * 1.0
-                
-                pos_seed = (denom_seed * c * 13 + time_seed * r * 17) % 100
-                jitter_x = ((pos_seed / 100) * 2.4) - 1.2
-                jitter_y = (((pos_seed * 7) % 100 / 100) * 2.4) - 1.2
-                
-                opacity_seed = (denom_seed * r * 3 + time_seed * c * 5) % 100
-                opacity = 0.1 + (opacity_seed / 100) * 0.7
-                
-                g.add(dwg.circle(
-                    center=(x + base_cell/2 + jitter_x, y + base_cell/2 + jitter_y),
-                    r=radius,
-                    fill=color,
-                    opacity=opacity
-                ))
+    dots = g.add(dwg.g(id=microgrid_id(diamond_start_x, diamond_start_y, diamond_width, diamond_height,
+                                       denom_seed, time_seed, hash_seed, base_cell)))
+    for x, y, radius, hue, opacity in zip(*microgrid_dots(diamond_start_x, diamond_start_y,
+                                                          diamond_width, diamond_height,
+                                                          denom_seed, time_seed, hash_seed, base_cell)):
+        dots.add(dwg.circle(center=(x, y), r=radius, fill=hue_colors[hue], opacity=opacity))
     dwg.add(g)
 
-    # --- Mirror layer (deterministic opacity) ---
+    # --- Mirror layer (deterministic opacity), drawn by reference ---
     mirror_opacity = 0.04 + ((denom_seed + time_seed) % 100) * 0.0004
     mirror = dwg.g(
         transform=f"translate({diamond_start_x + diamond_width/2},0) scale(-1,1) translate({-diamond_start_x - diamond_width/2},0)", 
         opacity=mirror_opacity
     )
-    for elem in g.elements:
-        mirror.add(elem.copy())
+    mirror.add(dwg.use(dots))
     dwg.add(mirror)
 
 def add_circular_qr_continuous(dwg, cx, cy, text, inner_radius=0, outer_radius=256,
@@ -958,23 +962,12 @@ def add_circular_qr_continuous(dwg, cx, cy, text, inner_radius=0, outer_radius=2
     qr.add_data(str(text))
     qr.make(fit=True)
     qr_matrix = qr.get_matrix()
-    qr_size = len(qr_matrix)
 
-    for i in range(segments):
-        theta_start = 2 * math.pi * i / segments
-        theta_end = 2 * math.pi * (i + 1) / segments
-
-        for j in range(inner_radius, outer_radius):
-            qr_x = int(i / segments * qr_size) % qr_size
-            qr_y = int((j - inner_radius) / (outer_radius - inner_radius) * qr_size) % qr_size
-
-            if qr_matrix[qr_y][qr_x]:
-                x1 = cx + j * math.cos(theta_start)
-                y1 = cy + j * math.sin(theta_start)
-                x2 = cx + j * math.cos(theta_end)
-                y2 = cy + j * math.sin(theta_end)
-                color = colors[(i+j) % len(colors)]
-                dwg.add(dwg.line(start=(x1,y1), end=(x2,y2), stroke=color, stroke_width=1.2, opacity=opacity))
+    # One stroked path per run of set modules and color instead of a line per pixel radius
+    group = dwg.add(dwg.g(fill="none", stroke_width=1.2))
+    for color_idx, d in circular_qr_runs(qr_matrix, cx, cy, inner_radius, outer_radius,
+                                         segments, len(colors)):
+        group.add(dwg.path(d=d, stroke=colors[color_idx], opacity=opacity))
 
 def generate_timestamp():
     return datetime.now().strftime("%Y%m%d-%H%M")
@@ -1315,40 +1308,14 @@ def add_qr_like_border(dwg: svgwrite.Drawing, seed: str, width: int, height: int
     
     cell = max(2, border_thickness_px // 8)
     
-    qr_border_width = qr_border_end_x - qr_border_start_x
-    qr_border_height = qr_border_end_y - qr_border_start_y
-    cols = int(math.ceil(qr_border_width / cell))
-    rows = int(math.ceil(qr_border_height / cell))
-    
     seed_bytes = to_bytes(make_qr_seed(seed, serial_id, str(timestamp_ms) if timestamp_ms else None))
     
-    for r in range(rows):
-        for c in range(cols):
-            x = qr_border_start_x + c * cell
-            y = qr_border_start_y + r * cell
-            
-            if (qr_border_inner_start_x <= x < qr_border_inner_end_x and
-                qr_border_inner_start_y <= y < qr_border_inner_end_y):
-                continue
-            
-            idx = (r * cols + c) % len(seed_bytes)
-            v = seed_bytes[idx]
-
-            red = (v * 3) % 256
-            green = (v * 7 + r * 5) % 256
-            blue = (v * 13 + c * 11) % 256
-            color = f"rgb({red},{green},{blue})"
-
-            s = 1 if (v % 3 == 0) else (0.6 if (v % 3 == 1) else 0.35)
-            w = max(1, int(cell * s))
-            h = max(1, int(cell * s))
-
-            dwg.add(dwg.rect(
-                insert=(x + (cell - w) / 2, y + (cell - h) / 2),
-                size=(w, h),
-                fill=color,
-                opacity=1
-            ))
+    border = dwg.add(dwg.g(stroke="none"))
+    for color, d in qr_border_paths(seed_bytes, qr_border_start_x, qr_border_start_y,
+                                    qr_border_end_x, qr_border_end_y,
+                                    qr_border_inner_start_x, qr_border_inner_start_y,
+                                    qr_border_inner_end_x, qr_border_inner_end_y, cell):
+        border.add(dwg.path(d=d, fill=color))
     
     return {
         'diamond_start_x': qr_border_inner_start_x,
@@ -1424,12 +1391,10 @@ def generate_security_pattern(bg_input, output_path=None, seed_data=None, font_p
     # Microtext option
     font, text = None, None
     if font_path and os.path.exists(font_path):
-        try:
-            font_size = max(6, int(min(width, height) * 0.02))
-            font = ImageFont.truetype(font_path, font_size)
+        font_size = max(6, int(min(width, height) * 0.02))
+        font = get_pil_font(font_path, font_size)
+        if font is not None:
             text = str(seed_data)
-        except Exception as e:
-            print(f"[!] Font load failed: {e}")
 
     # Draw pattern
     for x in range(0, width, 5):
@@ -1455,6 +1420,7 @@ def generate_security_pattern(bg_input, output_path=None, seed_data=None, font_p
 
     result.save(output_path)
     print(f"[+] Saved patterned image → {output_path}")
+@lru_cache(maxsize=None)
 def denomination_color(denom: int) -> str:
     """
     Returns a light ROYGBIV hex color based on the denomination.
@@ -1883,27 +1849,35 @@ def add_holographic_seals(dwg, W:int, H:int, serial_id:str, denomination:int, ra
     dwg.add(g_right_text)
 
 
+@cached_layer("chinese_microprint")
 def add_chinese_microprint(dwg: svgwrite.Drawing, cx:int, cy:int, radius:int, text="壹佰 卢纳币",
                         repetitions=1, font_family="FengGuangMingRui", font_size=8):
-    """Add Chinese microprint around a small circle as a security feature."""
+    """
+    Add Chinese microprint around a small circle as a security feature.
+    All repetitions sit on one circular <textPath> ring inside a single <text>.
+    """
     import math
     n = repetitions
+    # The ring starts half a step before angle 0 so no repetition straddles the path ends;
+    # it runs clockwise, so the glyphs are rotated like the old per-repetition text.
+    start = -math.pi / n
+    x0, y0 = cx + radius*math.cos(start), cy + radius*math.sin(start)
+    x1, y1 = cx - radius*math.cos(start), cy - radius*math.sin(start)
+    ring = dwg.path(d=f"M {x0},{y0} A {radius},{radius} 0 1,1 {x1},{y1} A {radius},{radius} 0 1,1 {x0},{y0} Z",
+                    id=f"microprint_ring_{int(cx)}_{int(cy)}_{int(radius)}")
+    dwg.defs.add(ring)
+    label = dwg.text("",
+                     font_size=font_size,
+                     font_family=font_family,
+                     fill="#000",
+                     text_anchor="middle",
+                     alignment_baseline="middle")
     for i in range(n):
-        angle = 2*math.pi*i/n
-        x = cx + radius*math.cos(angle)
-        y = cy + radius*math.sin(angle)
-        rotation = math.degrees(angle) + 90
-        dwg.add(dwg.text(text,
-                        insert=(x,y),
-                        font_size=font_size,
-                        font_family=font_family,
-                        fill="#000",
-                        opacity=1,
-                        text_anchor="middle",
-                        alignment_baseline="middle",
-                        transform=f"rotate({rotation},{x},{y})"))
+        label.add(dwg.textPath(ring, text, startOffset=f"{100*(i + 0.5)/n:g}%"))
+    dwg.add(label)
 def generate_backside_svg(outfile: str, denomination: int, title_text: str, phrase_text: str, size_px: Tuple[int,int], 
-                         serial_id: str = None, timestamp_ms: str = None, seed_text: str = ""):
+                         serial_id: str = None, timestamp_ms: str = None, seed_text: str = "",
+                         segmentation_backend: str = None, writer: str = None):
     W, H = size_px
     denom_exp = int(math.log10(denomination)) if denomination > 0 else 0
     timestamp = timestamp_ms or generate_timestamp_ms_precise()
@@ -1922,7 +1896,7 @@ def generate_backside_svg(outfile: str, denomination: int, title_text: str, phra
     
     print(f"[+] Backside metadata seed: {encoded_seed[:30]}...")
     
-    dwg = svgwrite.Drawing(outfile, size=(W,H), viewBox=f"0 0 {W} {H}")
+    dwg = new_drawing(outfile, size=(W,H), viewBox=f"0 0 {W} {H}", writer=writer)
     embed_font(dwg, CHINESE_FONT, "FengGuangMingRui")
     embed_font(dwg, NUMBER_FONT, "Daemon Full Working")
     dwg.add(dwg.rect(insert=(0,0), size=(W,H), fill=denomination_color(denom=denom_value)))
@@ -1935,7 +1909,8 @@ def generate_backside_svg(outfile: str, denomination: int, title_text: str, phra
         H=H,
         seed_text=seed_text,
         bg_dir="./backgrounds",
-        n_segments=1024
+        n_segments=1024,
+        backend=segmentation_backend or backend_for_denomination(denom_value)
     )
     cx, cy = W//2, H//2
     
@@ -1975,7 +1950,7 @@ def generate_backside_svg(outfile: str, denomination: int, title_text: str, phra
     qr_url=f"https://bank.linglin.art/verify/{serial_id}"
     # Add ROYGBIV QR style with metadata-based theming
     add_roygbiv_qr_style(dwg, W=W, H=H, url=qr_url, stamp_width=60, stamp_height=60, rows=6)
-    matrix = segno.make(qr_url).matrix  # matrix is a list of lists of booleans
+    matrix = segno_matrix(qr_url)  # memoized rows of booleans
 
     add_colored_aztec_to_canvas(
         dwg,
@@ -2016,7 +1991,7 @@ except ImportError:
 # ROYGBIV palette
 COLORS = ["#FF0000", "#FF7F00", "#FFFF00", "#00FF00", "#0000FF", "#4B0082", "#8B00FF"]
 import segno
-from aztec import aztec_matrix_from_segno, build_colored_aztec_svg
+from aztec import aztec_matrix_from_segno, colored_aztec_svg_data_url, segno_matrix
 import tempfile
 import base64
 import svgwrite
@@ -2040,40 +2015,29 @@ def add_colored_aztec_to_canvas(
     - black modules,
     - optional rotation (degrees).
     """
-    nrows = len(matrix)
     ncols = len(matrix[0])
 
     qr_size = ncols * scale  # actual QR size in px (square)
+    total = qr_size + 2*border
     border_color = denomination_to_color(denom_exponent)
 
-    # Group everything together so it rotates around the QR's center
-    qr_group = dwg.g(transform=f"rotate({rotation},{cx},{cy})")
+    # The code is drawn once as a <symbol> in <defs>; every call only adds a <use>
+    symbol_id = f"aztec-{matrix_digest(matrix, (scale, border, border_color, border_opacity))}"
+    if not any(e.attribs.get("id") == symbol_id for e in dwg.defs.elements):
+        symbol = dwg.defs.add(dwg.symbol(id=symbol_id, viewBox=f"0 0 {total} {total}"))
 
-    # 1. Colored border (semi-transparent)
-    qr_group.add(dwg.rect(
-        insert=(cx - (qr_size/2 + border), cy - (qr_size/2 + border)),
-        size=(qr_size + 2*border, qr_size + 2*border),
-        fill=border_color,
-        opacity=border_opacity
-    ))
+        # 1. Colored border (semi-transparent)
+        symbol.add(dwg.rect(insert=(0, 0), size=(total, total), fill=border_color, opacity=border_opacity))
 
-    # 2. White background
-    qr_group.add(dwg.rect(
-        insert=(cx - qr_size/2, cy - qr_size/2),
-        size=(qr_size, qr_size),
-        fill="white",
-        opacity=border_opacity
-    ))
+        # 2. White background
+        symbol.add(dwg.rect(insert=(border, border), size=(qr_size, qr_size), fill="white", opacity=border_opacity))
 
-    # 3. Black modules
-    for r in range(nrows):
-        for c in range(ncols):
-            if matrix[r][c]:  # filled module
-                x = cx - qr_size/2 + c * scale
-                y = cy - qr_size/2 + r * scale
-                qr_group.add(dwg.rect(insert=(x, y), size=(scale, scale), fill="black"))
+        # 3. Black modules, run-length encoded into one path
+        symbol.add(dwg.path(d=module_runs_path(matrix, scale, border, border), fill="black"))
 
-    dwg.add(qr_group)
+    # Rotate around the QR's center
+    dwg.add(dwg.use(f"#{symbol_id}", insert=(cx - total/2, cy - total/2), size=(total, total),
+                    transform=f"rotate({rotation},{cx},{cy})"))
     return dwg
 
 
@@ -2091,18 +2055,9 @@ def add_colored_aztecs(
     offset: int = 300,
     size: int = 150
 ) -> svgwrite.Drawing:
-    # Build matrix and temporary SVG for Aztec
+    # Build matrix and the Aztec SVG in memory, encoded as a data URL
     matrix = aztec_matrix_from_segno(qr_url)
-    with tempfile.NamedTemporaryFile(suffix=".svg", delete=False) as tmp_file:
-        tmp_svg_path = tmp_file.name
-
-    build_colored_aztec_svg(matrix, scale=scale, margin_modules=margin,
-                            style=style, out_path=tmp_svg_path)
-
-    # Load Aztec SVG and encode to base64
-    with open(tmp_svg_path, "rb") as f:
-        svg_bytes = f.read()
-    svg_data_url = "data:image/svg+xml;base64," + base64.b64encode(svg_bytes).decode("ascii")
+    svg_data_url = colored_aztec_svg_data_url(matrix, scale=scale, margin_modules=margin, style=style)
 
     # Left Aztec
     dwg.add(dwg.image(
@@ -2368,9 +2323,11 @@ def add_verification_text(dwg, W, H, serial_id, timestamp):
         opacity=0.7
     ))
 import glob
-def add_vectorized_background(dwg, W, H, seed_text="", bg_dir="./backgrounds", margin=60, n_segments=1024, background_prompt=""):
+def add_vectorized_background(dwg, W, H, seed_text="", bg_dir="./backgrounds", margin=60, n_segments=1024, background_prompt="",
+                              backend="slic"):
     """
     Enhanced version that generates background using prompt from background_prompt.txt
+    `backend` names the region segmentation used (see segmentation_backends.py).
     """
     import os
     import glob
@@ -2378,8 +2335,8 @@ def add_vectorized_background(dwg, W, H, seed_text="", bg_dir="./backgrounds", m
     import random
     import numpy as np
     from PIL import Image
-    from skimage import color, segmentation, measure
     import svgwrite
+    from segmentation_backends import segment_image, vectorize_segments
     
     background_path = None
     
@@ -2418,35 +2375,12 @@ def add_vectorized_background(dwg, W, H, seed_text="", bg_dir="./backgrounds", m
     
     # convert to np array
     arr = np.array(img)
-    arr_lab = color.rgb2lab(arr)
-
-    # segment into superpixels
-    segments = segmentation.slic(arr_lab, n_segments=n_segments, compactness=20, start_label=1)
-
-    # extract contours of each segment
-    group = dwg.g(opacity=0.7)  # Group for all background elements
-    
-    for seg_val in np.unique(segments):
-        mask = (segments == seg_val).astype(float)
-        contours = measure.find_contours(mask, 0.5)
-
-        for contour in contours:
-            # rescale contour to SVG coords (add margin)
-            contour = contour[:, ::-1]  # (y, x) → (x, y)
-            contour[:, 0] += margin
-            contour[:, 1] += margin
 
-            # build path string
-            path_data = "M " + " L ".join(f"{x:.2f},{y:.2f}" for x, y in contour) + " Z"
+    # segment into regions and trace each one as a filled path
+    segments = segment_image(arr, backend=backend, n_segments=n_segments)
+    group = vectorize_segments(dwg, arr, segments, margin=margin, opacity=0.7)
 
-            # get average color for this region
-            avg_col = np.mean(arr[segments == seg_val], axis=0).astype(int)
-            fill = svgwrite.rgb(int(avg_col[0]), int(avg_col[1]), int(avg_col[2]))
-
-            group.add(dwg.path(d=path_data, fill=fill, stroke="none"))
-
-    dwg.add(group)
-    print(f"[+] Vectorized background with {len(np.unique(segments))} segments")
+    print(f"[+] Vectorized background with {len(np.unique(segments))} segments ({backend})")
     return group
 
 
@@ -2728,17 +2662,42 @@ def fractal_stamp(
             transform=f"rotate(-15,{x},{y})"
         ))
 
+def _generate_backside(profiler, templates, path, denomination, title_text, phrase_text, size_px,
+                       optimize=False, **kwargs):
+    """
+    generate_backside_svg, filled into the precompiled design template when
+    NoteTemplates are given, profiled per layer when a LayerProfiler is given
+    and run through the SVG optimizer when `optimize` is set.
+    """
+    with ExitStack() as stack:
+        if templates is not None:
+            stack.enter_context(templates.note(globals(), key=(denomination, title_text, phrase_text)))
+        if profiler is not None:
+            stack.enter_context(profiler.note(globals(), path))
+        generate_backside_svg(path, denomination, title_text, phrase_text, size_px, **kwargs)
+    if profiler is not None:
+        profiler.print_table()
+    if optimize:
+        optimize_svg_file(path)
+
 def run_single_denomination(outdir: str = ".", base_name: str = "banknote", denomination: int = 1, 
                            width_mm: float = 160.0, height_mm: float = 60.0,
                            title_text: str = "灵国国库", phrase_text: str = "灵之意志，天下共识",
-                           png: bool = False):
+                           png: bool = False, segmentation_backend: str = None,
+                           writer: str = None, profile: str = None, templates: bool = False,
+                           optimize: bool = False, svgz: bool = False):
     W = mm_to_px(width_mm)
     H = mm_to_px(height_mm)
     os.makedirs(outdir, exist_ok=True)
+    profiler = LayerProfiler() if profile else None
+    note_templates = NoteTemplates("back", BACK_STATIC_LAYERS) if templates else None
     
-    fname = f"{base_name}.svg"
+    fname = f"{base_name}.svgz" if svgz else f"{base_name}.svg"
     path = os.path.join(outdir, fname)
-    generate_backside_svg(path, denomination, title_text, phrase_text, (W,H))
+    _generate_backside(profiler, note_templates, path, denomination, title_text, phrase_text, (W,H),
+                       optimize=optimize, segmentation_backend=segmentation_backend, writer=writer)
+    if profiler is not None:
+        profiler.save_json(profile)
     
     if png:
         if not CAIROSVG_AVAILABLE:
@@ -2754,16 +2713,21 @@ def run_single_denomination(outdir: str = ".", base_name: str = "banknote", deno
 # Then modify the argument parsing to accept a denomination parameter
 def run_batch(outdir: str = ".", base_name: str = "banknote", width_mm: float = 160.0, height_mm: float = 60.0,
               title_text: str = "灵国国库", phrase_text: str = "灵之意志，天下共识",
-              png: bool = False):
+              png: bool = False, segmentation_backend: str = None,
+              writer: str = None, profile: str = None, templates: bool = False,
+              optimize: bool = False, svgz: bool = False):
     denoms = [10**i for i in range(0,9)]
     W = mm_to_px(width_mm)
     H = mm_to_px(height_mm)
     os.makedirs(outdir, exist_ok=True)
+    profiler = LayerProfiler() if profile else None
+    note_templates = NoteTemplates("back", BACK_STATIC_LAYERS) if templates else None
     for d in denoms:
         # Include denomination in the filename to avoid overwriting
-        fname = f"{base_name}_{d}.svg"  # Add denomination to filename
+        fname = f"{base_name}_{d}.svgz" if svgz else f"{base_name}_{d}.svg"  # Add denomination to filename
         path = os.path.join(outdir, fname)
-        generate_backside_svg(path, d, title_text, phrase_text, (W,H))
+        _generate_backside(profiler, note_templates, path, d, title_text, phrase_text, (W,H),
+                           optimize=optimize, segmentation_backend=segmentation_backend, writer=writer)
         if png:
             if not CAIROSVG_AVAILABLE:
                 print("[!] cairosvg not installed — skipping PNG for", path)
@@ -2774,6 +2738,8 @@ def run_batch(outdir: str = ".", base_name: str = "banknote", width_mm: float =
                     print(f"[+] Saved {png_path}")
                 except Exception as e:
                     print("[!] Failed to convert to PNG:", e)
+    if profiler is not None:
+        profiler.save_json(profile)
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Generate Red/Blue symmetric banknotes")
     parser.add_argument("--outdir", type=str, default=".", help="Output directory")
@@ -2784,12 +2750,52 @@ if __name__ == "__main__":
     parser.add_argument("--title", type=str, default="灵国国库", help="Center title text")
     parser.add_argument("--phrase", type=str, default="灵之意志，天下共识", help="Phrase under the title")
     parser.add_argument("--png", action="store_true", help="Attempt to output PNGs (requires cairosvg)")
+    parser.add_argument("--segmentation", type=str, default=None, choices=sorted(SEGMENTATION_BACKENDS),
+                        help="Background segmentation backend (default: per-denomination choice)")
+    parser.add_argument("--writer", type=str, default=None, choices=WRITERS,
+                        help="SVG writer: 'stream' (default) or the original 'svgwrite'")
+    parser.add_argument("--profile", type=str, default=None,
+                        help="Profile every layer and write the JSON report to this path")
+    parser.add_argument("--templates", action="store_true",
+                        help="Reuse precompiled per-denomination templates (./note_templates) for the static artwork")
+    parser.add_argument("--optimize", action="store_true",
+                        help="Run the SVG optimizer (CSS classes, defaults, group merge) on every saved note")
+    parser.add_argument("--font-mode", type=str, default="embed", choices=font_subset.FONT_MODES,
+                        help="'embed' fonts into every note (self-contained, for print) or reference them "
+                             "from the versioned /static/fonts/ URLs served by the web app")
+    parser.add_argument("--full-fonts", action="store_true",
+                        help="Embed the complete font files instead of per-note glyph subsets")
+    parser.add_argument("--font-flavor", type=str, default=None, choices=font_subset.SUBSET_FLAVORS,
+                        help="Compress the embedded font subsets as WOFF or WOFF2 (needs brotli)")
+    parser.add_argument("--text-outlines", action="store_true",
+                        help="Write text as glyph outline paths (cached in ./glyph_cache) so notes need no fonts")
+    parser.add_argument("--gzip", type=str, default=None, choices=("sidecar", "svgz"),
+                        help="'sidecar' also writes a precompressed .svg.gz next to every .svg, "
+                             "'svgz' writes gzip-compressed .svgz notes instead")
+    parser.add_argument("--precision", type=int, default=-1,
+                        help="Decimals kept in SVG geometry attributes (default -1 keeps full float precision; "
+                             "stream writer only)")
     args = parser.parse_args()
+    if args.precision >= 0 and (args.writer or svg_stream.DEFAULT_WRITER) == "svgwrite":
+        parser.error("--precision needs the stream writer; svgwrite always writes full float precision")
+    svg_stream.COORD_PRECISION = args.precision if args.precision >= 0 else None
+    svg_stream.GZIP_SIDECAR = args.gzip == "sidecar"
+    if args.text_outlines:
+        glyph_outlines.enable()
+    font_subset.SUBSET_ENABLED = not args.full_fonts
+    font_subset.SUBSET_FLAVOR = args.font_flavor
+    font_subset.FONT_MODE = args.font_mode
 
     if args.denomination:
         run_single_denomination(outdir=args.outdir, base_name=args.basename, denomination=args.denomination,
                                width_mm=args.width_mm, height_mm=args.height_mm,
-                               title_text=args.title, phrase_text=args.phrase, png=args.png)
+                               title_text=args.title, phrase_text=args.phrase, png=args.png,
+                               segmentation_backend=args.segmentation, writer=args.writer,
+                               profile=args.profile, templates=args.templates,
+                               optimize=args.optimize, svgz=args.gzip == "svgz")
     else:
         run_batch(outdir=args.outdir, base_name=args.basename, width_mm=args.width_mm, height_mm=args.height_mm,
-                  title_text=args.title, phrase_text=args.phrase, png=args.png)
\ No newline at end of file
+                  title_text=args.title, phrase_text=args.phrase, png=args.png,
+                  segmentation_backend=args.segmentation, writer=args.writer,
+                  profile=args.profile, templates=args.templates,
+                  optimize=args.optimize, svgz=args.gzip == "svgz")
\ No newline at end of file
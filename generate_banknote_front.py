@@ -17,11 +17,24 @@ import base64
 import argparse
 import hashlib
 from typing import Tuple, List
+from contextlib import ExitStack
 import binascii
 from PIL import Image, ImageOps
 import numpy as np
 from sklearn.cluster import KMeans
 import requests
+from segmentation_backends import SEGMENTATION_BACKENDS, backend_for_denomination
+import svg_stream
+from svg_stream import new_drawing, WRITERS
+from functools import lru_cache
+from layer_cache import cached_layer, cached_fragment
+from layer_profiler import LayerProfiler
+from note_templates import NoteTemplates, FRONT_STATIC_LAYERS
+from font_registry import FontRegistry, get_pil_font
+from svg_optimize import optimize_svg_file
+import glyph_outlines
+from text_layout import mixed_runs, anchor_start, text_width
+from vector_layers import halftone_paths, qr_border_paths, microgrid_dots, microgrid_id, module_runs_path, matrix_digest
 try:
     import svgwrite
 except Exception:
@@ -80,12 +93,10 @@ def generate_security_pattern(bg_path, output_path=None, seed_data=None, font_pa
     # Microtext option
     font, text = None, None
     if font_path:
-        try:
-            font_size = max(6, int(min(width, height) * 0.02))
-            font = ImageFont.truetype(font_path, font_size)
+        font_size = max(6, int(min(width, height) * 0.02))
+        font = get_pil_font(font_path, font_size)
+        if font is not None:
             text = str(seed_data)
-        except Exception as e:
-            print(f"[!] Font load failed: {e}")
 
     # Draw pattern
     for x in range(0, width, 5):
@@ -133,18 +144,8 @@ def image_to_datauri_png(img: Image.Image) -> str:
 # Load fonts (optional)
 # ----------------------
 def load_fonts(font_dir="./fonts"):
-    fonts = {}
-    if not os.path.isdir(font_dir):
-        return fonts
-    for fn in os.listdir(font_dir):
-        if fn.lower().endswith((".otf", ".ttf")):
-            try:
-                font_name = os.path.splitext(fn)[0]
-                fonts[font_name] = TTFont(os.path.join(font_dir, fn))
-                print(f"[+] Loaded font: {fn}")
-            except Exception as e:
-                print(f"[!] Could not load font {fn}: {e}")
-    return fonts
+    """Name -> TTFont mapping of font_dir; fonts are parsed on first access (see font_registry.py)."""
+    return FontRegistry(font_dir)
 
 from svgwrite import path
 
@@ -399,46 +400,16 @@ def add_qr_like_border(dwg: svgwrite.Drawing, seed: str, width: int, height: int
     # Cell size
     cell = max(2, border_thickness_px // 8)
 
-    # Grid dimensions
-    qr_border_width = qr_border_end_x - qr_border_start_x
-    qr_border_height = qr_border_end_y - qr_border_start_y
-    cols = int(math.ceil(qr_border_width / cell))
-    rows = int(math.ceil(qr_border_height / cell))
-
     # Seed bytes
     seed_bytes = to_bytes(make_qr_seed(seed, serial_id, str(timestamp_ms) if timestamp_ms else None))
 
-    # Draw border
-    for r in range(rows):
-        for c in range(cols):
-            x = float(qr_border_start_x + c * cell)
-            y = float(qr_border_start_y + r * cell)
-
-            # Skip inner area
-            if (qr_border_inner_start_x <= x < qr_border_inner_end_x and
-                qr_border_inner_start_y <= y < qr_border_inner_end_y):
-                continue
-
-            idx = (r * cols + c) % len(seed_bytes)
-            v = seed_bytes[idx]
-
-            # Color
-            red = int((v * 3) % 256)
-            green = int((v * 7 + r * 5) % 256)
-            blue = int((v * 13 + c * 11) % 256)
-            color = f"rgb({red},{green},{blue})"
-
-            # Size scaling
-            s = 1.0 if (v % 3 == 0) else (0.6 if (v % 3 == 1) else 0.35)
-            w = float(max(1, int(cell * s)))
-            h = float(max(1, int(cell * s)))
-
-            dwg.add(dwg.rect(
-                insert=(x + (cell - w) / 2, y + (cell - h) / 2),
-                size=(w, h),
-                fill=color,
-                fill_opacity=1.0
-            ))
+    # Draw border: border cells only, one path per color
+    border = dwg.add(dwg.g(stroke="none"))
+    for color, d in qr_border_paths(seed_bytes, qr_border_start_x, qr_border_start_y,
+                                    qr_border_end_x, qr_border_end_y,
+                                    qr_border_inner_start_x, qr_border_inner_start_y,
+                                    qr_border_inner_end_x, qr_border_inner_end_y, cell):
+        border.add(dwg.path(d=d, fill=color))
 
     return {
         'diamond_start_x': qr_border_inner_start_x,
@@ -483,24 +454,12 @@ def polar_mandala(seed: bytes, px_radius: float, layers=6, sym=12, points=800,
 # Center seal as concentric colored dots
 # ------------------------
 def add_center_seal(dwg: svgwrite.Drawing, im: Image.Image, cx: float, cy: float, size_px: float, frame=True, step=4):
-    im = im.convert("RGB").resize((int(size_px), int(size_px)), Image.LANCZOS)
-    pixels = im.load()
     radius = size_px/2
 
-    for row in range(0, im.height, step):
-        for col in range(0, im.width, step):
-            dx = col - radius
-            dy = row - radius
-            if dx*dx + dy*dy > radius*radius:
-                continue  # omit dots outside circle
-            r, g, b = pixels[col, row]
-            dwg.add(dwg.circle(
-                center=(cx - radius + col, cy - radius + row),
-                r=step/2,
-                fill=svgwrite.rgb(r, g, b),
-                stroke="none",
-                opacity=1.0
-            ))
+    # Halftone dots grouped into one path per color; cached across the series
+    seal = dwg.add(dwg.g(transform=f"translate({cx - radius},{cy - radius})", stroke="none"))
+    for fill, d in halftone_paths(im, size_px, step=step):
+        seal.add(dwg.path(d=d, fill=fill))
 
     if frame:
         dwg.add(dwg.circle(center=(cx, cy), r=radius+8, fill="none", stroke="#000", stroke_width=2.0))
@@ -510,7 +469,7 @@ def add_mixed_font_text(dwg, text, insert_pos, text_anchor="middle", font_size=1
                        padding=2, fill_color="currentColor"):
     """
     Add mixed Chinese/English text with proper alignment and padding
-    
+
     Parameters:
     dwg: svgwrite Drawing object
     text: input text containing mixed Chinese and English
@@ -522,73 +481,20 @@ def add_mixed_font_text(dwg, text, insert_pos, text_anchor="middle", font_size=1
     padding: space between language segments
     fill_color: text color
     """
-    
-    # Pattern to match Chinese characters
-    chinese_pattern = r'[\u4e00-\u9fff\u3400-\u4dbf\uf900-\ufaff]+'
-    
     x, y = insert_pos
-    segments = []
-    last_end = 0
-    
-    # Split text into Chinese and non-Chinese segments
-    for match in re.finditer(chinese_pattern, text):
-        # Add non-Chinese text before the match
-        if match.start() > last_end:
-            segments.append(('english', text[last_end:match.start()]))
-        
-        # Add Chinese text
-        segments.append(('chinese', match.group()))
-        last_end = match.end()
-    
-    # Add remaining non-Chinese text
-    if last_end < len(text):
-        segments.append(('english', text[last_end:]))
-    
-    # Calculate total width and segment positions
-    segment_widths = []
-    total_width = 0
-    
-    for lang_type, segment_text in segments:
-        if segment_text.strip():
-            # Different width multipliers for Chinese vs English
-            char_width = font_size * 0.85 if lang_type == 'chinese' else font_size * 0.55
-            width = len(segment_text) * char_width
-            segment_widths.append(width)
-            total_width += width + padding
-        else:
-            segment_widths.append(0)
-    
-    total_width -= padding  # Remove last padding
-    
-    # Determine starting position based on text anchor
-    if text_anchor == "middle":
-        current_x = x - total_width / 2
-    elif text_anchor == "end":
-        current_x = x - total_width
-    else:  # "start"
-        current_x = x
-    
-    # Add each segment with appropriate font and positioning
-    for i, ((lang_type, segment_text), seg_width) in enumerate(zip(segments, segment_widths)):
-        if segment_text.strip():
-            font_family = chinese_font if lang_type == 'chinese' else english_font
-            
-            # Adjust vertical position for better centering
-            # Chinese characters often need slight vertical adjustment
-            vertical_offset = 0
-            if lang_type == 'chinese':
-                vertical_offset = font_size * 0.1  # Slight upward adjustment for Chinese
-            
-            dwg.add(dwg.text(segment_text, 
-                            insert=(current_x, y + vertical_offset),
-                            text_anchor="start",
-                            font_size=font_size,
-                            font_family=font_family,
-                            fill=fill_color,
-                            alignment_baseline="middle"))
-            
-            # Update current position with padding
-            current_x += seg_width + padding
+    runs, total_width = mixed_runs(text, font_size, chinese_font, english_font, padding, padding)
+    start_x = anchor_start(x, total_width, text_anchor)
+
+    for run in runs:
+        # Chinese characters sit slightly lower on the shared middle baseline
+        vertical_offset = font_size * 0.1 if run["is_cjk"] else 0
+        dwg.add(dwg.text(run["text"],
+                        insert=(start_x + run["x"], y + vertical_offset),
+                        text_anchor="start",
+                        font_size=font_size,
+                        font_family=run["font"],
+                        fill=fill_color,
+                        alignment_baseline="middle"))
 
 
 # Alternative version for more precise control with text elements
@@ -596,138 +502,26 @@ def add_mixed_font_text_precise(dwg, text, insert_pos, text_anchor="middle", fon
                                chinese_font="FengGuangMingRui", english_font="Daemon Full Working",
                                chinese_padding=3, english_padding=1, fill_color="currentColor", stroke: str = "#000", stroke_width: float = 1 ):
     """
-    More precise version with different padding for Chinese and English
-    """
-    
-    chinese_pattern = r'[\u4e00-\u9fff\u3400-\u4dbf\uf900-\ufaff]+'
-    x, y = insert_pos
-    segments = []
-    last_end = 0
-    
-    # Split text
-    for match in re.finditer(chinese_pattern, text):
-        if match.start() > last_end:
-            segments.append(('english', text[last_end:match.start()]))
-        segments.append(('chinese', match.group()))
-        last_end = match.end()
-    
-    if last_end < len(text):
-        segments.append(('english', text[last_end:]))
-    
-    # Calculate positions
-    segment_data = []
-    total_width = 0
-    
-    for lang_type, segment_text in segments:
-        if segment_text.strip():
-            char_width = font_size * (0.85 if lang_type == 'chinese' else 0.55)
-            width = len(segment_text) * char_width
-            padding = chinese_padding if lang_type == 'chinese' else english_padding
-            segment_data.append({
-                'type': lang_type,
-                'text': segment_text,
-                'width': width,
-                'padding': padding,
-                'font': chinese_font if lang_type == 'chinese' else english_font,
-                'offset': font_size * (0.01 if lang_type == 'chinese' else 0)
-            })
-            total_width += width + padding
-        else:
-            segment_data.append({'width': 0, 'padding': 0})
-    
-    if segment_data:
-        total_width -= segment_data[-1]['padding']  # Remove last padding
-    
-    # Determine starting position
-    if text_anchor == "middle":
-        current_x = x - total_width / 2
-    elif text_anchor == "end":
-        current_x = x - total_width
-    else:
-        current_x = x
-    
-    # Render segments
-    for i, segment in enumerate(segment_data):
-        if segment.get('text'):
-            dwg.add(dwg.text(segment['text'],
-                            insert=(current_x, y + segment['offset'] - 20),
-                            text_anchor="start",
-                            font_size=font_size,
-                            font_family=segment['font'],
-                            fill=fill_color,
-                            stroke=stroke,
-                            stroke_width=stroke_width,
-                            alignment_baseline="middle"))
-            
-            current_x += segment['width'] + segment['padding']
-def add_mixed_font_text(dwg, text, insert_pos, text_anchor="middle", font_size=12, 
-                       chinese_font="FengGuangMingRui", english_font="Daemon Full Working"):
-    """
-    Add text with mixed Chinese and English fonts to SVG drawing
-    
-    Parameters:
-    dwg: svgwrite Drawing object
-    text: input text containing mixed Chinese and English
-    insert_pos: (x, y) position to insert text
-    text_anchor: text anchor position
-    font_size: base font size
-    chinese_font: font family for Chinese characters
-    english_font: font family for English characters
+    More precise version with different padding for Chinese and English.
+    Segment widths come from the fonts' advance widths (text_layout.py).
     """
-    
-    # Pattern to match Chinese characters (CJK Unified Ideographs)
-    chinese_pattern = r'[\u4e00-\u9fff\u3400-\u4dbf\uf900-\ufaff]+'
-    
     x, y = insert_pos
-    segments = []
-    last_end = 0
-    
-    # Split text into Chinese and non-Chinese segments
-    for match in re.finditer(chinese_pattern, text):
-        # Add non-Chinese text before the match
-        if match.start() > last_end:
-            segments.append(('english', text[last_end:match.start()]))
-        
-        # Add Chinese text
-        segments.append(('chinese', match.group()))
-        last_end = match.end()
-    
-    # Add remaining non-Chinese text
-    if last_end < len(text):
-        segments.append(('english', text[last_end:]))
-    
-    # Calculate total text width for centering
-    total_width = 0
-    for lang_type, segment_text in segments:
-        # Simple width estimation (adjust multiplier as needed)
-        char_width = font_size * 0.6 if lang_type == 'chinese' else font_size * 0.5
-        total_width += len(segment_text) * char_width
-    
-    # Starting position based on text anchor
-    current_x = x
-    if text_anchor == "middle":
-        current_x = x - total_width / 2
-    elif text_anchor == "end":
-        current_x = x - total_width
-    
-    # Add each segment with appropriate font
-    for lang_type, segment_text in segments:
-        if segment_text.strip():  # Skip empty segments
-            font_family = chinese_font if lang_type == 'chinese' else english_font
-            
-            dwg.add(dwg.text(segment_text, 
-                            insert=(current_x, y),
-                            text_anchor="start",
-                            font_size=font_size,
-                            font_family=font_family,
-                            fill="currentColor"))
-            
-            # Update current position (simple width estimation)
-            char_width = font_size * 0.6 if lang_type == 'chinese' else font_size * 0.6
-            current_x += len(segment_text) * char_width
-            
-            
-            
+    runs, total_width = mixed_runs(text, font_size, chinese_font, english_font,
+                                   chinese_padding, english_padding)
+    start_x = anchor_start(x, total_width, text_anchor)
+
+    for run in runs:
+        offset = font_size * (0.01 if run["is_cjk"] else 0)
+        dwg.add(dwg.text(run["text"],
+                        insert=(start_x + run["x"], y + offset - 20),
+                        text_anchor="start",
+                        font_size=font_size,
+                        font_family=run["font"],
+                        fill=fill_color,
+                        stroke=stroke,
+                        stroke_width=stroke_width,
+                        alignment_baseline="middle"))
+
 
 def clean_string(s: str) -> str:
     """
@@ -1176,8 +970,6 @@ def add_corner_denominations_split(
     """
     chinese_name = "卢纳币"  # always append
 
-    from PIL import ImageFont
-
     # Format number with commas
     try:
         num_value = int(number)
@@ -1185,14 +977,8 @@ def add_corner_denominations_split(
     except ValueError:
         number_str = number  # fallback, in case it's already a string like "SPECIMEN"
 
-    # Try to load the numeric font properly
-    try:
-        fn_numeric = ImageFont.truetype(f"./fonts/{font_numeric}", font_size_number)
-        font_family_numeric = os.path.basename(fn_numeric).replace(".ttf", "")
-
-    except Exception:
-        fn_numeric = None
-        font_family_numeric = "monospace"
+    # Advance width of the number from the numeric font's metrics
+    num_width = text_width(number_str, font_numeric, font_size_number)
 
     positions = [
         (W*0.08, H*0.12),   # top-left
@@ -1216,15 +1002,6 @@ def add_corner_denominations_split(
             opacity=1
         ))
 
-        # Approximate width for positioning Chinese label
-        num_width = font_size_number * len(number_str) * 0.6
-        try:
-            if fn_numeric:
-                bbox = fn_numeric.getbbox(number_str)
-                num_width = bbox[2] - bbox[0]
-        except Exception:
-            pass
-
         if anc_num == "end":  # right aligned
             chinese_x = x - num_width - 4
         else:  # left aligned
@@ -1265,25 +1042,32 @@ def add_treasury_and_slogan(dwg: svgwrite.Drawing, W:int, H:int,
                      alignment_baseline="middle",
                      opacity=1.0))
 
+@cached_layer("chinese_microprint")
 def add_chinese_microprint(dwg: svgwrite.Drawing, cx:int, cy:int, radius:int, text="壹佰 卢纳币",
                            repetitions=1, font_family="FengGuangMingRui", font_size=8):
-    """Add Chinese microprint around a small circle as a security feature."""
+    """
+    Add Chinese microprint around a small circle as a security feature.
+    All repetitions sit on one circular <textPath> ring inside a single <text>.
+    """
     import math
     n = repetitions
+    # The ring starts half a step before angle 0 so no repetition straddles the path ends;
+    # it runs clockwise, so the glyphs are rotated like the old per-repetition text.
+    start = -math.pi / n
+    x0, y0 = cx + radius*math.cos(start), cy + radius*math.sin(start)
+    x1, y1 = cx - radius*math.cos(start), cy - radius*math.sin(start)
+    ring = dwg.path(d=f"M {x0},{y0} A {radius},{radius} 0 1,1 {x1},{y1} A {radius},{radius} 0 1,1 {x0},{y0} Z",
+                    id=f"microprint_ring_{int(cx)}_{int(cy)}_{int(radius)}")
+    dwg.defs.add(ring)
+    label = dwg.text("",
+                     font_size=font_size,
+                     font_family=font_family,
+                     fill="#000",
+                     text_anchor="middle",
+                     alignment_baseline="middle")
     for i in range(n):
-        angle = 2*math.pi*i/n
-        x = cx + radius*math.cos(angle)
-        y = cy + radius*math.sin(angle)
-        rotation = math.degrees(angle) + 90
-        dwg.add(dwg.text(text,
-                         insert=(x,y),
-                         font_size=font_size,
-                         font_family=font_family,
-                         fill="#000",
-                         opacity=1,
-                         text_anchor="middle",
-                         alignment_baseline="middle",
-                         transform=f"rotate({rotation},{x},{y})"))
+        label.add(dwg.textPath(ring, text, startOffset=f"{100*(i + 0.5)/n:g}%"))
+    dwg.add(label)
 import hashlib
 import json
 import base64
@@ -1641,50 +1425,24 @@ def add_subtle_frame_and_microgrid(dwg, W: int, H: int, border_info: dict, denom
 
     # --- Deterministic microdots based on inputs ---
     base_cell = 3
-    cols = math.ceil(diamond_width / base_cell)
-    rows = math.ceil(diamond_height / base_cell)
+    hue_colors = [hsl_to_rgb_string(h, 85, 55) for h in range(360)]
 
     g = dwg.g(opacity=1)
-    for r in range(rows):
-        for c in range(cols):
-            # Deterministic decision to draw dot
-            dot_value = (denom_seed * r * 17 + time_seed * c * 23 + hash_seed * 29) % 100
-            if dot_value < 40:  # 40% density
-                x = diamond_start_x + c * base_cell
-                y = diamond_start_y + r * base_cell
-                
-                # Deterministic color from inputs
-                color_hue = (denom_seed * c * 41 + time_seed * r * 31 + hash_seed * 19) % 360
-                color = hsl_to_rgb_string(color_hue, 85, 55)
-
-                
-                # Deterministic size and position
-                size_seed = (denom_seed * r * 7 + time_seed * c * 11) % 100
-                radius = 0.5 + (size_seed / 100) * 1.0
-                
-                pos_seed = (denom_seed * c * 13 + time_seed * r * 17) % 100
-                jitter_x = ((pos_seed / 100) * 2.4) - 1.2
-                jitter_y = (((pos_seed * 7) % 100 / 100) * 2.4) - 1.2
-                
-                opacity_seed = (denom_seed * r * 3 + time_seed * c * 5) % 100
-                opacity = 0.1 + (opacity_seed / 100) * 0.7
-                
-                g.add(dwg.circle(
-                    center=(x + base_cell/2 + jitter_x, y + base_cell/2 + jitter_y),
-                    r=radius,
-                    fill=color,
-                    opacity=opacity
-                ))
+    dots = g.add(dwg.g(id=microgrid_id(diamond_start_x, diamond_start_y, diamond_width, diamond_height,
+                                       denom_seed, time_seed, hash_seed, base_cell)))
+    for x, y, radius, hue, opacity in zip(*microgrid_dots(diamond_start_x, diamond_start_y,
+                                                          diamond_width, diamond_height,
+                                                          denom_seed, time_seed, hash_seed, base_cell)):
+        dots.add(dwg.circle(center=(x, y), r=radius, fill=hue_colors[hue], opacity=opacity))
     dwg.add(g)
 
-    # --- Mirror layer (deterministic opacity) ---
+    # --- Mirror layer (deterministic opacity), drawn by reference ---
     mirror_opacity = 0.04 + ((denom_seed + time_seed) % 100) * 0.0004
     mirror = dwg.g(
         transform=f"translate({diamond_start_x + diamond_width/2},0) scale(-1,1) translate({-diamond_start_x - diamond_width/2},0)", 
         opacity=mirror_opacity
     )
-    for elem in g.elements:
-        mirror.add(elem.copy())
+    mirror.add(dwg.use(dots))
     dwg.add(mirror)
 # --- Dynamic data generation ---
 def generate_timestamp():
@@ -2392,6 +2150,7 @@ def hsl_to_rgb_string(h, s, l):
     r, g, b = colorsys.hls_to_rgb(h, l, s)
     return f"rgb({int(r*255)}, {int(g*255)}, {int(b*255)})"
 
+@lru_cache(maxsize=None)
 def denomination_color(denom: int) -> str:
     """
     Returns a light ROYGBIV hex color based on the denomination.
@@ -2618,9 +2377,11 @@ def generate_sd_background_from_metadata(encoded_seed, name="", width: int = 512
         print(f"[!] Error generating background: {e}")
         return None
 # Modified add_vectorized_background to accept encoded seed
-def add_vectorized_background(dwg, W, H, seed_text="", bg_dir="./backgrounds", margin=60, n_segments=1024, background_prompt=""):
+def add_vectorized_background(dwg, W, H, seed_text="", bg_dir="./backgrounds", margin=60, n_segments=1024, background_prompt="",
+                              backend="slic"):
     """
     Enhanced version that generates background using prompt from background_prompt.txt
+    `backend` names the region segmentation used (see segmentation_backends.py).
     """
     import os
     import glob
@@ -2628,8 +2389,8 @@ def add_vectorized_background(dwg, W, H, seed_text="", bg_dir="./backgrounds", m
     import random
     import numpy as np
     from PIL import Image
-    from skimage import color, segmentation, measure
     import svgwrite
+    from segmentation_backends import segment_image, vectorize_segments
     
     background_path = None
     
@@ -2668,35 +2429,12 @@ def add_vectorized_background(dwg, W, H, seed_text="", bg_dir="./backgrounds", m
     
     # convert to np array
     arr = np.array(img)
-    arr_lab = color.rgb2lab(arr)
-
-    # segment into superpixels
-    segments = segmentation.slic(arr_lab, n_segments=n_segments, compactness=20, start_label=1)
 
-    # extract contours of each segment
-    group = dwg.g(opacity=0.7)  # Group for all background elements
-    
-    for seg_val in np.unique(segments):
-        mask = (segments == seg_val).astype(float)
-        contours = measure.find_contours(mask, 0.5)
+    # segment into regions and trace each one as a filled path
+    segments = segment_image(arr, backend=backend, n_segments=n_segments)
+    group = vectorize_segments(dwg, arr, segments, margin=margin, opacity=0.7)
 
-        for contour in contours:
-            # rescale contour to SVG coords (add margin)
-            contour = contour[:, ::-1]  # (y, x) → (x, y)
-            contour[:, 0] += margin
-            contour[:, 1] += margin
-
-            # build path string
-            path_data = "M " + " L ".join(f"{x:.2f},{y:.2f}" for x, y in contour) + " Z"
-
-            # get average color for this region
-            avg_col = np.mean(arr[segments == seg_val], axis=0).astype(int)
-            fill = svgwrite.rgb(int(avg_col[0]), int(avg_col[1]), int(avg_col[2]))
-
-            group.add(dwg.path(d=path_data, fill=fill, stroke="none"))
-
-    dwg.add(group)
-    print(f"[+] Vectorized background with {len(np.unique(segments))} segments")
+    print(f"[+] Vectorized background with {len(np.unique(segments))} segments ({backend})")
     return group
 
 
@@ -2982,14 +2720,15 @@ def generate_fantasy_banknote(seed_text: str, input_image_path: str, outfile_svg
                                width_mm: float = 160.0, height_mm: float = 60.0,
                                title: str = "灵国国库", subtitle: str = "灵之意志，天下共识",
                                denomination: str = "100 卢纳币", specimen: bool = True,
-                               fonts = {}):
+                               fonts = {}, segmentation_backend: str = None,
+                               writer: str = None):
     font_main = "FengGuangMingRui"
     font_numeric = "Karamuruh"
     timestamp_ms = generate_timestamp_ms()
     serial_id = generate_serial_id_with_checksum()
     W = mm_to_px(width_mm)
     H = mm_to_px(height_mm)
-    dwg = svgwrite.Drawing(outfile_svg, size=(W,H), viewBox=f"0 0 {W} {H}")
+    dwg = new_drawing(outfile_svg, size=(W,H), viewBox=f"0 0 {W} {H}", writer=writer)
     
     # Embed fonts
     #from fontTools.ttLib import TTFont
@@ -3008,7 +2747,8 @@ def generate_fantasy_banknote(seed_text: str, input_image_path: str, outfile_svg
     
     #background = generate_triangle_overlay(W=W, H=H,denom=denom_value, seed_hash=seed_hash, margin=60, base_size=128, levels=4, out_dir="./security_overlays")
     add_vectorized_background(dwg=dwg, W=W, H=H, seed_text=seed_text, bg_dir="./backgrounds", margin=60, n_segments=1024, 
-                              background_prompt=generate_kawaii_mural_from_background(denomination=denom_exponent, filename="background_prompt.txt"))
+                              background_prompt=generate_kawaii_mural_from_background(denomination=denom_exponent, filename="background_prompt.txt"),
+                              backend=segmentation_backend or backend_for_denomination(denom_value))
     #add_random_background_vectorized(dwg=dwg, seed_text=seed_text, width_mm=W, height_mm=H, serial_id=serial_id, time=timestamp_ms)
     print("Generated:", path)
 
@@ -3070,7 +2810,7 @@ def generate_fantasy_banknote(seed_text: str, input_image_path: str, outfile_svg
     
     add_roygbiv_qr_style(dwg, W=W, H=H, url=qr_url, stamp_width=60, stamp_height=60, rows=6)
     
-    matrix = segno.make(qr_url).matrix  # matrix is a list of lists of booleans
+    matrix = segno_matrix(qr_url)  # memoized rows of booleans
 
     # Add the Aztec/QR directly onto the canvas
     add_colored_aztec_to_canvas(
@@ -3104,7 +2844,7 @@ def generate_fantasy_banknote(seed_text: str, input_image_path: str, outfile_svg
 from PIL import ImageStat
 # ROYGBIV palette
 COLORS = ["#FF0000", "#FF7F00", "#FFFF00", "#00FF00", "#0000FF", "#4B0082", "#8B00FF"]
-from aztec import aztec_matrix_from_segno, build_colored_aztec_svg
+from aztec import aztec_matrix_from_segno, colored_aztec_svg_data_url, segno_matrix
 import segno
 import tempfile
 import svgwrite
@@ -3129,40 +2869,29 @@ def add_colored_aztec_to_canvas(
     - black modules,
     - optional rotation (degrees).
     """
-    nrows = len(matrix)
     ncols = len(matrix[0])
 
     qr_size = ncols * scale  # actual QR size in px (square)
+    total = qr_size + 2*border
     border_color = denomination_to_color(denom_exponent)
 
-    # Group everything together so it rotates around the QR's center
-    qr_group = dwg.g(transform=f"rotate({rotation},{cx},{cy})")
+    # The code is drawn once as a <symbol> in <defs>; every call only adds a <use>
+    symbol_id = f"aztec-{matrix_digest(matrix, (scale, border, border_color, border_opacity))}"
+    if not any(e.attribs.get("id") == symbol_id for e in dwg.defs.elements):
+        symbol = dwg.defs.add(dwg.symbol(id=symbol_id, viewBox=f"0 0 {total} {total}"))
 
-    # 1. Colored border (semi-transparent)
-    qr_group.add(dwg.rect(
-        insert=(cx - (qr_size/2 + border), cy - (qr_size/2 + border)),
-        size=(qr_size + 2*border, qr_size + 2*border),
-        fill=border_color,
-        opacity=border_opacity
-    ))
+        # 1. Colored border (semi-transparent)
+        symbol.add(dwg.rect(insert=(0, 0), size=(total, total), fill=border_color, opacity=border_opacity))
 
-    # 2. White background
-    qr_group.add(dwg.rect(
-        insert=(cx - qr_size/2, cy - qr_size/2),
-        size=(qr_size, qr_size),
-        fill="white",
-        opacity=border_opacity
-    ))
+        # 2. White background
+        symbol.add(dwg.rect(insert=(border, border), size=(qr_size, qr_size), fill="white", opacity=border_opacity))
 
-    # 3. Black modules
-    for r in range(nrows):
-        for c in range(ncols):
-            if matrix[r][c]:  # filled module
-                x = cx - qr_size/2 + c * scale
-                y = cy - qr_size/2 + r * scale
-                qr_group.add(dwg.rect(insert=(x, y), size=(scale, scale), fill="black"))
+        # 3. Black modules, run-length encoded into one path
+        symbol.add(dwg.path(d=module_runs_path(matrix, scale, border, border), fill="black"))
 
-    dwg.add(qr_group)
+    # Rotate around the QR's center
+    dwg.add(dwg.use(f"#{symbol_id}", insert=(cx - total/2, cy - total/2), size=(total, total),
+                    transform=f"rotate({rotation},{cx},{cy})"))
     return dwg
 
 
@@ -3192,16 +2921,9 @@ def add_colored_aztecs(
     - offset: horizontal distance from portrait center
     - size: target size of QR in px
     """
-    # Build matrix and temporary SVG for Aztec
+    # Build matrix and the Aztec SVG in memory, encoded as a data URL
     matrix = aztec_matrix_from_segno(qr_url)
-    tmp_svg_path = tempfile.mktemp(suffix=".svg")
-    build_colored_aztec_svg(matrix, scale=scale, margin_modules=margin,
-                            style=style, out_path=tmp_svg_path)
-
-    # Load Aztec SVG and encode to base64
-    with open(tmp_svg_path, "rb") as f:
-        svg_bytes = f.read()
-    svg_data_url = "data:image/svg+xml;base64," + base64.b64encode(svg_bytes).decode("ascii")
+    svg_data_url = colored_aztec_svg_data_url(matrix, scale=scale, margin_modules=margin, style=style)
 
     # Left Aztec
     dwg.add(dwg.image(
@@ -3252,6 +2974,7 @@ def denom_to_int(denom_str: str) -> int:
     if match:
         return int(match.group())
     raise ValueError(f"No numeric part found in denomination '{denom_str}'")
+@cached_layer("corner_denoms")
 def add_corner_denoms(dwg, W: int, H: int, denom_str: str):
     """
     Draws denomination numbers in all four corners with white outline 0.05cm behind
@@ -3308,24 +3031,28 @@ def add_corner_denoms(dwg, W: int, H: int, denom_str: str):
             opacity=0.9
         ))
 
+    # Measured advance widths (the rest digits start where the big digit ends)
+    first_width = text_width(first_digit, "Daemon Full Working", BIG_FONT)
+    rest_width = text_width(rest_digits, "Daemon Full Working", SMALL_FONT)
+
     # --- Top-left ---
     add_text_with_outline(PADDING, PADDING, first_digit, BIG_FONT, COLORS[0], "start", "hanging")
-    offset_x = PADDING + BIG_FONT * 0.6
+    offset_x = PADDING + first_width
     add_text_with_outline(offset_x, PADDING, rest_digits, SMALL_FONT, COLORS[0], "start", "hanging")
 
     # --- Top-right ---
     add_text_with_outline(W - PADDING, PADDING, rest_digits, SMALL_FONT, COLORS[1], "end", "hanging")
-    offset_x = W - PADDING - SMALL_FONT * len(rest_digits) * 0.55
+    offset_x = W - PADDING - rest_width
     add_text_with_outline(offset_x, PADDING, first_digit, BIG_FONT, COLORS[1], "end", "hanging")
 
     # --- Bottom-left ---
     add_text_with_outline(PADDING, H - PADDING, first_digit, BIG_FONT, COLORS[2], "start", "baseline")
-    offset_x = PADDING + BIG_FONT * 0.6
+    offset_x = PADDING + first_width
     add_text_with_outline(offset_x, H - PADDING, rest_digits, SMALL_FONT, COLORS[2], "start", "baseline")
 
     # --- Bottom-right ---
     add_text_with_outline(W - PADDING, H - PADDING, rest_digits, SMALL_FONT, COLORS[3], "end", "baseline")
-    offset_x = W - PADDING - SMALL_FONT * len(rest_digits) * 0.55
+    offset_x = W - PADDING - rest_width
     add_text_with_outline(offset_x, H - PADDING, first_digit, BIG_FONT, COLORS[3], "end", "baseline")
 
 
@@ -3430,48 +3157,57 @@ def add_functional_corner_decorations(dwg, W, H, denom, timestamp, serial_id,
         ("#222222", "#AAAAAA", "#FFD700"),  # bottom-right (black/gray + yellow)
     ]
 
-    def micro_text_pattern(x, y, text, rows=12, cols=12, spacing=10,
+    def micro_text_pattern(dwg, x, y, text, rows=12, cols=12, spacing=10,
                            c_main="#000", c_highlight="#FF69B4"):
-        """Repeating microtext grid with alternating highlight color."""
-        for row in range(rows):
-            for col in range(cols):
-                color = c_main if (row+col) % 3 else c_highlight
-                dwg.add(dwg.text(text,
-                                 insert=(x + col*spacing, y + row*spacing),
-                                 font_size=6, font_family="Daemon Full Working",
-                                 fill=color, opacity=0.25))
+        """
+        Repeating microtext grid with alternating highlight color: one <text> per
+        color with a positioned <tspan> per cell (fill-opacity keeps overlapping
+        cells compounding as before).
+        """
+        for color, highlighted in ((c_main, False), (c_highlight, True)):
+            label = dwg.text("", font_size=6, font_family="Daemon Full Working",
+                             fill=color, fill_opacity=0.25)
+            for row in range(rows):
+                for col in range(cols):
+                    if ((row+col) % 3 == 0) == highlighted:
+                        label.add(dwg.tspan(text, x=[x + col*spacing], y=[y + row*spacing]))
+            dwg.add(label)
 
     def tesselated_triangles(dwg, x, y, s, rows=8, cols=8,
                              c_main="#000", c_highlight="#FFD700"):
-        """Draw tessellated upright + inverted triangles with mixed colors."""
-        h = s * (3 ** 0.5) / 2
-        for row in range(rows):
-            for col in range(cols):
-                x0 = x + col * s
-                y0 = y + row * h
-                if (row + col) % 2 == 0:
-                    pts = [(x0, y0 + h), (x0 + s/2, y0), (x0 + s, y0 + h)]
-                else:
-                    pts = [(x0, y0), (x0 + s, y0), (x0 + s/2, y0 + h)]
-                stroke_color = c_main if (row+col) % 4 else c_highlight
-                dwg.add(dwg.polygon(points=pts, fill="none",
-                                    stroke=stroke_color,
-                                    stroke_width=0.6, opacity=0.7))
+        """Draw tessellated upright + inverted triangles with mixed colors (cached)."""
+        def build(target):
+            h = s * (3 ** 0.5) / 2
+            for row in range(rows):
+                for col in range(cols):
+                    x0 = x + col * s
+                    y0 = y + row * h
+                    if (row + col) % 2 == 0:
+                        pts = [(x0, y0 + h), (x0 + s/2, y0), (x0 + s, y0 + h)]
+                    else:
+                        pts = [(x0, y0), (x0 + s, y0), (x0 + s/2, y0 + h)]
+                    stroke_color = c_main if (row+col) % 4 else c_highlight
+                    target.add(target.polygon(points=pts, fill="none",
+                                              stroke=stroke_color,
+                                              stroke_width=0.6, opacity=0.7))
+        cached_fragment(dwg, ("corner_triangles", x, y, s, rows, cols, c_main, c_highlight), build)
 
     def top_left(x, y, denom):
         main, secondary, highlight = COLORS[0]
-        for i in range(3):
-            offset = i*size*0.18
-            stroke_c = main if i % 2 == 0 else highlight
-            dwg.add(dwg.rect(insert=(x+offset, y+offset),
-                             size=(size-2*offset, size-2*offset),
-                             rx=8, ry=8, fill="none",
-                             stroke=stroke_c, stroke_width=stroke_width))
-        dwg.add(dwg.text(denom, insert=(x+size/2, y+size/2),
-                         font_size=22, text_anchor="middle",
-                         alignment_baseline="middle",
-                         font_family="Daemon Full Working", fill=secondary))
-        micro_text_pattern(x+12, y+12, denom, c_main=secondary, c_highlight=highlight)
+        def build(target):
+            for i in range(3):
+                offset = i*size*0.18
+                stroke_c = main if i % 2 == 0 else highlight
+                target.add(target.rect(insert=(x+offset, y+offset),
+                                       size=(size-2*offset, size-2*offset),
+                                       rx=8, ry=8, fill="none",
+                                       stroke=stroke_c, stroke_width=stroke_width))
+            target.add(target.text(denom, insert=(x+size/2, y+size/2),
+                                   font_size=22, text_anchor="middle",
+                                   alignment_baseline="middle",
+                                   font_family="Daemon Full Working", fill=secondary))
+            micro_text_pattern(target, x+12, y+12, denom, c_main=secondary, c_highlight=highlight)
+        cached_fragment(dwg, ("corner_top_left", x, y, denom, size, stroke_width), build)
 
     def top_right(x, y, denom):
         main, secondary, highlight = COLORS[1]
@@ -3493,18 +3229,20 @@ def add_functional_corner_decorations(dwg, W, H, denom, timestamp, serial_id,
 
     def bottom_right(x, y, denom, timestamp):
         main, secondary, highlight = COLORS[3]
-        for i in range(4):
-            offset = i*size*0.18
-            stroke_c = main if i % 2 else highlight
-            dwg.add(dwg.rect(insert=(x - size + offset, y - size + offset),
-                             size=(size - 2*offset, size - 2*offset),
-                             rx=10, ry=10, fill="none",
-                             stroke=stroke_c, stroke_width=stroke_width))
+        def build(target):
+            for i in range(4):
+                offset = i*size*0.18
+                stroke_c = main if i % 2 else highlight
+                target.add(target.rect(insert=(x - size + offset, y - size + offset),
+                                       size=(size - 2*offset, size - 2*offset),
+                                       rx=10, ry=10, fill="none",
+                                       stroke=stroke_c, stroke_width=stroke_width))
+        cached_fragment(dwg, ("corner_bottom_right", x, y, size, stroke_width), build)
         dwg.add(dwg.text(denom, insert=(x - size/2, y - size/2),
                          font_size=22, text_anchor="middle",
                          alignment_baseline="middle",
                          font_family="Daemon Full Working", fill=random.choice([secondary, highlight])))
-        micro_text_pattern(x - size + 5, y - size + 5, f"{denom} {timestamp}",
+        micro_text_pattern(dwg, x - size + 5, y - size + 5, f"{denom} {timestamp}",
                            c_main=secondary, c_highlight=highlight)
 
     # Apply all four corners
@@ -3605,7 +3343,6 @@ def add_decorative_border(dwg, W:int, H:int, border_info:dict, denom_value: int,
 
     for band_index, (band_name, value, band_cm) in enumerate(bands):
         band_size = cm_to_px(band_cm)
-        g = dwg.g()
 
         # number of tiles along edges
         num_cols = int((width - 2*pad_base - 2*inset) // band_size)
@@ -3613,35 +3350,43 @@ def add_decorative_border(dwg, W:int, H:int, border_info:dict, denom_value: int,
 
         offset = value + (denom_value % 97)
 
-        # --- top border
-        y = start_y + pad_base + inset
-        for c in range(num_cols):
-            x = start_x + pad_base + inset + c * band_size
-            kind = (c + offset) % 5
-            draw_shape(g, x, y, band_size, kind, band_index)  # Added band_index
-
-        # --- bottom border
-        y = start_y + height - pad_base - inset - band_size
-        for c in range(num_cols):
-            x = start_x + pad_base + inset + c * band_size
-            kind = (c + offset + 1) % 5
-            draw_shape(g, x, y, band_size, kind, band_index)  # Added band_index
-
-        # --- left border
-        x = start_x + pad_base + inset
-        for r in range(num_rows):
-            y = start_y + pad_base + inset + r * band_size
-            kind = (r + offset + 2) % 5
-            draw_shape(g, x, y, band_size, kind, band_index)  # Added band_index
-
-        # --- right border
-        x = start_x + width - pad_base - inset - band_size
-        for r in range(num_rows):
-            y = start_y + pad_base + inset + r * band_size
-            kind = (r + offset + 3) % 5
-            draw_shape(g, x, y, band_size, kind, band_index)  # Added band_index
-
-        dwg.add(g)
+        # A band only depends on its geometry and on offset % 5, so the few
+        # variants per denomination are built once and spliced from the cache
+        def build_band(target):
+            g = target.g()
+
+            # --- top border
+            y = start_y + pad_base + inset
+            for c in range(num_cols):
+                x = start_x + pad_base + inset + c * band_size
+                kind = (c + offset) % 5
+                draw_shape(g, x, y, band_size, kind, band_index)  # Added band_index
+
+            # --- bottom border
+            y = start_y + height - pad_base - inset - band_size
+            for c in range(num_cols):
+                x = start_x + pad_base + inset + c * band_size
+                kind = (c + offset + 1) % 5
+                draw_shape(g, x, y, band_size, kind, band_index)  # Added band_index
+
+            # --- left border
+            x = start_x + pad_base + inset
+            for r in range(num_rows):
+                y = start_y + pad_base + inset + r * band_size
+                kind = (r + offset + 2) % 5
+                draw_shape(g, x, y, band_size, kind, band_index)  # Added band_index
+
+            # --- right border
+            x = start_x + width - pad_base - inset - band_size
+            for r in range(num_rows):
+                y = start_y + pad_base + inset + r * band_size
+                kind = (r + offset + 3) % 5
+                draw_shape(g, x, y, band_size, kind, band_index)  # Added band_index
+
+            target.add(g)
+
+        cached_fragment(dwg, ("border_band", band_index, start_x, start_y, width, height,
+                              inset, band_size, offset % 5), build_band)
         inset += band_size
 
 
@@ -3712,9 +3457,35 @@ if __name__ == "__main__":
     parser.add_argument("--specimen", action="store_true", help="Add SPECIMEN overlay")
     parser.add_argument("--copies", type=int, default=1, help="Number of distinct notes to generate")
     parser.add_argument("--yen_model", action="store_true", help="Use 1-100,000,000 denominations")
+    parser.add_argument("--segmentation", type=str, default=None, choices=sorted(SEGMENTATION_BACKENDS),
+                        help="Background segmentation backend (default: per-denomination choice)")
+    parser.add_argument("--writer", type=str, default=None, choices=WRITERS,
+                        help="SVG writer: 'stream' (default) or the original 'svgwrite'")
+    parser.add_argument("--profile", type=str, default=None,
+                        help="Profile every layer and write the JSON report to this path")
+    parser.add_argument("--templates", action="store_true",
+                        help="Reuse precompiled per-denomination templates (./note_templates) for the static artwork")
+    parser.add_argument("--optimize", action="store_true",
+                        help="Run the SVG optimizer (CSS classes, defaults, group merge) on every saved note")
+    parser.add_argument("--text-outlines", action="store_true",
+                        help="Write text as glyph outline paths (cached in ./glyph_cache) so notes need no fonts")
+    parser.add_argument("--gzip", type=str, default=None, choices=("sidecar", "svgz"),
+                        help="'sidecar' also writes a precompressed .svg.gz next to every .svg, "
+                             "'svgz' writes gzip-compressed .svgz notes instead")
+    parser.add_argument("--precision", type=int, default=-1,
+                        help="Decimals kept in SVG geometry attributes (default -1 keeps full float precision; "
+                             "stream writer only)")
     args = parser.parse_args()
+    if args.precision >= 0 and (args.writer or svg_stream.DEFAULT_WRITER) == "svgwrite":
+        parser.error("--precision needs the stream writer; svgwrite always writes full float precision")
+    svg_stream.COORD_PRECISION = args.precision if args.precision >= 0 else None
+    svg_stream.GZIP_SIDECAR = args.gzip == "sidecar"
+    if args.text_outlines:
+        glyph_outlines.enable()
 
     fonts = load_fonts("./fonts")
+    profiler = LayerProfiler() if args.profile else None
+    templates = NoteTemplates("front", FRONT_STATIC_LAYERS) if args.templates else None
     
     # Generate denominations
     if args.yen_model:
@@ -3733,7 +3504,8 @@ if __name__ == "__main__":
             base, ext = os.path.splitext(args.outfile)
             # Filename format: seed_denomination_datetime.svg
             # For FRONT
-            outfile_svg = f"./images/{new_seed}/{denom}/{new_seed}_-_{denom}_-_{timestamp}_FRONT.svg"
+            svg_ext = ".svgz" if args.gzip == "svgz" else ".svg"
+            outfile_svg = f"./images/{new_seed}/{denom}/{new_seed}_-_{denom}_-_{timestamp}_FRONT{svg_ext}"
             outfile_dir = os.path.dirname(outfile_svg)
             os.makedirs(outfile_dir, exist_ok=True)
 
@@ -3743,12 +3515,27 @@ if __name__ == "__main__":
 
             denomination_str = f"{denom} 卢纳币"
 
-            generate_fantasy_banknote(
+            note_kwargs = dict(
                 seed_text=f"{new_seed}_{i}",  # keep unique seed for generation
                 input_image_path=args.input_image,
                 outfile_svg=outfile_svg,
                 specimen=args.specimen,
                 denomination=denomination_str,
-                fonts=fonts
+                fonts=fonts,
+                segmentation_backend=args.segmentation,
+                writer=args.writer
             )
+            with ExitStack() as stack:
+                if templates is not None:
+                    stack.enter_context(templates.note(globals(), key=(denomination_str, args.specimen)))
+                if profiler is not None:
+                    stack.enter_context(profiler.note(globals(), outfile_svg))
+                generate_fantasy_banknote(**note_kwargs)
+            if profiler is not None:
+                profiler.print_table()
+            if args.optimize:
+                optimize_svg_file(outfile_svg)
+
+    if profiler is not None:
+        profiler.save_json(args.profile)
 
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+glyph_outlines.py
+
+Optional text-to-outline mode. With it enabled, every <text> element the
+stream writer serializes is replaced by one <path> built from the glyph
+outlines of its font, so rendered notes no longer depend on installed or
+embedded fonts and cairosvg skips font lookup entirely. Texts that can't be
+converted exactly (unknown font, missing glyphs, textPath, styled tspans,
+per-character positions) are written as <text> as before.
+
+Outlines are recorded once per (font, glyph) in font units and scaled to
+the font size when a string is laid out (advance widths from hmtx, no
+kerning). The memo persists under GLYPH_CACHE_DIR, one JSON file per font
+version, so later runs don't touch the font files at all.
+
+    glyph_outlines.enable()        # sets svg_stream.TEXT_CONVERTER
+    ...
+    glyph_outlines.save_glyph_cache()   # also done at exit
+
+Author: RingMaster Lin
+"""
+import os
+import json
+import atexit
+import hashlib
+
+import svg_stream
+from svg_stream import Element, fmt_number
+from font_registry import get_ttfont, resolve_font_path
+
+try:
+    from fontTools.pens.recordingPen import DecomposingRecordingPen
+    from fontTools.pens.svgPathPen import SVGPathPen
+    from fontTools.pens.transformPen import TransformPen
+    FONTTOOLS_AVAILABLE = True
+except ImportError:
+    FONTTOOLS_AVAILABLE = False
+
+GLYPH_CACHE_DIR = "./glyph_cache"
+
+# Text-only attributes that don't carry over to the outline <path>
+TEXT_ATTRIBS = frozenset((
+    "x", "y", "dx", "dy", "rotate", "textLength", "lengthAdjust",
+    "font-family", "font-size", "font-weight", "font-style", "text-anchor",
+    "alignment-baseline", "dominant-baseline", "letter-spacing", "word-spacing",
+))
+
+_fonts = {}
+_stats = {"converted": 0, "kept": 0}
+
+
+class _FontOutlines:
+    """Glyph outlines and metrics of one font file, backed by a JSON memo."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            version = hashlib.sha1(f.read()).hexdigest()[:12]
+        stem = os.path.splitext(os.path.basename(path))[0].replace(" ", "_")
+        self.cache_path = os.path.join(GLYPH_CACHE_DIR, f"{stem}_{version}.json")
+        self.dirty = False
+        self._font = None
+        if os.path.exists(self.cache_path):
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                memo = json.load(f)
+            self.metrics = memo["metrics"]
+            self.cmap = {int(k): v for k, v in memo["cmap"].items()}
+            self.glyphs = memo["glyphs"]
+        else:
+            font = self.font
+            os2 = font["OS/2"] if "OS/2" in font else None
+            hhea = font["hhea"]
+            self.metrics = {
+                "upem": font["head"].unitsPerEm,
+                "ascent": hhea.ascent,
+                "descent": hhea.descent,
+                "x_height": getattr(os2, "sxHeight", 0) or 0,
+            }
+            self.cmap = dict(font.getBestCmap() or {})
+            self.glyphs = {}
+            self.dirty = True
+
+    @property
+    def font(self):
+        if self._font is None:
+            self._font = get_ttfont(self.path)
+        return self._font
+
+    def glyph(self, name: str):
+        """(advance width, recorded outline) of a glyph in font units."""
+        entry = self.glyphs.get(name)
+        if entry is None:
+            glyph_set = self.font.getGlyphSet()
+            pen = DecomposingRecordingPen(glyph_set)  # components flattened into plain contours
+            glyph_set[name].draw(pen)
+            entry = self.glyphs[name] = [self.font["hmtx"][name][0], [[op, list(args)] for op, args in pen.value]]
+            self.dirty = True
+        return entry
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(GLYPH_CACHE_DIR, exist_ok=True)
+        memo = {"metrics": self.metrics, "cmap": self.cmap, "glyphs": self.glyphs}
+        tmp = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(memo, f, separators=(",", ":"))
+        os.replace(tmp, self.cache_path)
+        self.dirty = False
+
+
+def _outlines(family: str):
+    family = family.split(",")[0].strip().strip("'\"")
+    path = resolve_font_path(family)
+    if path is None:
+        return None
+    key = os.path.abspath(path)
+    if key not in _fonts:
+        try:
+            _fonts[key] = _FontOutlines(path)
+        except Exception as e:
+            print(f"[!] No glyph outlines for {family}: {e}")
+            _fonts[key] = None
+    return _fonts[key]
+
+
+def _number(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    if text.endswith("px"):
+        text = text[:-2]
+    return float(text)  # lists / units raise ValueError -> text is kept
+
+
+def layout_outline(outlines: _FontOutlines, text: str, x: float, y: float, size: float,
+                   anchor: str = "start", baseline: str = None):
+    """Path data of text set at (x, y), or None when a glyph is missing."""
+    names = []
+    for ch in text:
+        name = outlines.cmap.get(ord(ch))
+        if name is None:
+            return None
+        names.append(name)
+    glyphs = [outlines.glyph(name) for name in names]
+
+    metrics = outlines.metrics
+    scale = size / metrics["upem"]
+    width = sum(advance for advance, _ in glyphs) * scale
+    if anchor == "middle":
+        x -= width / 2
+    elif anchor == "end":
+        x -= width
+    if baseline == "middle":
+        y += (metrics["x_height"] or (metrics["ascent"] + metrics["descent"])) * scale / 2
+    elif baseline == "central":
+        y += (metrics["ascent"] + metrics["descent"]) * scale / 2
+    elif baseline == "hanging":  # no BASE table lookup: browsers' 0.8 * ascent
+        y += 0.8 * metrics["ascent"] * scale
+    elif baseline in ("text-before-edge", "text-top"):
+        y += metrics["ascent"] * scale
+    elif baseline in ("text-after-edge", "text-bottom", "ideographic"):
+        y += metrics["descent"] * scale
+
+    pen = SVGPathPen(None, ntos=fmt_number)
+    for advance, recording in glyphs:
+        target = TransformPen(pen, (scale, 0, 0, -scale, x, y))
+        for op, args in recording:
+            getattr(target, op)(*args)
+        x += advance * scale
+    return pen.getCommands()
+
+
+def outline_text(elem):
+    """svg_stream.TEXT_CONVERTER: <path> with the outlines of a <text> element, or None to keep it as text."""
+    a = elem.attribs
+    try:
+        outlines = _outlines(str(a["font-family"]))
+        if outlines is None:
+            raise KeyError("font-family")
+        size = _number(a["font-size"])
+        runs = []
+        if elem.text and not elem.elements:
+            runs.append((elem.text, a.get("x", 0), a.get("y", 0)))
+        elif not (elem.text or "").strip() and elem.elements:
+            for child in elem.elements:
+                if (not isinstance(child, Element) or child.elementname != "tspan" or child.elements
+                        or set(child.attribs) - {"x", "y"} or not child.text):
+                    raise ValueError("styled tspan")
+                runs.append((child.text, child.attribs.get("x", a.get("x", 0)), child.attribs.get("y", a.get("y", 0))))
+        else:
+            raise ValueError("no text")
+        anchor = a.get("text-anchor", "start")
+        baseline = a.get("alignment-baseline") or a.get("dominant-baseline")
+        d = []
+        for text, x, y in runs:
+            run = layout_outline(outlines, text, _number(x), _number(y), size, anchor, baseline)
+            if run is None:
+                raise KeyError("glyph")
+            d.append(run)
+    except (KeyError, ValueError, TypeError):
+        _stats["kept"] += 1
+        return None
+
+    path = Element("path")
+    for key, value in a.items():
+        if key not in TEXT_ATTRIBS:
+            path.attribs[key] = value
+    path.attribs["d"] = "".join(d)
+    _stats["converted"] += 1
+    return path
+
+
+def save_glyph_cache():
+    for outlines in _fonts.values():
+        if outlines is not None:
+            outlines.save()
+
+
+def glyph_cache_stats() -> dict:
+    glyphs = sum(len(o.glyphs) for o in _fonts.values() if o is not None)
+    return {"fonts": len(_fonts), "glyphs": glyphs, **_stats}
+
+
+def enable():
+    """Turn on text-to-outline conversion for every stream-writer drawing in this process."""
+    if not FONTTOOLS_AVAILABLE:
+        print("[!] fontTools not installed — text stays as <text>")
+        return
+    svg_stream.TEXT_CONVERTER = outline_text
+
+
+atexit.register(save_glyph_cache)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+layer_cache.py
+
+Cache of serialized SVG fragments for artwork that does not depend on the
+user: corner denominations, microprint rings, corner tessellations, the
+decorative border bands. A layer is built once per key (layer name,
+denomination, canvas size, params) into a scratch drawing, every top-level
+element is serialized, and later notes splice the stored markup straight
+into their drawing as svg_stream.Fragment elements.
+
+    @cached_layer("corner_denoms")
+    def add_corner_denoms(dwg, W, H, denom_str): ...
+
+    cached_fragment(dwg, ("border_band", band_index, ...), build_band)
+
+Only cache code whose output is fully determined by the key: no seeds,
+timestamps, serials or random calls.
+
+Author: RingMaster Lin
+"""
+import functools
+from collections import OrderedDict
+
+import svg_stream
+from svg_stream import Element, ElementFactory, Fragment
+
+LAYER_CACHE_ENABLED = True
+LAYER_CACHE_SIZE = 512  # fragments lists kept (LRU)
+
+_fragments = OrderedDict()
+_stats = {"hits": 0, "misses": 0}
+
+
+class _Capture(ElementFactory):
+    """Scratch drawing that only records what a layer adds."""
+
+    def __init__(self):
+        self.elements = []
+        self.defs = Element("defs")
+
+    def add(self, element):
+        self.elements.append(element)
+        return element
+
+
+def _splice(dwg, entry):
+    body, defs, result = entry
+    for markup in defs:
+        dwg.defs.add(Fragment(markup))
+    for markup in body:
+        dwg.add(Fragment(markup))
+    return result
+
+
+def cached_fragment(dwg, key, build):
+    """
+    Add the fragments cached under `key` to dwg. On a miss, build(scratch)
+    draws the layer into a scratch drawing first; its return value is cached
+    and returned along with the markup.
+    """
+    if not LAYER_CACHE_ENABLED:
+        return build(dwg)
+
+    key = (key, svg_stream.COORD_PRECISION, svg_stream.TEXT_CONVERTER is not None)
+    entry = _fragments.get(key)
+    if entry is not None:
+        _fragments.move_to_end(key)
+        _stats["hits"] += 1
+        return _splice(dwg, entry)
+
+    _stats["misses"] += 1
+    scratch = _Capture()
+    result = build(scratch)
+    entry = (
+        tuple(e.tostring() for e in scratch.elements),
+        tuple(e.tostring() for e in scratch.defs.elements),
+        result,
+    )
+    _fragments[key] = entry
+    if len(_fragments) > LAYER_CACHE_SIZE:
+        _fragments.popitem(last=False)
+    return _splice(dwg, entry)
+
+
+def cached_layer(name: str):
+    """Decorator for layer functions `fn(dwg, *params)` that depend only on their params."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def wrapper(dwg, *args, **kwargs):
+            key = (name, args, tuple(sorted(kwargs.items())))
+            return cached_fragment(dwg, key, lambda target: fn(target, *args, **kwargs))
+        return wrapper
+    return wrap
+
+
+def layer_cache_stats() -> dict:
+    return {"entries": len(_fragments), **_stats}
+
+
+def clear_layer_cache():
+    _fragments.clear()
+    _stats["hits"] = _stats["misses"] = 0
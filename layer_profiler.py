@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+layer_profiler.py
+
+Opt-in per-layer cost profiler for the banknote generators. While a note is
+being generated every top-level add_* layer call is wrapped and its wall
+time, CPU time, elements added, serialized bytes and tracemalloc peak are
+recorded. Nested add_* calls (e.g. add_text_seal -> add_mixed_font_text_precise)
+are charged to the outer layer. Saving the drawing is recorded as "save".
+
+    profiler = LayerProfiler()
+    with profiler.note(globals(), outfile_svg):
+        generate_fantasy_banknote(...)
+    profiler.print_table()
+    profiler.save_json("profile.json")
+
+Author: RingMaster Lin
+"""
+import os
+import json
+import time
+import inspect
+import functools
+import tracemalloc
+from contextlib import contextmanager
+
+
+def _count_elements(element) -> int:
+    """Element plus all of its descendants."""
+    return 1 + sum(_count_elements(child) for child in getattr(element, "elements", ()))
+
+
+def _serialized_bytes(element) -> int:
+    try:
+        return len(element.tostring().encode("utf-8"))
+    except Exception:
+        return 0
+
+
+class LayerProfiler:
+    def __init__(self, prefix: str = "add_", trace_memory: bool = True):
+        self.prefix = prefix
+        self.trace_memory = trace_memory
+        self.notes = []
+        self._current = None
+        self._depth = 0
+        self._added = []
+        self._drawing = None
+
+    # ----------------------
+    # Instrumentation
+    # ----------------------
+    @contextmanager
+    def note(self, namespace: dict, name: str):
+        """
+        Profile one note. `namespace` is the generator module's globals(): its
+        add_* functions and new_drawing are swapped for wrappers until the
+        block exits.
+        """
+        record = {"note": name, "layers": {}, "wall_s": 0.0, "cpu_s": 0.0}
+        self._current = record
+        self._drawing = None
+
+        originals = {}
+        for key, value in list(namespace.items()):
+            if key.startswith(self.prefix) and inspect.isfunction(value):
+                originals[key] = value
+                namespace[key] = self._wrap_layer(key, value)
+        if "new_drawing" in namespace:
+            originals["new_drawing"] = namespace["new_drawing"]
+            namespace["new_drawing"] = self._wrap_new_drawing(namespace["new_drawing"])
+
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        t0, c0 = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_s"] = time.perf_counter() - t0
+            record["cpu_s"] = time.process_time() - c0
+            if started_tracing:
+                tracemalloc.stop()
+            namespace.update(originals)
+            record["layers"] = sorted(record["layers"].values(), key=lambda r: r["wall_s"], reverse=True)
+            self.notes.append(record)
+            self._current = None
+            self._drawing = None
+
+    def _wrap_new_drawing(self, factory):
+        @functools.wraps(factory)
+        def wrapper(*args, **kwargs):
+            return self._attach(factory(*args, **kwargs))
+        return wrapper
+
+    def _attach(self, dwg):
+        """Record top-level elements added during a layer and time the final save."""
+        self._drawing = dwg
+        add, save = dwg.add, dwg.save
+
+        def tracked_add(element):
+            if self._depth:
+                self._added.append(element)
+            return add(element)
+
+        def tracked_save(*args, **kwargs):
+            t0, c0 = time.perf_counter(), time.process_time()
+            result = save(*args, **kwargs)
+            wall, cpu = time.perf_counter() - t0, time.process_time() - c0
+            size = os.path.getsize(dwg.filename) if os.path.exists(dwg.filename) else 0
+            self._record("save", wall, cpu, 0, size, 0)
+            return result
+
+        dwg.add = tracked_add
+        dwg.save = tracked_save
+        return dwg
+
+    def _wrap_layer(self, name: str, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if self._depth or self._current is None:
+                return fn(*args, **kwargs)
+
+            dwg = self._drawing
+            defs_before = len(dwg.defs.elements) if dwg is not None else 0
+            self._added = []
+            tracing = tracemalloc.is_tracing()
+            if tracing:
+                mem_before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+
+            self._depth = 1
+            t0, c0 = time.perf_counter(), time.process_time()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                wall, cpu = time.perf_counter() - t0, time.process_time() - c0
+                self._depth = 0
+                peak = tracemalloc.get_traced_memory()[1] - mem_before if tracing else 0
+                added = list(self._added)
+                if dwg is not None:
+                    added.extend(dwg.defs.elements[defs_before:])
+                elements = sum(_count_elements(e) for e in added)
+                size = sum(_serialized_bytes(e) for e in added)
+                self._record(name, wall, cpu, elements, size, peak)
+        return wrapper
+
+    def _record(self, name, wall, cpu, elements, size, peak):
+        if self._current is None:
+            return
+        row = self._current["layers"].setdefault(name, {
+            "layer": name, "calls": 0, "wall_s": 0.0, "cpu_s": 0.0,
+            "elements": 0, "bytes": 0, "peak_mb": 0.0,
+        })
+        row["calls"] += 1
+        row["wall_s"] += wall
+        row["cpu_s"] += cpu
+        row["elements"] += elements
+        row["bytes"] += size
+        row["peak_mb"] = max(row["peak_mb"], peak / (1024 * 1024))
+
+    # ----------------------
+    # Reports
+    # ----------------------
+    def report(self) -> dict:
+        return {"notes": self.notes}
+
+    def save_json(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+        print(f"[+] Saved layer profile to {path}")
+
+    def print_table(self, record: dict = None):
+        """Print the layers of one note (default: the last one) sorted by wall time."""
+        record = record or (self.notes[-1] if self.notes else None)
+        if record is None:
+            return
+        total = record["wall_s"] or 1e-9
+        print(f"\n[+] Layer profile: {record['note']} ({record['wall_s']:.2f}s wall, {record['cpu_s']:.2f}s CPU)")
+        print(f"{'layer':<40}{'calls':>6}{'wall s':>9}{'%':>6}{'cpu s':>9}{'elements':>10}{'KB':>10}{'peak MB':>9}")
+        for r in record["layers"]:
+            print(f"{r['layer']:<40}{r['calls']:>6}{r['wall_s']:>9.3f}{100 * r['wall_s'] / total:>6.1f}"
+                  f"{r['cpu_s']:>9.3f}{r['elements']:>10}{r['bytes'] / 1024:>10.1f}{r['peak_mb']:>9.1f}")
+        other = record["wall_s"] - sum(r["wall_s"] for r in record["layers"])
+        print(f"{'(outside layers)':<40}{'':>6}{other:>9.3f}{100 * other / total:>6.1f}")
@@ -12,7 +12,7 @@ import json
 import argparse
 from io import BytesIO
 from PIL import Image
-from PyPDF2 import PdfMerger
+from pdf_pipeline import pair_pdf
 
 # -----------------------
 # Configuration
@@ -33,6 +33,8 @@ def parse_arguments():
     parser.add_argument("--name", type=str, help="Generate notes for a specific name only")
     parser.add_argument("--force-regenerate", action="store_true", 
                        help="Force regeneration of portraits even if they exist")
+    parser.add_argument("--templates", action="store_true",
+                       help="Let the generators reuse precompiled note templates (./note_templates)")
     return parser.parse_args()
 
 # -----------------------
@@ -166,6 +168,14 @@ def parse_denomination_from_filename(filename):
     
     return "1"  # Default fallback
 
+# -----------------------
+# Helper: move the .svg.gz sidecar along with its SVG
+# -----------------------
+def move_gzip_sidecar(src, dst):
+    """Move the precompressed .svg.gz written next to an SVG (--gzip sidecar) along with it."""
+    if os.path.exists(f"{src}.gz"):
+        shutil.move(f"{src}.gz", f"{dst}.gz")
+
 # -----------------------
 # Helper: Create proper filename
 # -----------------------
@@ -299,7 +309,9 @@ def main():
                 sys.executable, FRONT_SCRIPT,
                 name,
                 img_path,  # Same portrait for all denominations
-                "--yen_model"
+                "--yen_model",
+                "--gzip", "sidecar",
+                *(["--templates"] if args.templates else [])
             ], check=True, timeout=1800)
             safe_print(f"[+] Generated all front SVGs for {name}")
             
@@ -321,6 +333,7 @@ def main():
                 front_svg_new = os.path.join(denom_folder, front_new_filename)
                 
                 shutil.move(svg_file, front_svg_new)
+                move_gzip_sidecar(svg_file, front_svg_new)
                 front_svgs_created.append(front_svg_new)
                 safe_print(f"[+] Organized front: {front_svg_new}")
             
@@ -339,7 +352,9 @@ def main():
             subprocess.run([
                 sys.executable, BACK_SCRIPT,
                 "--outdir", name_folder,  # Output to main name folder, not denomination folder
-                "--basename", f"{name}_-_{timestamp}_BACK"
+                "--basename", f"{name}_-_{timestamp}_BACK",
+                "--gzip", "sidecar",
+                *(["--templates"] if args.templates else [])
             ], check=True, timeout=1800)
             
             # Now move the generated back SVGs to their respective denomination folders
@@ -357,6 +372,7 @@ def main():
                     new_filename = f"{name}_-_{denom}_-_{timestamp}_BACK.svg"
                     new_path = os.path.join(denom_folder, new_filename)
                     shutil.move(back_file, new_path)
+                    move_gzip_sidecar(back_file, new_path)
                     safe_print(f"[+] Moved back to: {new_path}")
                 
         except subprocess.CalledProcessError as e:
@@ -396,28 +412,14 @@ def main():
             for back_svg_path in back_svgs:
                 safe_print(f"[+] Processing {denom}卢纳币: {os.path.basename(front_svg_path)} + {os.path.basename(back_svg_path)}")
 
-                # Generate PDFs with proper filenames
-                front_pdf = front_svg_path.replace('.svg', '.pdf')
-                back_pdf = back_svg_path.replace('.svg', '.pdf')
+                # Per-side vector PDFs stay next to their SVGs (ingestion reuses them),
+                # the pair PDF is assembled from their pages
                 final_pdf = os.path.join(denom_folder, f"{name}_-_{denom}_-_{timestamp}_COMBINED.pdf")
 
                 try:
-                    import cairosvg
-                    cairosvg.svg2pdf(url=front_svg_path, write_to=front_pdf)
-                    cairosvg.svg2pdf(url=back_svg_path, write_to=back_pdf)
-                    merger = PdfMerger()
-                    merger.append(front_pdf)
-                    merger.append(back_pdf)
-                    merger.write(final_pdf)
-                    merger.close()
+                    pair_pdf(front_svg_path, back_svg_path, final_pdf)
                     safe_print(f"[✓] Generated PDF: {final_pdf}")
                     pdfs_created += 1
-                    
-                    # Clean up individual PDFs
-                    if os.path.exists(front_pdf):
-                        os.remove(front_pdf)
-                    if os.path.exists(back_pdf):
-                        os.remove(back_pdf)
                         
                 except Exception as e:
                     safe_print(f"[!] Failed to generate PDF for {name} denomination {denom}: {e}")
@@ -78,6 +78,7 @@ class Banknote(db.Model):
     svg_path = db.Column(db.String(500), nullable=False)
     png_path = db.Column(db.String(500))
     pdf_path = db.Column(db.String(500))
+    thumbnails = db.Column(db.Text)  # JSON {format: {width: path}} from thumbnails.build_pyramid
     qr_data = db.Column(db.Text)
     is_public = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+note_templates.py
+
+Precompiled note templates. The first note of a design (side, denomination,
+canvas size, static text) is generated normally, but everything that does
+not depend on the user -- elements added outside any layer, embedded fonts
+and the STATIC_LAYERS -- is written into a template with a named
+<!--slot:...--> marker where each user-specific layer went (background,
+qr_like_border, text_seal, secondary_ring, center_seal, colored_aztec_to_canvas,
+...). Later notes of the same design skip the static layers entirely and
+only render the slot layers; save() streams the template and substitutes
+the slot markup. Templates are kept in memory and under TEMPLATE_DIR, keyed
+by the design, TEMPLATE_FORMAT_VERSION and a digest of the generator source
+together with the modules it renders through (DEPENDENCY_MODULES), so they
+survive across runs (main.py --templates) but not across code changes.
+
+    templates = NoteTemplates("front", FRONT_STATIC_LAYERS)
+    with templates.note(globals(), key=(denomination, specimen)):
+        generate_fantasy_banknote(...)
+
+Output is byte-identical to a normal stream-writer note.
+
+Author: RingMaster Lin
+"""
+import os
+import re
+import hashlib
+import inspect
+import functools
+import importlib.util
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import svg_stream
+import font_subset
+from svg_stream import Drawing, Element, Fragment, XML_HEADER
+
+TEMPLATE_DIR = "./note_templates"
+TEMPLATE_CACHE_SIZE = 9  # templates kept in memory (LRU)
+TEMPLATE_FORMAT_VERSION = 2  # bump when the template layout or slot handling changes
+
+# Modules whose code shapes the template output besides the generator itself
+DEPENDENCY_MODULES = (
+    "svg_stream", "layer_cache", "vector_layers", "aztec", "font_subset",
+    "font_registry", "text_layout", "glyph_outlines", "note_templates",
+)
+
+# Layers whose output depends only on the template key
+FRONT_STATIC_LAYERS = ("add_center_text", "add_corner_denoms", "add_chinese_microprint")
+BACK_STATIC_LAYERS = ("add_center_text", "add_corner_denoms")
+
+SLOT_MARK = "<!--slot:%s-->"
+_SLOT_RE = re.compile(r"<!--slot:([\w-]+)-->")
+# whole <defs> element, or only its user children after the static defs
+DEFS_SLOT = "defs"
+DEFS_CHILDREN_SLOT = "defs-children"
+
+
+_file_digests = {}
+
+
+def _file_digest(path: str) -> str:
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    digest = _file_digests.get(key)
+    if digest is None:
+        with open(path, "rb") as f:
+            digest = _file_digests[key] = hashlib.sha1(f.read()).hexdigest()
+    return digest
+
+
+def source_digest(generator_path: str) -> str:
+    """Digest of the generator source, its DEPENDENCY_MODULES and TEMPLATE_FORMAT_VERSION."""
+    parts = [str(TEMPLATE_FORMAT_VERSION), _file_digest(generator_path)]
+    for name in DEPENDENCY_MODULES:
+        spec = importlib.util.find_spec(name)
+        origin = spec.origin if spec is not None else None
+        parts.append(f"{name}:{_file_digest(origin) if origin and os.path.isfile(origin) else '-'}")
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def _write_element(element, write):
+    if isinstance(element, Element):
+        element.write(write)
+    else:  # plain svgwrite element
+        write(element.tostring())
+
+
+class NoteTemplate:
+    """Template text split into literal parts and slot names."""
+
+    def __init__(self, text: str):
+        self.text = text
+        pieces = _SLOT_RE.split(text)
+        self.parts = pieces[0::2]   # literal text, one more than slots
+        self.slots = pieces[1::2]   # slot names in document order
+
+    def render(self, fileobj, slots, slot_defs):
+        """Write the note: literal parts with the captured slot elements in between."""
+        pending = list(slots)
+        for i, literal in enumerate(self.parts):
+            fileobj.write(literal)
+            if i == len(self.slots):
+                break
+            name = self.slots[i]
+            if name == DEFS_SLOT:
+                defs = Element("defs")
+                defs.elements.extend(slot_defs)
+                defs.write(fileobj.write)
+            elif name == DEFS_CHILDREN_SLOT:
+                for element in slot_defs:
+                    _write_element(element, fileobj.write)
+            else:
+                slot_name, elements = pending.pop(0)
+                if slot_name != name:
+                    raise ValueError(f"Template slot '{name}' filled by layer '{slot_name}'")
+                for element in elements:
+                    _write_element(element, fileobj.write)
+        if pending:
+            raise ValueError(f"{len(pending)} layer(s) have no slot in the template")
+
+
+class _TemplateDrawing(Drawing):
+    """
+    Stream drawing that routes elements by the layer being drawn: slot layers
+    are captured per slot, everything else goes into the template body while
+    compiling and is dropped when the template already exists.
+    """
+
+    def __init__(self, filename, size, template=None, on_compiled=None, **extra):
+        super().__init__(filename, size=size, **extra)
+        self.template = template
+        self.on_compiled = on_compiled
+        self.slots = []
+        self._slot = None
+        self._slot_defs_start = 0
+        self._slot_defs = []
+
+    def add(self, element):
+        if self._slot is not None:
+            self._slot.append(element)
+            return element
+        if self.template is None:
+            return super().add(element)
+        return element  # static: already part of the template
+
+    def begin_slot(self, name: str):
+        if self.template is None:
+            super().add(Fragment(SLOT_MARK % name))
+        self._slot = []
+        self.slots.append((name, self._slot))
+        self._slot_defs_start = len(self.defs.elements)
+
+    def end_slot(self):
+        self._slot = None
+        self._slot_defs.extend(self.defs.elements[self._slot_defs_start:])
+
+    def iter_text(self, chunk_size: int = 1 << 20):
+        yield from super().iter_text(chunk_size)
+        for _, elements in self.slots:
+            for element in elements:
+                yield from svg_stream.iter_markup_text(element.tostring())
+
+    def _compile(self) -> NoteTemplate:
+        if self._pending is not None:
+            self._flush()
+        user_defs = {id(e) for e in self._slot_defs}
+        static_defs = [e for e in self.defs.elements if id(e) not in user_defs]
+
+        parts = [XML_HEADER, self._root_open()]
+        if static_defs:
+            parts.append("<defs>")
+            parts.extend(e.tostring() for e in static_defs)
+            parts.append(SLOT_MARK % DEFS_CHILDREN_SLOT)
+            parts.append("</defs>")
+        else:
+            parts.append(SLOT_MARK % DEFS_SLOT)
+        self._body.seek(0)
+        parts.append(self._body.read())
+        parts.append("</svg>")
+        return NoteTemplate("".join(parts))
+
+    def write(self, fileobj):
+        if self.template is None:
+            self.template = self._compile()
+            if self.on_compiled:
+                self.on_compiled(self.template)
+        self.template.render(fileobj, self.slots, self._slot_defs)
+
+
+class NoteTemplates:
+    def __init__(self, side: str, static_layers, template_dir: str = TEMPLATE_DIR, prefix: str = "add_"):
+        self.side = side
+        self.static_layers = set(static_layers)
+        self.template_dir = template_dir
+        self.prefix = prefix
+        self._templates = OrderedDict()
+        self._drawing = None
+        self._depth = 0
+        self.compiled = 0
+        self.reused = 0
+
+    # ----------------------
+    # Storage
+    # ----------------------
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.template_dir, f"{self.side}_{digest}.svgt")
+
+    def _load(self, digest: str):
+        template = self._templates.get(digest)
+        if template is not None:
+            self._templates.move_to_end(digest)
+            return template
+        path = self._path(digest)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                template = NoteTemplate(f.read())
+            self._remember(digest, template)
+        return template
+
+    def _remember(self, digest: str, template: NoteTemplate):
+        self._templates[digest] = template
+        if len(self._templates) > TEMPLATE_CACHE_SIZE:
+            self._templates.popitem(last=False)
+
+    def _store(self, digest: str, template: NoteTemplate):
+        self._remember(digest, template)
+        os.makedirs(self.template_dir, exist_ok=True)
+        path = self._path(digest)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            f.write(template.text)
+        os.replace(tmp, path)
+        print(f"[+] Compiled {self.side} template: {path}")
+
+    # ----------------------
+    # Instrumentation
+    # ----------------------
+    @contextmanager
+    def note(self, namespace: dict, key):
+        """
+        Generate one note from the template for `key` (compiling it on first
+        use). `namespace` is the generator module's globals().
+        """
+        digest = source_digest(namespace["__file__"])
+
+        originals = {}
+        for name, value in list(namespace.items()):
+            if name.startswith(self.prefix) and inspect.isfunction(value):
+                originals[name] = value
+                namespace[name] = self._wrap_layer(name, value)
+        originals["new_drawing"] = namespace["new_drawing"]
+        namespace["new_drawing"] = self._template_drawing_factory(key, digest)
+        try:
+            yield
+        finally:
+            namespace.update(originals)
+            self._drawing = None
+            self._depth = 0
+
+    def _template_drawing_factory(self, key, source_digest):
+        def new_drawing(filename="noname.svg", size=("100%", "100%"), writer=None, **extra):
+            # templates always use the stream writer
+            design = repr((self.side, key, size, sorted(extra.items()), svg_stream.COORD_PRECISION,
+                           svg_stream.TEXT_CONVERTER is not None,
+                           font_subset.FONT_MODE, font_subset.SUBSET_ENABLED, font_subset.SUBSET_FLAVOR,
+                           source_digest))
+            digest = hashlib.sha1(design.encode("utf-8")).hexdigest()[:16]
+            template = self._load(digest)
+            if template is None:
+                self.compiled += 1
+                on_compiled = functools.partial(self._store, digest)
+            else:
+                self.reused += 1
+                on_compiled = None
+            self._drawing = _TemplateDrawing(filename, size, template=template, on_compiled=on_compiled, **extra)
+            return self._drawing
+        return new_drawing
+
+    def _wrap_layer(self, name: str, fn):
+        static = name in self.static_layers
+        slot_name = name[len(self.prefix):]
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            dwg = self._drawing
+            if self._depth or dwg is None:
+                return fn(*args, **kwargs)
+            if static:
+                if dwg.template is not None:
+                    return None  # already in the template
+                return fn(*args, **kwargs)
+
+            self._depth = 1
+            dwg.begin_slot(slot_name)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                dwg.end_slot()
+                self._depth = 0
+        return wrapper
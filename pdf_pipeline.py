@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+pdf_pipeline.py
+
+The one PDF stage for main.py and the ingestion in utils.py. Every note
+side is converted exactly once, SVG -> vector PDF with cairosvg, next to
+its SVG (<note>.pdf); the PDF is reused for as long as it is newer than
+the SVG. Pair PDFs (front + back) and the all-notes PDF of a user are
+then assembled by copying pages out of those per-note PDFs -- nothing is
+rasterized and nothing is converted twice. Ingestion uses render_note(),
+which renders one parsed tree to both the PDF and the thumbnail raster.
+
+    front_pdf = svg_to_pdf("images/Lin/100/Lin_-_100_-_..._FRONT.svg")
+    pair_pdf(front_svg, back_svg, "images/Lin/100/Lin_-_100_-_..._COMBINED.pdf")
+    merge_pdfs([front_pdf, back_pdf, ...], "images/Lin/Lin_all_banknotes.pdf")
+
+Author: RingMaster Lin
+"""
+import io
+import os
+from urllib.request import pathname2url
+
+from PyPDF2 import PdfReader, PdfWriter, Transformation
+
+_stats = {"converted": 0, "reused": 0}
+
+# Caption strip added below captioned pages (serial / denomination lines)
+CAPTION_HEIGHT = 45
+CAPTION_FONT = ("Helvetica", 12)
+
+
+def note_pdf_path(svg_path: str) -> str:
+    """Per-note PDF path of an SVG: same folder and name, .pdf extension."""
+    return os.path.splitext(svg_path)[0] + ".pdf"
+
+
+def is_up_to_date(src: str, dst: str) -> bool:
+    return os.path.exists(dst) and os.path.getmtime(dst) >= os.path.getmtime(src)
+
+
+def svg_to_pdf(svg_path: str, pdf_path: str = None, force: bool = False) -> str:
+    """Vector PDF of an SVG, converted only when missing or older than the SVG; returns its path."""
+    pdf_path = pdf_path or note_pdf_path(svg_path)
+    if not force and is_up_to_date(svg_path, pdf_path):
+        _stats["reused"] += 1
+        return pdf_path
+
+    import cairosvg
+    svg_url = f"file:{pathname2url(os.path.abspath(svg_path))}"
+    tmp = f"{pdf_path}.{os.getpid()}.tmp"
+    cairosvg.svg2pdf(url=svg_url, write_to=tmp)
+    os.replace(tmp, pdf_path)
+    _stats["converted"] += 1
+    return pdf_path
+
+
+def render_note(svg_path: str, pdf_path: str = None, force: bool = False):
+    """
+    Parse an SVG once with cairosvg and render that one tree both to the
+    vector PDF (skipped when an up-to-date one exists) and to a native-size
+    raster; returns (PDF path, PIL image).
+    """
+    from cairosvg.parser import Tree
+    from cairosvg.surface import PDFSurface, PNGSurface
+    from PIL import Image
+
+    pdf_path = pdf_path or note_pdf_path(svg_path)
+    tree = Tree(url=f"file:{pathname2url(os.path.abspath(svg_path))}")
+    if force or not is_up_to_date(svg_path, pdf_path):
+        tmp = f"{pdf_path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            PDFSurface(tree, f, 96).finish()
+        os.replace(tmp, pdf_path)
+        _stats["converted"] += 1
+    else:
+        _stats["reused"] += 1
+
+    png_buffer = io.BytesIO()
+    PNGSurface(tree, png_buffer, 96).finish()
+    png_buffer.seek(0)
+    image = Image.open(png_buffer)
+    image.load()
+    return pdf_path, image
+
+
+def _caption_page(width: float, lines):
+    """One-page vector PDF strip (width x CAPTION_HEIGHT) with the caption lines."""
+    from reportlab.pdfgen import canvas
+
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=(width, CAPTION_HEIGHT))
+    c.setFont(*CAPTION_FONT)
+    for i, line in enumerate(lines):
+        c.drawString(50, 30 - 15 * i, line)
+    c.save()
+    buf.seek(0)
+    return PdfReader(buf).pages[0]
+
+
+def add_caption(page, lines):
+    """Extend page downwards by CAPTION_HEIGHT and draw the caption lines in the new strip."""
+    x0, y0 = float(page.mediabox.left), float(page.mediabox.bottom)
+    width = float(page.mediabox.width)
+    page.mediabox.lower_left = (x0, y0 - CAPTION_HEIGHT)
+    page.cropbox.lower_left = (x0, y0 - CAPTION_HEIGHT)
+    caption = _caption_page(width, lines)
+    caption.add_transformation(Transformation().translate(x0, y0 - CAPTION_HEIGHT))
+    page.merge_page(caption)
+    return page
+
+
+def merge_pdfs(pdf_paths, out_path: str, captions=None) -> str:
+    """
+    Copy all pages of pdf_paths, in order, into out_path. captions, when
+    given, holds one list of caption lines (or None) per PDF, drawn below
+    each of its pages.
+    """
+    writer = PdfWriter()
+    captions = captions or [None] * len(pdf_paths)
+    for path, lines in zip(pdf_paths, captions):
+        for page in PdfReader(path).pages:
+            if lines:
+                page = add_caption(page, lines)
+            writer.add_page(page)
+    tmp = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        writer.write(f)
+    os.replace(tmp, out_path)
+    return out_path
+
+
+def pair_pdf(front_svg: str, back_svg: str, out_path: str) -> str:
+    """Two-page front + back PDF of one note."""
+    return merge_pdfs([svg_to_pdf(front_svg), svg_to_pdf(back_svg)], out_path)
+
+
+def combined_pdf(svg_paths, out_path: str) -> str:
+    """One PDF with a page per SVG (each converted at most once)."""
+    return merge_pdfs([svg_to_pdf(path) for path in svg_paths], out_path)
+
+
+def pdf_pipeline_stats() -> dict:
+    return dict(_stats)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+rebuild_thumbnails.py
+
+Incremental, parallel rebuild of the raster outputs of every note under
+./images: the legacy PNG thumbnail and the WebP/AVIF pyramid
+(thumbnails.py). A manifest (images/.thumbnail_manifest.json) remembers,
+per SVG, its size, mtime and SHA-1 and the targets built from it, so a
+rerun only renders notes that are new, changed (by content -- a touched but
+identical file is not re-rendered) or missing a requested target.
+Renders run in a process pool, one raster render per SVG for all targets,
+with a progress line and ETA per finished note.
+
+    python rebuild_thumbnails.py                          # PNG + default pyramid
+    python rebuild_thumbnails.py --widths 480 --formats avif --workers 8
+    python rebuild_thumbnails.py --no-png --force
+
+Author: RingMaster Lin
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from thumbnails import THUMB_WIDTHS, THUMB_FORMATS, AVIF_AVAILABLE, build_pyramid
+
+IMAGES_ROOT = "./images"
+MANIFEST_NAME = ".thumbnail_manifest.json"
+PNG_SIZE = (1600, 600)  # same as the ingestion thumbnail
+MANIFEST_SAVE_EVERY = 25  # finished notes between manifest checkpoints
+
+
+def file_sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_manifest(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[!] Ignoring unreadable manifest {path}: {e}")
+        return {}
+
+
+def save_manifest(manifest: dict, path: str):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def requested_targets(png_size, widths, formats) -> list:
+    targets = [f"png@{png_size[0]}x{png_size[1]}"] if png_size else []
+    return targets + [f"{fmt}@{w}" for fmt in formats for w in widths]
+
+
+def is_stale(svg_path: str, entry: dict, targets: list) -> bool:
+    """True when svg_path has to be rendered again; refreshes entry's stat of an identical, touched file."""
+    if not entry or any(t not in entry.get("targets", ()) for t in targets):
+        return True
+    if any(not os.path.exists(p) for p in entry.get("outputs", ())):
+        return True
+    st = os.stat(svg_path)
+    if entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns:
+        return False
+    if entry.get("sha1") != file_sha1(svg_path):
+        return True
+    entry["size"], entry["mtime_ns"] = st.st_size, st.st_mtime_ns
+    return False
+
+
+def rebuild_one(job):
+    """Worker: one raster render of an SVG feeding the PNG and the pyramid."""
+    svg_path, png_size, widths, formats = job
+    from utils import rasterize_svg, generate_thumbnail
+
+    start = time.time()
+    try:
+        st = os.stat(svg_path)
+        sha1 = file_sha1(svg_path)
+        image = rasterize_svg(svg_path)
+        outputs = []
+        if png_size:
+            png_path = f"{os.path.splitext(svg_path)[0]}.png"
+            if not generate_thumbnail(svg_path, png_path, size=png_size, image=image):
+                raise RuntimeError(f"could not write {png_path}")
+            outputs.append(png_path)
+        pyramid = build_pyramid(image, svg_path, widths, formats) if widths and formats else {}
+        outputs += [p for levels in pyramid.values() for p in levels.values()]
+        entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha1": sha1, "outputs": outputs}
+        return svg_path, entry, pyramid, time.time() - start, None
+    except Exception as e:
+        return svg_path, None, None, time.time() - start, str(e)
+
+
+def _eta(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def rebuild_thumbnails(root: str = IMAGES_ROOT, png_size=PNG_SIZE, widths=THUMB_WIDTHS,
+                       formats=THUMB_FORMATS, workers: int = None, force: bool = False,
+                       manifest_path: str = None) -> dict:
+    """
+    Render the stale notes under root; returns {svg_path: pyramid} of the
+    notes rendered in this run (for updating Banknote.thumbnails).
+    """
+    manifest_path = manifest_path or os.path.join(root, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    targets = requested_targets(png_size, widths, formats)
+
+    svg_files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        svg_files += [os.path.join(dirpath, fn) for fn in sorted(filenames) if fn.lower().endswith(".svg")]
+    stale = [p for p in svg_files if force or is_stale(p, manifest.get(p), targets)]
+    print(f"[+] {len(svg_files)} SVG file(s), {len(stale)} to render, {len(svg_files) - len(stale)} up to date")
+    # Drop manifest entries of deleted notes
+    for path in set(manifest) - set(svg_files):
+        del manifest[path]
+    if not stale:
+        save_manifest(manifest, manifest_path)
+        return {}
+
+    jobs = [(p, png_size, tuple(widths), tuple(formats)) for p in stale]
+    workers = workers or min(8, os.cpu_count() or 1)
+    rebuilt, failed = {}, 0
+    start = time.time()
+
+    def finish(done, result):
+        nonlocal failed
+        svg_path, entry, pyramid, seconds, error = result
+        if error:
+            failed += 1
+            print(f"[!] [{done}/{len(jobs)}] {svg_path}: {error}")
+        else:
+            previous = manifest.get(svg_path)
+            entry["targets"] = sorted(targets)
+            if previous and previous.get("sha1") == entry["sha1"]:
+                # Same content: targets built earlier (other sizes/formats) are still valid
+                entry["targets"] = sorted(set(previous.get("targets", ())) | set(targets))
+                entry["outputs"] = sorted(set(previous.get("outputs", ())) | set(entry["outputs"]))
+            manifest[svg_path] = entry
+            rebuilt[svg_path] = pyramid
+            elapsed = time.time() - start
+            print(f"[+] [{done}/{len(jobs)}] {os.path.basename(svg_path)} ({seconds:.1f}s) "
+                  f"ETA {_eta(elapsed / done * (len(jobs) - done))}")
+        if done % MANIFEST_SAVE_EVERY == 0:
+            save_manifest(manifest, manifest_path)
+
+    if workers == 1:
+        for done, job in enumerate(jobs, 1):
+            finish(done, rebuild_one(job))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(rebuild_one, job) for job in jobs]
+            for done, future in enumerate(as_completed(futures), 1):
+                finish(done, future.result())
+
+    save_manifest(manifest, manifest_path)
+    print(f"[+] Rendered {len(rebuilt)} note(s) in {_eta(time.time() - start)}"
+          + (f", {failed} failed" if failed else ""))
+    return rebuilt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally rebuild note PNGs and WebP/AVIF thumbnail pyramids")
+    parser.add_argument("--root", type=str, default=IMAGES_ROOT, help="Folder searched for SVGs")
+    parser.add_argument("--widths", type=int, nargs="+", default=list(THUMB_WIDTHS), help="Pyramid widths in px")
+    parser.add_argument("--formats", nargs="+", choices=["webp", "avif"], default=list(THUMB_FORMATS),
+                        help="Pyramid formats")
+    parser.add_argument("--png-size", type=str, default=f"{PNG_SIZE[0]}x{PNG_SIZE[1]}",
+                        help="Size of the PNG thumbnail, WxH")
+    parser.add_argument("--no-png", action="store_true", help="Don't write the PNG thumbnail")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (1 = sequential)")
+    parser.add_argument("--force", action="store_true", help="Render every note, ignoring the manifest")
+    parser.add_argument("--no-db", action="store_true", help="Don't record the pyramids on the Banknote rows")
+    args = parser.parse_args()
+
+    formats = [fmt for fmt in args.formats if fmt != "avif" or AVIF_AVAILABLE]
+    if len(formats) != len(args.formats):
+        print("[!] Pillow can't encode AVIF here — skipping it")
+    try:
+        png_size = None if args.no_png else tuple(int(v) for v in args.png_size.lower().split("x"))
+    except ValueError:
+        print(f"[!] Bad --png-size {args.png_size}, expected WxH")
+        sys.exit(1)
+
+    kwargs = dict(png_size=png_size, widths=args.widths, formats=formats, workers=args.workers, force=args.force)
+    if args.no_db:
+        rebuild_thumbnails(args.root, **kwargs)
+    else:
+        from utils import regenerate_all_pngs
+        regenerate_all_pngs(args.root, **kwargs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+svg_optimize.py
+
+Optimization post-pass for saved banknote SVGs:
+
+    - default-valued attributes are removed (opacity="1", stroke-opacity="1",
+      stroke="none" where nothing above sets a stroke, rect x="0", ...)
+    - repeated sets of presentation attributes (fill, stroke, opacity,
+      font-family, ...) are hoisted into CSS classes in one <style> block
+    - adjacent sibling groups with identical attributes (same transform, no
+      group opacity/filter/mask/clip) are merged
+    - identical gradients are deduplicated and references re-pointed
+
+    python svg_optimize.py ./images/**/*.svg
+    stats = optimize_svg_file("note.svg")   # also used by --optimize in the generators
+
+Author: RingMaster Lin
+"""
+import os
+import re
+import argparse
+import xml.etree.ElementTree as ET
+from collections import Counter
+from typing import Tuple
+
+from svg_stream import open_output, read_svg
+
+SVG_NS = "http://www.w3.org/2000/svg"
+XLINK_NS = "http://www.w3.org/1999/xlink"
+ET.register_namespace("", SVG_NS)
+ET.register_namespace("xlink", XLINK_NS)
+
+XML_HEADER = '<?xml version="1.0" encoding="utf-8" ?>\n'
+HREF = f"{{{XLINK_NS}}}href"
+
+# Presentation attributes that may move into a CSS class
+HOISTABLE = (
+    "fill", "fill-opacity", "fill-rule", "stroke", "stroke-width", "stroke-opacity",
+    "stroke-linecap", "stroke-linejoin", "stroke-miterlimit", "stroke-dasharray",
+    "opacity", "font-family", "font-size", "font-weight", "text-anchor",
+    "alignment-baseline", "dominant-baseline", "letter-spacing",
+)
+# Lengths that need a unit inside a style sheet
+CSS_LENGTHS = ("stroke-width", "font-size", "letter-spacing")
+
+# Defaults of non-inherited properties: always safe to drop
+DEFAULTS = {"opacity": "1"}
+# Defaults of inherited properties: dropped only when no ancestor sets them
+INHERITED_DEFAULTS = {
+    "fill-opacity": "1", "stroke-opacity": "1", "stroke": "none", "stroke-width": "1",
+    "fill-rule": "nonzero", "stroke-linecap": "butt", "stroke-linejoin": "miter",
+    "stroke-miterlimit": "4", "stroke-dasharray": "none", "font-weight": "normal",
+    "text-anchor": "start",
+}
+ZERO_GEOMETRY = {"rect": ("x", "y"), "circle": ("cx", "cy"), "ellipse": ("cx", "cy"), "use": ("x", "y")}
+# Group attributes that change compositing; such groups are never merged
+COMPOSITING = ("opacity", "filter", "mask", "clip-path", "id")
+
+_NUMBER_RE = re.compile(r"^-?(\d+\.?\d*|\.\d+)$")
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _same_value(value: str, default: str) -> bool:
+    if value == default:
+        return True
+    try:
+        return float(value) == float(default)
+    except ValueError:
+        return False
+
+
+# ----------------------
+# Passes
+# ----------------------
+def remove_defaults(elem, inherited=frozenset(), in_defs=False) -> int:
+    """Drop default-valued attributes. Content of <defs>/<symbol> may be used in any context, so only
+    non-inherited defaults are dropped there. Returns the number of attributes removed."""
+    removed = 0
+    name = _local(elem.tag)
+    for key, default in DEFAULTS.items():
+        if key in elem.attrib and _same_value(elem.attrib[key], default):
+            del elem.attrib[key]
+            removed += 1
+    if not in_defs:
+        for key, default in INHERITED_DEFAULTS.items():
+            if key in elem.attrib and key not in inherited and _same_value(elem.attrib[key], default):
+                del elem.attrib[key]
+                removed += 1
+    for key in ZERO_GEOMETRY.get(name, ()):
+        if key in elem.attrib and _same_value(elem.attrib[key], "0"):
+            del elem.attrib[key]
+            removed += 1
+
+    child_inherited = inherited | {k for k in INHERITED_DEFAULTS if k in elem.attrib}
+    child_in_defs = in_defs or name in ("defs", "symbol")
+    for child in elem:
+        removed += remove_defaults(child, child_inherited, child_in_defs)
+    return removed
+
+
+def merge_groups(elem) -> int:
+    """Merge adjacent sibling <g> elements with identical attributes. Returns groups merged."""
+    merged = 0
+    children = list(elem)
+    previous = None
+    for child in children:
+        if (previous is not None and _local(child.tag) == "g" and _local(previous.tag) == "g"
+                and child.attrib == previous.attrib
+                and not any(k in child.attrib for k in COMPOSITING)
+                and not (child.text or "").strip() and not (previous.tail or "").strip()):
+            previous.extend(list(child))
+            elem.remove(child)
+            merged += 1
+            continue
+        previous = child
+    for child in elem:
+        merged += merge_groups(child)
+    return merged
+
+
+def dedupe_gradients(root) -> int:
+    """Remove gradients identical to an earlier one (ignoring id) and re-point their references."""
+    seen = {}
+    remap = {}
+    for parent in root.iter():
+        for child in list(parent):
+            if _local(child.tag) not in ("linearGradient", "radialGradient") or "id" not in child.attrib:
+                continue
+            attribs = {k: v for k, v in child.attrib.items() if k != "id"}
+            body = "".join(ET.tostring(stop, encoding="unicode") for stop in child)
+            signature = (child.tag, tuple(sorted(attribs.items())), body)
+            if signature in seen:
+                remap[child.attrib["id"]] = seen[signature]
+                parent.remove(child)
+            else:
+                seen[signature] = child.attrib["id"]
+    if not remap:
+        return 0
+
+    url_re = re.compile(r"url\(#([^)]+)\)")
+    for elem in root.iter():
+        for key, value in elem.attrib.items():
+            if "url(#" in value:
+                elem.attrib[key] = url_re.sub(lambda m: f"url(#{remap.get(m.group(1), m.group(1))})", value)
+            elif key == HREF and value[1:] in remap:
+                elem.attrib[key] = f"#{remap[value[1:]]}"
+    return len(remap)
+
+
+def _css_value(key: str, value: str) -> str:
+    if key in CSS_LENGTHS and _NUMBER_RE.match(value):
+        return f"{value}px"
+    if key == "font-family" and not value.startswith(("'", '"')) and "," not in value:
+        return f"'{value}'"
+    return value
+
+
+def _class_name(index: int) -> str:
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    name = ""
+    while True:
+        index, r = divmod(index, 36)
+        name = digits[r] + name
+        if not index:
+            return f"c{name}"
+
+
+def hoist_classes(root, min_count: int = 2) -> int:
+    """Move repeated presentation attribute sets into CSS classes. Returns the number of classes."""
+    def signature(elem):
+        if "class" in elem.attrib or "style" in elem.attrib or _local(elem.tag) in ("style", "svg"):
+            return None
+        items = tuple((k, elem.attrib[k]) for k in HOISTABLE if k in elem.attrib)
+        return items or None
+
+    counts = Counter(sig for sig in map(signature, root.iter()) if sig)
+    classes = {}
+    for sig, count in counts.most_common():
+        if count < min_count:
+            break
+        name = _class_name(len(classes))
+        attr_bytes = sum(len(k) + len(v) + 4 for k, v in sig)
+        rule = "." + name + "{" + ";".join(f"{k}:{_css_value(k, v)}" for k, v in sig) + "}"
+        if count * (attr_bytes - len(name) - 9) > len(rule):
+            classes[sig] = (name, rule)
+    if not classes:
+        return 0
+
+    for elem in root.iter():
+        sig = signature(elem)
+        if sig in classes:
+            for key, _ in sig:
+                del elem.attrib[key]
+            elem.set("class", classes[sig][0])
+
+    defs = root.find(f"{{{SVG_NS}}}defs")
+    if defs is None:
+        defs = ET.Element(f"{{{SVG_NS}}}defs")
+        root.insert(0, defs)
+    style = ET.Element(f"{{{SVG_NS}}}style", {"type": "text/css"})
+    style.text = "".join(rule for _, rule in classes.values())
+    defs.insert(0, style)
+    return len(classes)
+
+
+# ----------------------
+# Entry points
+# ----------------------
+def optimize_svg_text(svg: str) -> Tuple[str, dict]:
+    root = ET.fromstring(svg)
+    stats = {
+        "defaults_removed": remove_defaults(root),
+        "groups_merged": merge_groups(root),
+        "gradients_deduped": dedupe_gradients(root),
+    }
+    stats["classes"] = hoist_classes(root)
+    return XML_HEADER + ET.tostring(root, encoding="unicode"), stats
+
+
+def optimize_svg_file(path: str, out_path: str = None, verbose: bool = True) -> dict:
+    """Optimize an SVG file in place (or into out_path) and return the stats incl. bytes before/after.
+    Byte counts are of the uncompressed document; .svgz files stay compressed."""
+    svg = read_svg(path)
+    optimized, stats = optimize_svg_text(svg)
+    stats["bytes_before"] = len(svg.encode("utf-8"))
+    stats["bytes_after"] = len(optimized.encode("utf-8"))
+    with open_output(out_path or path) as f:
+        f.write(optimized)
+    if verbose:
+        change = stats["bytes_after"] - stats["bytes_before"]
+        print(f"[+] Optimized {os.path.basename(out_path or path)}: {stats['bytes_before'] / 1024:.1f} KB -> "
+              f"{stats['bytes_after'] / 1024:.1f} KB ({100 * change / max(1, stats['bytes_before']):+.1f}%, "
+              f"{stats['classes']} classes, {stats['defaults_removed']} defaults, "
+              f"{stats['groups_merged']} groups merged, {stats['gradients_deduped']} gradients deduped)")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Optimize banknote SVGs (CSS classes, defaults, groups, gradients)")
+    parser.add_argument("files", nargs="+", help="SVG files to optimize in place")
+    parser.add_argument("--suffix", type=str, default=None,
+                        help="Write <name><suffix>.svg next to each file instead of overwriting it")
+    args = parser.parse_args()
+
+    before = after = 0
+    for path in args.files:
+        out_path = None
+        if args.suffix:
+            base, ext = os.path.splitext(path)
+            out_path = f"{base}{args.suffix}{ext}"
+        try:
+            stats = optimize_svg_file(path, out_path)
+        except ET.ParseError as e:
+            print(f"[!] Skipping {path}: {e}")
+            continue
+        before += stats["bytes_before"]
+        after += stats["bytes_after"]
+    if before:
+        print(f"[+] Total: {before / 1024 / 1024:.2f} MB -> {after / 1024 / 1024:.2f} MB "
+              f"({100 * (after - before) / before:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
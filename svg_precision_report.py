@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+svg_precision_report.py
+
+Reports how many bytes generated SVGs lose when the numbers in their
+geometry attributes are written with fewer decimals (see COORD_PRECISION
+and GEOMETRY_ATTRIBS in svg_stream.py). Opacities, scales, font sizes,
+text content, ids and hrefs/data URLs are left alone. .svgz notes are
+measured uncompressed. With --apply the files are rewritten at the chosen
+precision (atomically, through svg_stream.open_output, refreshing any
+.svg.gz sidecar), which is handy for notes generated before the precision
+setting existed.
+
+    python svg_precision_report.py ./images --precisions 4 3 2 1
+    python svg_precision_report.py ./images --apply 2
+
+Author: RingMaster Lin
+"""
+import os
+import re
+import glob
+import argparse
+
+import svg_stream
+from svg_stream import GEOMETRY_ATTRIBS, round_numbers, round_transform, open_output, read_svg
+
+_ATTR_RE = re.compile(r'(\s)([\w:.-]+)="([^"]*)"')
+
+
+def round_svg_text(svg: str, precision: int) -> str:
+    """Round the numbers of the geometry attributes in an SVG document (same rule as svg_stream)."""
+    def sub(m):
+        if m.group(2) == "transform":
+            return f'{m.group(1)}{m.group(2)}="{round_transform(m.group(3), precision)}"'
+        if m.group(2) not in GEOMETRY_ATTRIBS:
+            return m.group(0)
+        return f'{m.group(1)}{m.group(2)}="{round_numbers(m.group(3), precision)}"'
+    return _ATTR_RE.sub(sub, svg)
+
+
+def collect_svgs(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in ("*.svg", "*.svgz"):
+                files.extend(glob.glob(os.path.join(path, "**", pattern), recursive=True))
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report SVG byte savings from coordinate rounding")
+    parser.add_argument("paths", nargs="+", help="SVG/SVGZ files or directories (searched recursively)")
+    parser.add_argument("--precisions", type=int, nargs="+", default=[4, 3, 2, 1], help="Decimals to compare")
+    parser.add_argument("--apply", type=int, default=None, metavar="DECIMALS",
+                        help="Rewrite the files with this many decimals")
+    args = parser.parse_args()
+
+    files = collect_svgs(args.paths)
+    if not files:
+        print("[!] No SVG files found")
+        return
+
+    totals = {p: 0 for p in args.precisions}
+    total_original = 0
+    print(f"{'file':<50}{'KB':>10}" + "".join(f"{f'{p} dp KB':>12}" for p in args.precisions))
+    for path in files:
+        svg = read_svg(path)
+        original = len(svg.encode("utf-8"))
+        total_original += original
+        row = f"{os.path.basename(path)[:49]:<50}{original / 1024:>10.1f}"
+        for p in args.precisions:
+            size = len(round_svg_text(svg, p).encode("utf-8"))
+            totals[p] += size
+            row += f"{size / 1024:>12.1f}"
+        print(row)
+
+        if args.apply is not None:
+            rounded = round_svg_text(svg, args.apply)
+            svg_stream.GZIP_SIDECAR = os.path.exists(f"{path}.gz")  # keep an existing sidecar in step
+            with open_output(path) as f:
+                f.write(rounded)
+
+    print(f"\n[+] {len(files)} file(s), {total_original / 1024 / 1024:.2f} MB")
+    for p in args.precisions:
+        saved = total_original - totals[p]
+        print(f"[+] {p} decimals: {totals[p] / 1024 / 1024:.2f} MB, "
+              f"saves {saved / 1024 / 1024:.2f} MB ({100 * saved / max(1, total_original):.1f}%)")
+    if args.apply is not None:
+        print(f"[+] Rewrote {len(files)} file(s) with {args.apply} decimals")
+
+
+if __name__ == "__main__":
+    main()
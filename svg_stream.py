@@ -0,0 +1,684 @@
+#!/usr/bin/env python3
+"""
+svg_stream.py
+
+Lightweight streaming replacement for svgwrite.Drawing.
+
+Supports the subset of the svgwrite API the banknote generators use
+(add, g, rect, circle, ellipse, line, polyline, polygon, path, text, tspan,
+textPath, image, use, symbol, style, linearGradient, radialGradient, defs, translate /
+rotate / scale, copy, add_stop_color, get_iri / get_funciri) without any
+attribute validation. Elements are plain objects with __slots__ and every
+top-level element is serialized to a spooled file buffer as soon as the next
+one is added, so a drawing never holds the whole note in memory. <defs> is
+kept apart and written first on save().
+
+Output follows svgwrite's serialization (sorted attributes, str() values,
+ElementTree escaping, CDATA styles). With COORD_PRECISION set, numbers in
+geometry attributes (GEOMETRY_ATTRIBS and translate() in transforms) are
+written with that many decimals; opacities, scales, font sizes and stroke
+widths always keep full precision. The default None rounds nothing. The
+rounding only applies to this writer -- the svgwrite backend always writes
+full precision.
+
+Files named *.svgz / *.svg.gz are gzip-compressed while streaming; with
+GZIP_SIDECAR set every x.svg is written together with a precompressed
+x.svg.gz in the same pass (served by app.py with Content-Encoding: gzip).
+
+Author: RingMaster Lin
+"""
+import io
+import os
+import re
+import gzip
+import shutil
+import tempfile
+from contextlib import contextmanager, ExitStack
+import xml.etree.ElementTree as ET
+
+import svgwrite
+from svgwrite.utils import AutoID
+
+# "stream" (this module) or "svgwrite" (the original, validating backend)
+DEFAULT_WRITER = "stream"
+WRITERS = ("stream", "svgwrite")
+
+# Body buffer is kept in memory up to this size, then spills to a temp file.
+SPOOL_MAX_BYTES = 16 * 1024 * 1024
+
+XML_HEADER = '<?xml version="1.0" encoding="utf-8" ?>\n'
+XLINK_NS = "http://www.w3.org/1999/xlink"
+
+# Decimals kept for numbers in geometry attributes (2 is 1/100 px at 300 dpi).
+# None (default) writes Python's full str() of every float.
+COORD_PRECISION = None
+
+# Attributes rounded to COORD_PRECISION (plus the translate() values of transforms)
+GEOMETRY_ATTRIBS = frozenset((
+    "x", "y", "x1", "y1", "x2", "y2", "dx", "dy", "cx", "cy", "r", "rx", "ry",
+    "fx", "fy", "width", "height", "points", "d", "viewBox",
+))
+
+# Optional hook replacing <text> elements when they are serialized, e.g.
+# glyph_outlines.outline_text; returns the element to write or None.
+TEXT_CONVERTER = None
+
+# Gzip output: file suffixes that are always compressed, and whether plain
+# .svg files also get a precompressed .svg.gz written next to them.
+GZIP_SUFFIXES = (".svgz", ".gz")
+GZIP_SIDECAR = False
+GZIP_LEVEL = 6
+
+
+def is_gzip_path(path: str) -> bool:
+    return path.lower().endswith(GZIP_SUFFIXES)
+
+
+class _Tee:
+    def __init__(self, *files):
+        self.files = files
+
+    def write(self, text):
+        for f in self.files:
+            f.write(text)
+        return len(text)
+
+
+@contextmanager
+def open_output(filename: str):
+    """
+    Text file object for writing an SVG: gzip-compressed for *.svgz / *.gz,
+    plain otherwise, plus a .gz sidecar in the same pass when GZIP_SIDECAR is set.
+    Everything is written to temp files next to the targets and moved into
+    place only when the block succeeds, so a failed save never leaves a
+    truncated note (or sidecar) behind. A plain .svg written without the
+    sidecar removes any older <file>.gz, which would otherwise be served
+    in its place.
+    """
+    gzipped = is_gzip_path(filename)
+    targets = [filename] if gzipped or not GZIP_SIDECAR else [filename, f"{filename}.gz"]
+    temps = [f"{target}.{os.getpid()}.tmp" for target in targets]
+    try:
+        with ExitStack() as stack:
+            if gzipped:
+                raw = stack.enter_context(open(temps[0], "wb"))
+                yield stack.enter_context(io.TextIOWrapper(
+                    gzip.GzipFile(filename=os.path.basename(filename), fileobj=raw, mode="wb",
+                                  compresslevel=GZIP_LEVEL),
+                    encoding="utf-8"))
+            else:
+                plain = stack.enter_context(open(temps[0], "w", encoding="utf-8"))
+                if len(temps) == 1:
+                    yield plain
+                else:
+                    # mtime=0 keeps the sidecar reproducible for identical notes
+                    raw = stack.enter_context(open(temps[1], "wb"))
+                    compressed = stack.enter_context(io.TextIOWrapper(
+                        gzip.GzipFile(filename=os.path.basename(filename), fileobj=raw, mode="wb",
+                                      compresslevel=GZIP_LEVEL, mtime=0),
+                        encoding="utf-8"))
+                    yield _Tee(plain, compressed)
+    except BaseException:
+        for tmp in temps:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        raise
+    for tmp, target in zip(temps, targets):
+        os.replace(tmp, target)
+    stale_sidecar = f"{filename}.gz"
+    if not gzipped and not GZIP_SIDECAR and os.path.exists(stale_sidecar):
+        os.remove(stale_sidecar)
+
+
+def read_svg(path: str) -> str:
+    """Read an SVG document, transparently decompressing *.svgz / *.gz."""
+    if is_gzip_path(path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return f.read()
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+class _SvgwriteDrawing(svgwrite.Drawing):
+    """svgwrite.Drawing that saves through open_output (gzip / sidecar aware)."""
+
+    def save(self, pretty=False, indent=2):
+        with open_output(self.filename) as f:
+            self.write(f, pretty=pretty, indent=indent)
+
+
+def new_drawing(filename="noname.svg", size=("100%", "100%"), writer: str = None, **extra):
+    """Create a drawing with the requested writer backend ("stream" or "svgwrite")."""
+    writer = writer or DEFAULT_WRITER
+    if writer == "svgwrite":
+        return _SvgwriteDrawing(filename, size=size, **extra)
+    if writer != "stream":
+        raise ValueError(f"Unknown SVG writer '{writer}' (available: {', '.join(WRITERS)})")
+    return Drawing(filename, size=size, **extra)
+
+
+# ----------------------
+# Serialization helpers (same escaping as xml.etree.ElementTree)
+# ----------------------
+def _escape_attrib(text: str) -> str:
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    if '"' in text:
+        text = text.replace('"', "&quot;")
+    if "\r" in text:
+        text = text.replace("\r", "&#13;")
+    if "\n" in text:
+        text = text.replace("\n", "&#10;")
+    if "\t" in text:
+        text = text.replace("\t", "&#09;")
+    return text
+
+
+def _escape_cdata(text: str) -> str:
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+
+_TEXT_CONTENT_RE = re.compile(r"<(?:text|tspan|textPath)\b[^>]*>([^<]+)")
+
+
+def iter_markup_text(markup: str):
+    """Escaped character data of the text/tspan/textPath elements in serialized markup."""
+    return _TEXT_CONTENT_RE.findall(markup)
+
+
+def _iterflat(values):
+    for value in values:
+        if hasattr(value, "__iter__") and not isinstance(value, str):
+            yield from _iterflat(value)
+        else:
+            yield value
+
+
+def strlist(values, separator=","):
+    if isinstance(values, str):
+        return values
+    return separator.join(str(v) for v in _iterflat(values) if v is not None)
+
+
+def _attr_name(key: str) -> str:
+    return key.rstrip("_").replace("_", "-")
+
+
+# ----------------------
+# Coordinate precision
+# ----------------------
+def fmt_number(value: float, precision: int = None) -> str:
+    """Shortest fixed-point form of value with at most `precision` decimals (default COORD_PRECISION)."""
+    if precision is None:
+        precision = COORD_PRECISION
+    if precision is None:
+        return str(value)
+    text = f"{value:.{precision}f}"
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+_long_number_res = {}
+
+
+def round_numbers(text: str, precision: int = None) -> str:
+    """Round every decimal number in text (path data, points, transforms) that has more than `precision` decimals."""
+    if precision is None:
+        precision = COORD_PRECISION
+    if precision is None or "." not in text:
+        return text
+    pattern = _long_number_res.get(precision)
+    if pattern is None:
+        pattern = _long_number_res[precision] = re.compile(r"-?\d*\.\d{%d,}" % (precision + 1))
+    return pattern.sub(lambda m: fmt_number(float(m.group()), precision), text)
+
+
+_TRANSLATE_RE = re.compile(r"translate\(([^)]*)\)")
+
+
+def round_transform(text: str, precision: int = None) -> str:
+    """Round the translate() values of a transform list; scale/rotate/matrix are kept as is."""
+    return _TRANSLATE_RE.sub(lambda m: f"translate({round_numbers(m.group(1), precision)})", text)
+
+
+def _attr_value(key: str, value) -> str:
+    precision = COORD_PRECISION
+    if precision is None:
+        return str(value)
+    if key not in GEOMETRY_ATTRIBS:
+        if key == "transform":
+            return round_transform(str(value), precision)
+        return str(value)
+    if isinstance(value, float):  # hot path: fmt_number inlined
+        text = f"{value:.{precision}f}"
+        if "." in text:
+            text = text.rstrip("0").rstrip(".")
+        return "0" if text == "-0" else text
+    if isinstance(value, int):
+        return str(value)
+    return round_numbers(str(value), precision)
+
+
+# ----------------------
+# Elements
+# ----------------------
+class Element:
+    """One SVG element: tag name, attribute dict, children and optional text."""
+    __slots__ = ("elementname", "attribs", "elements", "text", "content")
+    transformname = "transform"
+
+    def __init__(self, elementname: str, **extra):
+        self.elementname = elementname
+        self.attribs = {}
+        self.elements = []
+        self.text = None
+        self.content = None  # CDATA payload (style/script)
+        for key, value in extra.items():
+            self.attribs[_attr_name(key)] = value
+
+    # dict-like attribute access, as in svgwrite
+    def __getitem__(self, key):
+        return self.attribs[key]
+
+    def __setitem__(self, key, value):
+        self.attribs[key] = value
+
+    def update(self, attribs: dict):
+        for key, value in attribs.items():
+            self.attribs[_attr_name(key)] = value
+
+    def add(self, element):
+        self.elements.append(element)
+        return element
+
+    def copy(self):
+        new = self.__class__.__new__(self.__class__)
+        new.elementname = self.elementname
+        new.attribs = dict(self.attribs)
+        new.elements = list(self.elements)
+        new.text = self.text
+        new.content = self.content
+        if "id" in new.attribs:
+            new.attribs["id"] = AutoID.next_id()
+        return new
+
+    # ids / references
+    def get_id(self):
+        if "id" not in self.attribs:
+            self.attribs["id"] = AutoID.next_id()
+        return self.attribs["id"]
+
+    def get_iri(self):
+        return f"#{self.get_id()}"
+
+    def get_funciri(self):
+        return f"url({self.get_iri()})"
+
+    # transforms
+    def _add_transformation(self, new_transform: str):
+        old = self.attribs.get(self.transformname, "")
+        self.attribs[self.transformname] = f"{old} {new_transform}".strip()
+
+    def translate(self, tx, ty=None):
+        self._add_transformation(f"translate({strlist([tx, ty])})")
+
+    def rotate(self, angle, center=None):
+        self._add_transformation(f"rotate({strlist([angle, center])})")
+
+    def scale(self, sx, sy=None):
+        self._add_transformation(f"scale({strlist([sx, sy])})")
+
+    def matrix(self, a, b, c, d, e, f):
+        self._add_transformation(f"matrix({strlist([a, b, c, d, e, f])})")
+
+    # gradients
+    def add_stop_color(self, offset=None, color=None, opacity=None):
+        stop = Element("stop")
+        if offset is not None:
+            stop.attribs["offset"] = offset
+        if color is not None:
+            stop.attribs["stop-color"] = color
+        if opacity is not None:
+            stop.attribs["stop-opacity"] = opacity
+        self.elements.append(stop)
+        return self
+
+    def get_paint_server(self, default="none"):
+        return f"{self.get_funciri()} {default}"
+
+    # paths
+    def push(self, *commands):
+        self.attribs.setdefault("d", [])
+        self.attribs["d"].extend(commands)
+
+    # serialization
+    def write(self, write):
+        """Serialize this element through the `write(str)` callable."""
+        if TEXT_CONVERTER is not None and self.elementname == "text":
+            converted = TEXT_CONVERTER(self)
+            if converted is not None:
+                converted.write(write)
+                return
+        parts = ["<", self.elementname]
+        for key, value in sorted(self.attribs.items()):
+            if value is None:
+                continue
+            if key == "d" and isinstance(value, list):
+                value = strlist(value, " ")
+            value = _attr_value(key, value)
+            if value:
+                parts.append(f' {key}="{_escape_attrib(value)}"')
+        if not (self.text or self.elements or self.content):
+            parts.append(" />")
+            write("".join(parts))
+            return
+        parts.append(">")
+        if self.text:
+            parts.append(_escape_cdata(self.text))
+        write("".join(parts))
+        if self.content:
+            write(f"<![CDATA[{self.content}]]>")
+        for child in self.elements:
+            if isinstance(child, Element):
+                child.write(write)
+            else:  # plain svgwrite element added by a caller
+                write(child.tostring())
+        write(f"</{self.elementname}>")
+
+    def tostring(self) -> str:
+        buf = io.StringIO()
+        self.write(buf.write)
+        return buf.getvalue()
+
+
+class Gradient(Element):
+    __slots__ = ()
+    transformname = "gradientTransform"
+
+
+class Fragment(Element):
+    """
+    One already serialized element (e.g. from the layer cache). It is written
+    verbatim by this module and parsed back into an ElementTree element when
+    added to an svgwrite drawing, so both writers produce the same output.
+    """
+    __slots__ = ("markup",)
+
+    def __init__(self, markup: str):
+        super().__init__(re.match(r"<([^\s/>]+)", markup).group(1))
+        self.markup = markup
+
+    def write(self, write):
+        write(self.markup)
+
+    def get_xml(self):
+        if "xlink:" not in self.markup:
+            return ET.fromstring(self.markup)
+        # svgwrite keeps "xlink:href" as a literal attribute name: parse with
+        # the prefix bound, then rename the attributes back
+        elem = ET.fromstring(f'<w xmlns:xlink="{XLINK_NS}">{self.markup}</w>')[0]
+        prefix = f"{{{XLINK_NS}}}"
+        for e in elem.iter():
+            for key in [k for k in e.attrib if k.startswith(prefix)]:
+                e.attrib["xlink:" + key[len(prefix):]] = e.attrib.pop(key)
+        return elem
+
+
+class ElementFactory:
+    """Element constructors with the svgwrite keyword conventions."""
+
+    def g(self, **extra):
+        return Element("g", **extra)
+
+    def defs(self, **extra):
+        return Element("defs", **extra)
+
+    def symbol(self, **extra):
+        return Element("symbol", **extra)
+
+    def use(self, href, insert=None, size=None, **extra):
+        elem = Element("use", **extra)
+        elem.attribs["xlink:href"] = href if isinstance(href, str) else href.get_iri()
+        if insert is not None:
+            elem.attribs["x"], elem.attribs["y"] = insert[0], insert[1]
+        if size is not None:
+            elem.attribs["width"], elem.attribs["height"] = size[0], size[1]
+        return elem
+
+    def rect(self, insert=(0, 0), size=(1, 1), rx=None, ry=None, **extra):
+        elem = Element("rect", **extra)
+        a = elem.attribs
+        a["x"], a["y"] = insert
+        a["width"], a["height"] = size
+        if rx is not None:
+            a["rx"] = rx
+        if ry is not None:
+            a["ry"] = ry
+        return elem
+
+    def circle(self, center=(0, 0), r=1, **extra):
+        elem = Element("circle", **extra)
+        elem.attribs["cx"], elem.attribs["cy"] = center
+        elem.attribs["r"] = r
+        return elem
+
+    def ellipse(self, center=(0, 0), r=(1, 1), **extra):
+        elem = Element("ellipse", **extra)
+        elem.attribs["cx"], elem.attribs["cy"] = center
+        elem.attribs["rx"], elem.attribs["ry"] = r
+        return elem
+
+    def line(self, start=(0, 0), end=(0, 0), **extra):
+        elem = Element("line", **extra)
+        a = elem.attribs
+        a["x1"], a["y1"] = start
+        a["x2"], a["y2"] = end
+        return elem
+
+    def polyline(self, points=(), **extra):
+        return self._poly("polyline", points, extra)
+
+    def polygon(self, points=(), **extra):
+        return self._poly("polygon", points, extra)
+
+    @staticmethod
+    def _poly(name, points, extra):
+        elem = Element(name, **extra)
+        elem.attribs["points"] = " ".join("%s,%s" % (x, y) for x, y in points)
+        return elem
+
+    def path(self, d=None, **extra):
+        elem = Element("path", **extra)
+        elem.attribs["d"] = [d]
+        return elem
+
+    def text(self, text, insert=None, x=None, y=None, dx=None, dy=None, rotate=None, **extra):
+        return self._text("text", text, insert, x, y, dx, dy, rotate, extra)
+
+    def tspan(self, text, insert=None, x=None, y=None, dx=None, dy=None, rotate=None, **extra):
+        return self._text("tspan", text, insert, x, y, dx, dy, rotate, extra)
+
+    @staticmethod
+    def _text(name, text, insert, x, y, dx, dy, rotate, extra):
+        elem = Element(name, **extra)
+        elem.text = str(text)
+        if insert is not None:
+            x, y = [insert[0]], [insert[1]]
+        a = elem.attribs
+        for key, value in (("x", x), ("y", y), ("dx", dx), ("dy", dy), ("rotate", rotate)):
+            if value is not None:
+                a[key] = strlist(list(_iterflat(value)), " ")
+        return elem
+
+    def textPath(self, path, text, startOffset=None, method="align", spacing="exact", **extra):
+        elem = Element("textPath", **extra)
+        elem.text = str(text)
+        if method == "stretch":
+            elem.attribs["method"] = method
+        if spacing == "auto":
+            elem.attribs["spacing"] = spacing
+        if startOffset is not None:
+            elem.attribs["startOffset"] = startOffset
+        elem.attribs["xlink:href"] = path if isinstance(path, str) else path.get_iri()
+        return elem
+
+    def image(self, href, insert=None, size=None, **extra):
+        elem = Element("image", **extra)
+        elem.attribs["xlink:href"] = href
+        if insert is not None:
+            elem.attribs["x"], elem.attribs["y"] = insert[0], insert[1]
+        if size is not None:
+            elem.attribs["width"], elem.attribs["height"] = size[0], size[1]
+        return elem
+
+    def style(self, content="", **extra):
+        elem = Element("style", **extra)
+        elem.attribs["type"] = "text/css"
+        elem.content = content
+        return elem
+
+    def linearGradient(self, start=None, end=None, inherit=None, **extra):
+        elem = Gradient("linearGradient", **extra)
+        if inherit is not None:
+            elem.attribs["xlink:href"] = inherit if isinstance(inherit, str) else inherit.get_iri()
+        if start is not None:
+            elem.attribs["x1"], elem.attribs["y1"] = start[0], start[1]
+        if end is not None:
+            elem.attribs["x2"], elem.attribs["y2"] = end[0], end[1]
+        return elem
+
+    def radialGradient(self, center=None, r=None, focal=None, inherit=None, **extra):
+        elem = Gradient("radialGradient", **extra)
+        if inherit is not None:
+            elem.attribs["xlink:href"] = inherit if isinstance(inherit, str) else inherit.get_iri()
+        if center is not None:
+            elem.attribs["cx"], elem.attribs["cy"] = center[0], center[1]
+        if r is not None:
+            elem.attribs["r"] = r
+        if focal is not None:
+            elem.attribs["fx"], elem.attribs["fy"] = focal[0], focal[1]
+        return elem
+
+
+class Drawing(ElementFactory):
+    """
+    Streaming drawing. Top-level elements are serialized one step late: the
+    previous element is flushed to the body buffer when the next one is added,
+    so a group can still be filled right after `dwg.add(group)`.
+    """
+
+    def __init__(self, filename="noname.svg", size=("100%", "100%"), **extra):
+        self.filename = filename
+        self.profile = extra.pop("profile", "full")
+        extra.pop("debug", None)
+        self.attribs = {}
+        if size is not None:
+            self.attribs["width"], self.attribs["height"] = size[0], size[1]
+        for key, value in extra.items():
+            self.attribs[_attr_name(key)] = value
+        self.defs = Element("defs")
+        self._body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, mode="w+", encoding="utf-8")
+        self._pending = None
+        self.element_count = 0
+
+    def __getitem__(self, key):
+        return self.attribs[key]
+
+    def __setitem__(self, key, value):
+        self.attribs[key] = value
+
+    def add(self, element):
+        if self._pending is not None:
+            self._flush()
+        self._pending = element
+        self.element_count += 1
+        return element
+
+    def _flush(self):
+        element, self._pending = self._pending, None
+        if isinstance(element, Element):
+            element.write(self._body.write)
+        else:
+            self._body.write(element.tostring())
+
+    def _root_open(self) -> str:
+        attribs = dict(self.attribs)
+        attribs.update({
+            "xmlns": "http://www.w3.org/2000/svg",
+            "xmlns:xlink": "http://www.w3.org/1999/xlink",
+            "xmlns:ev": "http://www.w3.org/2001/xml-events",
+            "baseProfile": self.profile,
+            "version": "1.1",
+        })
+        parts = ["<svg"]
+        for key, value in sorted(attribs.items()):
+            if value is None:
+                continue
+            value = str(value)
+            if value:
+                parts.append(f' {key}="{_escape_attrib(value)}"')
+        parts.append(">")
+        return "".join(parts)
+
+    def iter_text(self, chunk_size: int = 1 << 20):
+        """
+        Escaped character data of every text element serialized into the body so
+        far (defs are not included), read back from the body buffer in chunks.
+        """
+        if self._pending is not None:
+            self._flush()
+        self._body.seek(0)
+        tail = ""
+        while True:
+            chunk = self._body.read(chunk_size)
+            if not chunk:
+                break
+            data = tail + chunk
+            cut = data.rfind("<")
+            if cut <= 0:
+                tail = data
+                continue
+            tail = data[cut:]
+            yield from iter_markup_text(data[:cut])
+        yield from iter_markup_text(tail)
+        self._body.seek(0, io.SEEK_END)
+
+    def write(self, fileobj):
+        """Write the complete document (header, root, defs, body) to a text file object."""
+        if self._pending is not None:
+            self._flush()
+        fileobj.write(XML_HEADER)
+        fileobj.write(self._root_open())
+        self.defs.write(fileobj.write)
+        self._body.seek(0)
+        shutil.copyfileobj(self._body, fileobj)
+        self._body.seek(0, io.SEEK_END)
+        fileobj.write("</svg>")
+
+    def tostring(self) -> str:
+        buf = io.StringIO()
+        self.write(buf)
+        # match svgwrite: tostring() has no XML header
+        return buf.getvalue()[len(XML_HEADER):]
+
+    def save(self, pretty=False, indent=2):
+        with open_output(self.filename) as f:
+            self.write(f)
+
+    def saveas(self, filename, pretty=False, indent=2):
+        self.filename = filename
+        self.save()
+
+    def close(self):
+        self._body.close()
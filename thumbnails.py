@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+thumbnails.py
+
+Multi-resolution thumbnails for the gallery. From the one raster render
+ingestion already makes of a note, build a pyramid of widths
+(THUMB_WIDTHS) in WebP, plus AVIF when Pillow can encode it, written next
+to the SVG as <note>_<width>w.<format>. Each level is downsampled from the
+level above it, so the full-size raster is only resampled once.
+
+The pyramid is recorded on the Banknote row as JSON,
+{"webp": {"320": path, "800": path, ...}, "avif": {...}}, and templates
+turn it into srcset lists, so list pages fetch a few KB per note instead
+of the multi-MB SVG.
+
+    pyramid = build_pyramid(image, svg_path)
+    banknote.thumbnails = json.dumps(pyramid)
+
+Author: RingMaster Lin
+"""
+import os
+import json
+import mimetypes
+
+from PIL import Image, features
+
+THUMB_WIDTHS = (320, 800, 1600)
+THUMB_QUALITY = {"webp": 80, "avif": 60}
+AVIF_AVAILABLE = features.check("avif")
+THUMB_FORMATS = ("avif", "webp") if AVIF_AVAILABLE else ("webp",)  # preferred first
+THUMB_MIMETYPES = {"avif": "image/avif", "webp": "image/webp"}
+
+# Older Pythons don't know .avif; send_from_directory guesses types from the extension
+for _fmt, _mimetype in THUMB_MIMETYPES.items():
+    mimetypes.add_type(_mimetype, f".{_fmt}")
+
+
+def thumbnail_path(svg_path: str, width: int, fmt: str) -> str:
+    return f"{os.path.splitext(svg_path)[0]}_{width}w.{fmt}"
+
+
+def build_pyramid(image, svg_path: str, widths=THUMB_WIDTHS, formats=THUMB_FORMATS) -> dict:
+    """Write the thumbnail pyramid of one rendered note; returns {format: {width: path}}."""
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+    pyramid = {fmt: {} for fmt in formats}
+    level = image
+    for width in sorted(widths, reverse=True):
+        width = min(width, image.width)
+        height = max(1, round(image.height * width / image.width))
+        if level.size != (width, height):
+            level = level.resize((width, height), Image.LANCZOS)
+        for fmt in formats:
+            path = thumbnail_path(svg_path, width, fmt)
+            level.save(path, format=fmt.upper(), quality=THUMB_QUALITY.get(fmt, 80))
+            pyramid[fmt][str(width)] = path
+    return pyramid
+
+
+def existing_pyramid(svg_path: str, widths=THUMB_WIDTHS, formats=THUMB_FORMATS) -> dict:
+    """The pyramid of an SVG as found on disk (for notes without a Banknote row)."""
+    pyramid = {}
+    for fmt in formats:
+        levels = {str(w): thumbnail_path(svg_path, w, fmt) for w in widths}
+        levels = {w: p for w, p in levels.items() if os.path.exists(p)}
+        if levels:
+            pyramid[fmt] = levels
+    return pyramid
+
+
+def load_pyramid(value) -> dict:
+    """Pyramid from a Banknote.thumbnails value (JSON text, dict or None)."""
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        return value
+    try:
+        return json.loads(value)
+    except ValueError:
+        return {}
+
+
+def srcset(pyramid, fmt: str, url_for_path) -> str:
+    """srcset list ("<url> 320w, <url> 800w, ...") of one format; url_for_path maps a file path to its URL."""
+    levels = load_pyramid(pyramid).get(fmt, {})
+    return ", ".join(f"{url_for_path(path)} {width}w" for width, path in sorted(levels.items(), key=lambda kv: int(kv[0])))
@@ -1,8 +1,11 @@
 # utils.py
 import os
+import json
 import unicodedata
 import subprocess
 import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 import re
 import xml.etree.ElementTree as ET
@@ -11,9 +14,6 @@ from urllib.request import pathname2url
 import glob
 from PIL import Image
 import cairosvg
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.utils import ImageReader
 import pyotp
 import qrcode
 import io
@@ -25,10 +25,14 @@ from models import db, User, GenerationTask, Banknote, SerialNumber
 from sqlalchemy import desc  # <-- Add this if using desc in utility functions
 import bleach
 from bleach.sanitizer import ALLOWED_TAGS, ALLOWED_ATTRIBUTES
+from font_registry import get_pil_font
+from pdf_pipeline import svg_to_pdf, merge_pdfs, render_note
+from thumbnails import build_pyramid
 # Configuration
 IMAGES_ROOT = "./images"
 GENERATION_LOCK = threading.Lock()
 GENERATION_THREADS = {}
+INGEST_WORKERS = min(8, os.cpu_count() or 1)  # processes for process_generated_files (1 = sequential)
 
 
 
@@ -192,10 +196,7 @@ def get_user_avatar_or_default(username):
     draw = ImageDraw.Draw(img)
     
     # Try to use a font, fallback to default
-    try:
-        font = ImageFont.truetype("arial.ttf", 40)
-    except:
-        font = ImageFont.load_default()
+    font = get_pil_font("arial.ttf", 40) or ImageFont.load_default()
     
     # Draw initials
     bbox = draw.textbbox((0, 0), initials, font=font)
@@ -260,11 +261,27 @@ def extract_qr_from_svg(svg_path):
     
     return None
 
-def generate_thumbnail(svg_path, png_path, size=(600, 300)):
-    """Generate PNG thumbnail from SVG file"""
+def rasterize_svg(svg_path, size=None):
+    """Render an SVG once with cairosvg (native size unless size is given) and return it as a PIL image"""
+    svg_url = f"file:{pathname2url(os.path.abspath(svg_path))}"
+    png_buffer = BytesIO()
+    if size:
+        cairosvg.svg2png(url=svg_url, write_to=png_buffer, output_width=size[0], output_height=size[1])
+    else:
+        cairosvg.svg2png(url=svg_url, write_to=png_buffer)
+    png_buffer.seek(0)
+    image = Image.open(png_buffer)
+    image.load()
+    return image
+
+def generate_thumbnail(svg_path, png_path, size=(600, 300), image=None):
+    """Generate PNG thumbnail from SVG file (or from an already rendered image of it)"""
     try:
-        svg_url = f"file:{pathname2url(os.path.abspath(svg_path))}"
-        cairosvg.svg2png(url=svg_url, write_to=png_path, output_width=size[0], output_height=size[1])
+        if image is None:
+            image = rasterize_svg(svg_path, size)
+        if image.size != tuple(size):
+            image = image.resize(size, Image.LANCZOS)
+        image.save(png_path, format="PNG")
         print(f"Generated PNG: {png_path}")
         return True
     except Exception as e:
@@ -272,118 +289,137 @@ def generate_thumbnail(svg_path, png_path, size=(600, 300)):
         return False
 
 def generate_pdf(svg_path, pdf_path):
-    """Convert SVG to PDF"""
+    """Convert SVG to a vector PDF (reused when main.py already converted it)"""
     try:
-        png_buffer = BytesIO()
-        cairosvg.svg2png(url=svg_path, write_to=png_buffer)
-        png_buffer.seek(0)
-        
-        c = canvas.Canvas(pdf_path, pagesize=letter)
-        img = ImageReader(png_buffer)
-        c.drawImage(img, 50, 50, width=500, height=250, preserveAspectRatio=True)
-        c.save()
+        svg_to_pdf(svg_path, pdf_path)
         return True
     except Exception as e:
         print(f"Error generating PDF: {e}")
         return False
 
 def generate_combined_pdf(banknotes, pdf_path):
-    """Generate combined PDF for multiple banknotes"""
+    """
+    Generate combined PDF for multiple banknotes by copying the pages of their
+    vector PDFs, each with a serial / denomination caption below it
+    """
     try:
-        c = canvas.Canvas(pdf_path, pagesize=letter)
-        
-        for i, banknote in enumerate(banknotes):
-            if i > 0:
-                c.showPage()
-            
-            if os.path.exists(banknote.png_path):
-                img = ImageReader(banknote.png_path)
-                c.drawImage(img, 50, 50, width=500, height=250, preserveAspectRatio=True)
-            
-            c.setFont("Helvetica", 12)
-            c.drawString(50, 30, f"Serial: {banknote.serial_number}")
-            c.drawString(50, 15, f"Denomination: {banknote.denomination}")
-        
-        c.save()
+        note_pdfs, captions = [], []
+        for banknote in banknotes:
+            if banknote.pdf_path and os.path.exists(banknote.pdf_path):
+                note_pdfs.append(banknote.pdf_path)
+            elif banknote.svg_path and os.path.exists(banknote.svg_path):
+                note_pdfs.append(svg_to_pdf(banknote.svg_path, banknote.pdf_path or None))
+            else:
+                continue
+            captions.append([f"Serial: {banknote.serial_number}", f"Denomination: {banknote.denomination}"])
+        merge_pdfs(note_pdfs, pdf_path, captions=captions)
         return True
     except Exception as e:
         print(f"Error generating combined PDF: {e}")
         return False
 
+def ingest_svg(job):
+    """
+    Per-note ingestion work, run in a worker process: QR/serial extraction,
+    then one cairosvg parse feeding the vector PDF (unless main.py already
+    wrote an up-to-date one) and the raster for the PNG thumbnail and the
+    WebP/AVIF pyramid. Touches no DB state.
+    """
+    svg_path, denom, side = job
+    stem = os.path.splitext(svg_path)[0]
+    png_path = f"{stem}.png"
+    pdf_path = f"{stem}.pdf"
+
+    qr_data = extract_qr_from_svg(svg_path)
+    thumbnails = None
+    try:
+        pdf_path, image = render_note(svg_path, pdf_path)
+        generate_thumbnail(svg_path, png_path, size=(1600,600), image=image)
+        thumbnails = build_pyramid(image, svg_path)
+    except Exception as e:
+        print(f"Error rendering {svg_path}: {e}")
+
+    return {"svg_path": svg_path, "denom": denom, "side": side, "png_path": png_path,
+            "pdf_path": pdf_path, "thumbnails": thumbnails, "qr_data": qr_data}
+
 def process_generated_files(user_id, username):
-    """Process all generated SVG files after banknote generation"""
-    user = User.query.get(user_id)
+    """
+    Process all generated SVG files after banknote generation. The per-note
+    work is fanned out to a process pool (INGEST_WORKERS); the DB rows are
+    added afterwards and committed in one transaction.
+    """
     name_path = os.path.join(IMAGES_ROOT, username)
     
     if not os.path.exists(name_path):
         return
     
-    for denom in os.listdir(name_path):
+    jobs = []
+    for denom in sorted(os.listdir(name_path)):
         denom_path = os.path.join(name_path, denom)
         if not os.path.isdir(denom_path):
             continue
             
-        for svg_file in os.listdir(denom_path):
+        for svg_file in sorted(os.listdir(denom_path)):
             if svg_file.lower().endswith('.svg'):
-                svg_path = os.path.join(denom_path, svg_file)
                 side = 'front' if '_FRONT' in svg_file.upper() else 'back'
-                
-                # Extract QR code data
-                qr_data = extract_qr_from_svg(svg_path)
-                
-                # For front notes, use the extracted QR data or generate a fallback
-                if side == 'front':
-                    serial_number = qr_data if qr_data and qr_data.startswith('SN-') else f"SN-{username}-{denom}-{side}"
-                
-                # For back notes, try to extract from QR code first
-                # If that fails, look for the corresponding front note
-                else:
-                    if qr_data and qr_data.startswith('SN-'):
-                        serial_number = qr_data
-                    else:
-                        # Try to find the front note for this denomination
-                        front_svg_files = [f for f in os.listdir(denom_path) 
-                                         if f.upper().endswith('.SVG') and '_FRONT' in f.upper()]
-                        
-                        if front_svg_files:
-                            front_svg_path = os.path.join(denom_path, front_svg_files[0])
-                            front_qr_data = extract_qr_from_svg(front_svg_path)
-                            if front_qr_data and front_qr_data.startswith('SN-'):
-                                serial_number = front_qr_data
-                            else:
-                                serial_number = f"SN-{username}-{denom}-{side}"
-                        else:
-                            serial_number = f"SN-{username}-{denom}-{side}"
-                
-                png_filename = f"{os.path.splitext(svg_file)[0]}.png"
-                png_path = os.path.join(denom_path, png_filename)
-                
-                pdf_filename = f"{os.path.splitext(svg_file)[0]}.pdf"
-                pdf_path = os.path.join(denom_path, pdf_filename)
-                
-                generate_thumbnail(svg_path, png_path, size=(1600,600))
-                generate_pdf(svg_path, pdf_path)
-                
-                banknote = Banknote(
-                    user_id=user_id,
-                    serial_number=serial_number,
-                    seed_text=username,
-                    denomination=denom,
-                    side=side,
-                    svg_path=svg_path,
-                    png_path=png_path,
-                    pdf_path=pdf_path,
-                    qr_data=qr_data
-                )
-                db.session.add(banknote)
-                
-                serial = SerialNumber(
-                    serial=serial_number,
-                    user_id=user_id,
-                    banknote_id=banknote.id,
-                    is_active=True
-                )
-                db.session.add(serial)
+                jobs.append((os.path.join(denom_path, svg_file), denom, side))
+    
+    if INGEST_WORKERS == 1 or len(jobs) < 2:
+        results = [ingest_svg(job) for job in jobs]
+    else:
+        # Called from a generation thread of the web server: a forked child could inherit
+        # a lock held by another thread (stdout, logging) and hang, so start fresh workers
+        with ProcessPoolExecutor(max_workers=INGEST_WORKERS,
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(pool.map(ingest_svg, jobs))
+    
+    # Serial of the front note per denomination, used for backs without a readable serial
+    front_serials = {}
+    for result in results:
+        qr_data = result["qr_data"]
+        if result["side"] == 'front' and qr_data and qr_data.startswith('SN-'):
+            front_serials.setdefault(result["denom"], qr_data)
+    
+    banknotes = []
+    for result in results:
+        denom, side, qr_data = result["denom"], result["side"], result["qr_data"]
+        if qr_data and qr_data.startswith('SN-'):
+            serial_number = qr_data
+        elif side == 'back' and denom in front_serials:
+            serial_number = front_serials[denom]
+        else:
+            serial_number = f"SN-{username}-{denom}-{side}"
+        
+        banknote = Banknote(
+            user_id=user_id,
+            serial_number=serial_number,
+            seed_text=username,
+            denomination=denom,
+            side=side,
+            svg_path=result["svg_path"],
+            png_path=result["png_path"],
+            pdf_path=result["pdf_path"],
+            thumbnails=json.dumps(result["thumbnails"]) if result["thumbnails"] else None,
+            qr_data=qr_data
+        )
+        db.session.add(banknote)
+        banknotes.append(banknote)
+    
+    # Flush (same transaction) so the serials can reference the banknote ids;
+    # front and back share a serial, which is registered once, for the front
+    db.session.flush()
+    registered = set()
+    for banknote in sorted(banknotes, key=lambda b: b.side != 'front'):
+        if banknote.serial_number in registered:
+            continue
+        registered.add(banknote.serial_number)
+        serial = SerialNumber(
+            serial=banknote.serial_number,
+            user_id=user_id,
+            banknote_id=banknote.id,
+            is_active=True
+        )
+        db.session.add(serial)
     
     db.session.commit()
     
@@ -484,21 +520,29 @@ def validate_serial_id(serial_id):
 
     return {"valid": False, "reason": "Invalid format"}
 
-def regenerate_all_pngs():
-    """Regenerate all PNG thumbnails from SVG files"""
+def regenerate_all_pngs(root=IMAGES_ROOT, **kwargs):
+    """
+    Incrementally regenerate the PNG thumbnails and WebP/AVIF pyramids of all
+    notes (see rebuild_thumbnails.py) and record the new pyramids on their
+    Banknote rows. kwargs go to rebuild_thumbnails (widths, formats, workers, force, ...).
+    """
     from app import app
+    from rebuild_thumbnails import rebuild_thumbnails
+    from thumbnails import load_pyramid
     with app.app_context():
-        svg_files = glob.glob('./images/**/*.svg', recursive=True)
-        print(f"Found {len(svg_files)} SVG files")
-        
-        for svg_path in svg_files:
-            png_path = svg_path.replace('.svg', '.png')
-            
-            if not os.path.exists(png_path):
-                print(f"Generating PNG for: {svg_path}")
-                if generate_thumbnail(svg_path, png_path):
-                    print(f"✓ Created {png_path}")
-                else:
-                    print(f"✗ Failed to create {png_path}")
-            else:
-                print(f"✓ PNG already exists: {png_path}")
\ No newline at end of file
+        rebuilt = rebuild_thumbnails(root, **kwargs)
+        if not rebuilt:
+            return
+        rebuilt = {os.path.normpath(path): pyramid for path, pyramid in rebuilt.items()}
+        updated = 0
+        for banknote in Banknote.query.filter(Banknote.svg_path.isnot(None)).all():
+            pyramid = rebuilt.get(os.path.normpath(banknote.svg_path))
+            if pyramid:
+                # Keep the formats this run didn't target
+                merged = load_pyramid(banknote.thumbnails)
+                for fmt, levels in pyramid.items():
+                    merged.setdefault(fmt, {}).update(levels)
+                banknote.thumbnails = json.dumps(merged)
+                updated += 1
+        db.session.commit()
+        print(f"[+] Recorded thumbnails on {updated} banknote(s)")
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+vector_layers.py
+
+Numpy kernels for the heavy, repetitive banknote layers. Each function
+returns plain path data (fill / d strings) so the generators can emit a few
+grouped <path> elements instead of thousands of individual shapes.
+
+Author: RingMaster Lin
+"""
+import hashlib
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+
+import svg_stream
+from svg_stream import fmt_number
+
+# Results reused across the notes of one series (same portrait, same size)
+HALFTONE_CACHE_SIZE = 16
+_halftone_cache = {}
+
+
+def _fmt(v: float) -> str:
+    """Short number formatting for path data (svg_stream.COORD_PRECISION decimals)."""
+    return fmt_number(v)
+
+
+def image_digest(im: Image.Image) -> str:
+    """Content hash used to key caches on an image."""
+    h = hashlib.sha1()
+    h.update(f"{im.mode}{im.size}".encode("utf-8"))
+    h.update(im.tobytes())
+    return h.hexdigest()
+
+
+# ----------------------
+# Halftone portrait
+# ----------------------
+def halftone_paths(im: Image.Image, size_px: float, step: int = 4, color_bits: int = 8) -> List[Tuple[str, str]]:
+    """
+    Halftone `im` into dots of radius step/2 inside the inscribed circle of a
+    size_px square. Dots are grouped by exact color and returned as
+    [(fill, path_d), ...] in local coordinates (0..size_px); color_bits < 8
+    is an opt-in quantization per channel (fewer paths, altered colors).
+    Cached per (image content, size, step, color_bits, COORD_PRECISION).
+    """
+    key = (image_digest(im), int(size_px), step, color_bits, svg_stream.COORD_PRECISION)
+    cached = _halftone_cache.get(key)
+    if cached is not None:
+        return cached
+
+    size = int(size_px)
+    arr = np.asarray(im.convert("RGB").resize((size, size), Image.LANCZOS), dtype=np.int32)
+    radius = size_px / 2
+
+    rows = np.arange(0, size, step)
+    cols = np.arange(0, size, step)
+    inside = ((cols[None, :] - radius) ** 2 + (rows[:, None] - radius) ** 2) <= radius * radius
+    rr, cc = np.nonzero(inside)
+    ys, xs = rows[rr], cols[cc]
+    rgb = arr[ys, xs]
+
+    # quantize to the middle of each color bucket so similar dots share one path
+    shift = 8 - color_bits
+    if shift > 0:
+        rgb = ((rgb >> shift) << shift) + (1 << (shift - 1))
+    packed = (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+    order = np.argsort(packed, kind="stable")
+    packed, xs, ys = packed[order], xs[order], ys[order]
+    bounds = np.flatnonzero(np.diff(packed)) + 1
+
+    r = step / 2
+    arc = f"a{_fmt(r)} {_fmt(r)} 0 1 0 {_fmt(2 * r)} 0a{_fmt(r)} {_fmt(r)} 0 1 0 {_fmt(-2 * r)} 0"
+    result = []
+    for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(packed)]):
+        c = int(packed[start])
+        fill = f"rgb({c >> 16},{(c >> 8) & 255},{c & 255})"
+        d = "".join(f"M{_fmt(x - r)} {_fmt(y)}{arc}" for x, y in zip(xs[start:end].tolist(), ys[start:end].tolist()))
+        result.append((fill, d))
+
+    if len(_halftone_cache) >= HALFTONE_CACHE_SIZE:
+        _halftone_cache.pop(next(iter(_halftone_cache)))
+    _halftone_cache[key] = result
+    return result
+
+
+# ----------------------
+# QR-like border
+# ----------------------
+def qr_border_paths(seed_bytes: bytes, start_x: float, start_y: float, end_x: float, end_y: float,
+                    inner_x0: float, inner_y0: float, inner_x1: float, inner_y1: float,
+                    cell: int, color_bits: int = 8) -> List[Tuple[str, str]]:
+    """
+    Cells of the QR-like border between the outer box (start..end) and the
+    inner box, with the same seed-driven colors and sizes as the original
+    per-cell loop. Every distinct color becomes one path of square subpaths:
+    [(fill, path_d), ...]. Colors are exact by default; color_bits < 8 is an
+    opt-in quantization per channel (fewer paths, but it alters the
+    seed-derived colors).
+    """
+    cols = int(np.ceil((end_x - start_x) / cell))
+    rows = int(np.ceil((end_y - start_y) / cell))
+    xs = start_x + np.arange(cols) * cell
+    ys = start_y + np.arange(rows) * cell
+    in_x = (inner_x0 <= xs) & (xs < inner_x1)
+    in_y = (inner_y0 <= ys) & (ys < inner_y1)
+    rr, cc = np.nonzero(~(in_y[:, None] & in_x[None, :]))
+
+    seed = np.frombuffer(bytes(seed_bytes), dtype=np.uint8).astype(np.int64)
+    v = seed[(rr * cols + cc) % len(seed)]
+    rgb = np.stack([(v * 3) % 256, (v * 7 + rr * 5) % 256, (v * 13 + cc * 11) % 256], axis=1)
+
+    # cell scale by v % 3: full, 0.6, 0.35
+    sizes = np.array([max(1, int(cell * 1.0)), max(1, int(cell * 0.6)), max(1, int(cell * 0.35))])
+    w = sizes[v % 3]
+    x0 = xs[cc] + (cell - w) / 2
+    y0 = ys[rr] + (cell - w) / 2
+
+    shift = 8 - color_bits
+    if shift > 0:
+        rgb = ((rgb >> shift) << shift) + (1 << (shift - 1))
+    packed = (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+    order = np.argsort(packed, kind="stable")
+    packed, x0, y0, w = packed[order], x0[order], y0[order], w[order]
+    bounds = np.flatnonzero(np.diff(packed)) + 1
+
+    result = []
+    for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(packed)]):
+        c = int(packed[start])
+        fill = f"rgb({c >> 16},{(c >> 8) & 255},{c & 255})"
+        d = "".join(f"M{_fmt(x)} {_fmt(y)}h{s}v{s}h-{s}z"
+                    for x, y, s in zip(x0[start:end].tolist(), y0[start:end].tolist(), w[start:end].tolist()))
+        result.append((fill, d))
+    return result
+
+
+# ----------------------
+# Microgrid dots
+# ----------------------
+def microgrid_dots(start_x: float, start_y: float, width: float, height: float,
+                   denom_seed: int, time_seed: int, hash_seed: int, base_cell: int = 3):
+    """
+    Positions, radii, hues and opacities of the deterministic microdots,
+    evaluated with numpy using the same formulas (and float operation order)
+    as the original nested loop. Returns python lists in row-major order:
+    (cx, cy, radius, hue, opacity).
+    """
+    cols = int(np.ceil(width / base_cell))
+    rows = int(np.ceil(height / base_cell))
+    r = np.arange(rows, dtype=np.int64)[:, None]
+    c = np.arange(cols, dtype=np.int64)[None, :]
+
+    dot_value = (denom_seed * r * 17 + time_seed * c * 23 + hash_seed * 29) % 100
+    rr, cc = np.nonzero(dot_value < 40)  # 40% density
+
+    x = start_x + cc * base_cell
+    y = start_y + rr * base_cell
+    hue = (denom_seed * cc * 41 + time_seed * rr * 31 + hash_seed * 19) % 360
+    size_seed = (denom_seed * rr * 7 + time_seed * cc * 11) % 100
+    radius = 0.5 + (size_seed / 100) * 1.0
+    pos_seed = (denom_seed * cc * 13 + time_seed * rr * 17) % 100
+    jitter_x = ((pos_seed / 100) * 2.4) - 1.2
+    jitter_y = (((pos_seed * 7) % 100 / 100) * 2.4) - 1.2
+    opacity_seed = (denom_seed * rr * 3 + time_seed * cc * 5) % 100
+    opacity = 0.1 + (opacity_seed / 100) * 0.7
+
+    return ((x + base_cell / 2 + jitter_x).tolist(), (y + base_cell / 2 + jitter_y).tolist(),
+            radius.tolist(), hue.tolist(), opacity.tolist())
+
+
+def microgrid_id(start_x: float, start_y: float, width: float, height: float,
+                 denom_seed: int, time_seed: int, hash_seed: int, base_cell: int = 3) -> str:
+    """Element id of a microgrid group, derived from its seeds and position (unique per note side)."""
+    key = f"{start_x},{start_y},{width},{height},{denom_seed},{time_seed},{hash_seed},{base_cell}".encode("utf-8")
+    return f"microgrid-{hashlib.sha1(key).hexdigest()[:12]}"
+
+
+# ----------------------
+# Circular QR rings
+# ----------------------
+def circular_qr_runs(qr_matrix, cx: float, cy: float, inner_radius: int, outer_radius: int,
+                     segments: int, n_colors: int) -> List[Tuple[int, str]]:
+    """
+    Chord strokes of the circular QR layer, merged per run of set modules.
+    Segment i covers [2*pi*i/segments, 2*pi*(i+1)/segments] and radius j
+    samples QR row int((j - inner) / (outer - inner) * size). Every run of
+    consecutive set rows in a segment becomes one path per color (color
+    index (i + j) % n_colors, as in the per-pixel loop) whose subpaths are the
+    chord lines: [(color_index, path_d), ...].
+    """
+    matrix = np.asarray(qr_matrix, dtype=bool)
+    qr_size = len(matrix)
+    i = np.arange(segments)
+    j = np.arange(inner_radius, outer_radius)
+    qr_x = (i / segments * qr_size).astype(np.int64) % qr_size
+    qr_y = ((j - inner_radius) / (outer_radius - inner_radius) * qr_size).astype(np.int64) % qr_size
+    is_set = matrix[qr_y[None, :], qr_x[:, None]]  # (segments, radii)
+
+    theta_start = 2 * np.pi * i / segments
+    theta_end = 2 * np.pi * (i + 1) / segments
+
+    result = []
+    for seg in range(segments):
+        edges = np.diff(np.r_[0, is_set[seg].astype(np.int8), 0])
+        cos0, sin0 = np.cos(theta_start[seg]), np.sin(theta_start[seg])
+        cos1, sin1 = np.cos(theta_end[seg]), np.sin(theta_end[seg])
+        for a, b in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+            radii = j[a:b]
+            for k in range(n_colors):
+                rk = radii[(seg + radii) % n_colors == k]
+                if len(rk) == 0:
+                    continue
+                x1, y1 = (cx + rk * cos0).tolist(), (cy + rk * sin0).tolist()
+                x2, y2 = (cx + rk * cos1).tolist(), (cy + rk * sin1).tolist()
+                d = "".join(f"M{_fmt(p)} {_fmt(q)}L{_fmt(s)} {_fmt(t)}" for p, q, s, t in zip(x1, y1, x2, y2))
+                result.append((k, d))
+    return result
+
+
+# ----------------------
+# QR / Aztec modules
+# ----------------------
+def module_runs_path(matrix, scale: float, x0: float = 0, y0: float = 0) -> str:
+    """
+    Run-length encode the dark modules of a QR/Aztec matrix into one path:
+    every horizontal run of set modules in a row becomes a single rectangle.
+    """
+    m = np.asarray(matrix, dtype=bool)
+    padded = np.zeros((m.shape[0], m.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = m
+    edges = np.diff(padded, axis=1)
+    parts = []
+    for r in range(m.shape[0]):
+        starts = np.flatnonzero(edges[r] == 1)
+        ends = np.flatnonzero(edges[r] == -1)
+        y = _fmt(y0 + r * scale)
+        for a, b in zip(starts.tolist(), ends.tolist()):
+            parts.append(f"M{_fmt(x0 + a * scale)} {y}h{_fmt((b - a) * scale)}v{_fmt(scale)}h{_fmt(-(b - a) * scale)}z")
+    return "".join(parts)
+
+
+def matrix_digest(matrix, params=()) -> str:
+    """Short content hash of a module matrix plus any styling params (for symbol ids and caches)."""
+    m = np.packbits(np.asarray(matrix, dtype=bool), axis=None)
+    key = f"{np.shape(matrix)}{params}".encode("utf-8")
+    return hashlib.sha1(m.tobytes() + key).hexdigest()[:12]